@@ -3,6 +3,7 @@ This module provides classes and methods to launch the Arldm application.
 Arldm is ....
 """
 from jarvis_cd.basic.pkg import Application
+from jarvis_cd.basic.task_graph import TaskGraph
 from jarvis_util import *
 import os, pathlib
 import time
@@ -19,6 +20,7 @@ class Arldm(Application):
         Initialize paths
         """
         self.pkg_type = 'arldm'
+        self.task_graph = None
         self.hermes_env_vars = ['HERMES_ADAPTER_MODE', 'HERMES_CLIENT_CONF', 
                                 'HERMES_CONF', 'LD_PRELOAD']
         # self.hermes_env_vars = ['HDF5_DRIVER', 'HDF5_PLUGIN_PATH', 
@@ -394,34 +396,16 @@ class Arldm(Application):
             print("Invalid or missing PATH_FOR_TASK_FILES environment variable.")    
 
     def _unset_vfd_vars(self,env_vars_toset):
-        cmd = ['conda', 'env', 'config', 'vars', 'unset',]
-        
-        for env_var in env_vars_toset:
-            cmd.append(f'{env_var}')
-        cmd.append('-n')
-        cmd.append(self.config['conda_env'])
-        
-        cmd = ' '.join(cmd)
-        Exec(cmd, LocalExecInfo(env=self.mod_env,))
-        self.log(f"ARLDM _unset_vfd_vars: {cmd}")
+        self.update_conda_vars(self.config['conda_env'],
+                               unset_vars=env_vars_toset)
 
     def _set_env_vars(self, env_vars_toset):
         
         self.log(f"ARLDM _set_env_vars")
         
-        # Unset all env_vars_toset first        
-        self._unset_vfd_vars(env_vars_toset)
-
-        cmd = [ 'conda', 'env', 'config', 'vars', 'set']
-        for env_var in env_vars_toset:
-            env_var_val = self.mod_env[env_var]
-            cmd.append(f'{env_var}={env_var_val}')
-        
-        cmd.append('-n')
-        cmd.append(self.config['conda_env'])
-        cmd = ' '.join(cmd)
-        self.log(f"ARLDM _set_env_vars: {cmd}")
-        Exec(cmd, LocalExecInfo(env=self.mod_env,))
+        env_vars = {env_var: self.mod_env.get(env_var)
+                    for env_var in env_vars_toset}
+        self.update_conda_vars(self.config['conda_env'], set_vars=env_vars)
 
     def start(self):
         """
@@ -441,22 +425,33 @@ class Arldm(Application):
         
         self.log(f"ARLDM start")
         
-        start = time.time()
-        
+        self.task_graph = TaskGraph()
         if self.config['prep_hdf5']:
-            self._prep_hdf5_file()
+            self.task_graph.add('prep_hdf5', self._prep_hdf5_file,
+                                outputs=['hdf5'])
         
         if self.config['mode'] == 'train':
-            self._train()
+            self.task_graph.add('train', self._train, inputs=['hdf5'],
+                                outputs=['model'])
         
         if self.config['mode'] == 'sample':
-            self._sample()
+            self.task_graph.add('sample', self._sample, inputs=['hdf5'])
         
-        end = time.time()
-        diff = end - start
+        self.task_graph.run()
+        diff = self.task_graph.end - self.task_graph.start
         self.log(f'TOTAL RUN TIME: {diff} seconds')
 
 
+    def _get_stat(self, stat_dict):
+        """
+        Get statistics from the application.
+
+        :param stat_dict: A dictionary of statistics.
+        :return: None
+        """
+        if self.task_graph is not None:
+            self.task_graph.get_stat(stat_dict, self.pkg_id)
+
     def stop(self):
         """
         Stop a running application. E.g., OrangeFS will terminate the servers,
@@ -108,8 +108,12 @@ class Cm1(Application):
 
         # Create CM1 compilation
         self.config['CM1_PATH'] = self.env['CM1_PATH']
-        Exec(f'bash {self.config["CM1_PATH"]}/buildCM1-spack.sh',
-             LocalExecInfo(env=self.env))
+        self.cached_build(
+            'cm1', [f'{self.config["CM1_PATH"]}/run/cm1.exe'],
+            lambda: Exec(f'bash {self.config["CM1_PATH"]}/buildCM1-spack.sh',
+                         LocalExecInfo(env=self.env)),
+            src_dirs=[self.config['CM1_PATH']],
+            env_vars=['CM1_PATH', 'CC', 'FC'])
 
         # Create CM1 configuration
         self.env['COREX'] = self.config['corex']
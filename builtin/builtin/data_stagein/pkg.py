@@ -2,11 +2,12 @@
 This module provides classes and methods to launch the DataStagein application.
 DataStagein is ....
 """
-from jarvis_cd.basic.pkg import Application
+from jarvis_cd.basic.pkg import Application, Color
+from jarvis_cd.basic.stage_in import StageIn
+from jarvis_cd.basic.broadcast import Broadcast
 from jarvis_util import *
 import os
 import pathlib
-import time
 
 
 class DataStagein(Application):
@@ -17,7 +18,9 @@ class DataStagein(Application):
         """
         Initialize paths
         """
-        
+        self.stage_stats = None
+        self.broadcast_stats = None
+
         # Convert user_data_paths to list
         try:
             user_data_paths = self.config['user_data_paths']
@@ -62,6 +65,42 @@ class DataStagein(Application):
                 'type': str,
                 'default': None,
             },
+            {
+                'name': 'workers',
+                'msg': 'The max number of files or chunks copied concurrently',
+                'type': int,
+                'default': 8,
+            },
+            {
+                'name': 'chunk_size',
+                'msg': 'Files larger than this are copied in chunks of this size',
+                'type': str,
+                'default': '64m',
+            },
+            {
+                'name': 'hash',
+                'msg': 'Skip files whose content hash is unchanged, '
+                       'even if their mtime changed',
+                'type': bool,
+                'default': False,
+            },
+            {
+                'name': 'local_data_path',
+                'msg': 'A node-local path to copy dest_data_path to on every '
+                       'host in the hostfile. It is made a mirror of the '
+                       'data, so use a dedicated directory.',
+                'type': str,
+                'default': None,
+            },
+            {
+                'name': 'local_mode',
+                'msg': 'tree: copy all data to every host, forwarding it '
+                       'from host to host. shard: copy a distinct part of '
+                       'the data to each host.',
+                'type': str,
+                'choices': ['tree', 'shard'],
+                'default': 'tree',
+            },
         ]
     
     def _print_required_params(self):
@@ -138,8 +177,6 @@ class DataStagein(Application):
         if not pathlib.Path(dest_data_path).exists():
             pathlib.Path(dest_data_path).mkdir(parents=True, exist_ok=True)
         
-        start = time.time()
-        
         for data_path in user_data_list:
             if not os.path.exists(data_path):
                 raise FileNotFoundError(f"Data path {data_path} does not exist")
@@ -153,30 +190,49 @@ class DataStagein(Application):
                     # Check if the file is not empty
                     if os.stat(data_path).st_size == 0:
                         raise ValueError(f"Data file {data_path} is empty")
-            
-            # Check if two directory contains the same files
-            dest_files = os.listdir(dest_data_path)
-            if os.path.isdir(data_path) and set(dest_files) == set(os.listdir(data_path)):
-                # data_files = os.listdir(data_path)
-                # if set(dest_files) == set(data_files):
-                print(f"Data path {data_path} already exists in {dest_data_path}")
-                continue
-            
-            # Move data to destination path
-            cmd = f"cp -r {data_path} {dest_data_path}"
-            print(f"Copying data from {data_path} to {dest_data_path}")
-            Exec(cmd,LocalExecInfo(env=self.mod_env,))
-            
-            copied_items = 1
-            if os.path.isdir(data_path): copied_items = len(os.listdir(data_path))
-            print(f"Copied {copied_items} items ... ")
-        
-        end = time.time()
-        diff = end - start
-        self.log(f'data_stagein TIME: {diff} seconds')
-            
+
+        # Copy only the files which changed since the last stage-in
+        stage_in = StageIn(dest_data_path,
+                           f'{self.config_dir}/stagein_manifest.json',
+                           workers=self.config['workers'],
+                           chunk_size=SizeConv.to_int(self.config['chunk_size']),
+                           use_hash=self.config['hash'])
+        self.stage_stats = stage_in.run(user_data_list)
+        self.log(f'[STAGEIN] {self.stage_stats}', Color.GREEN)
+        for path, msg in self.stage_stats.errors:
+            self.log(f'[STAGEIN] Could not copy {path}: {msg}', Color.RED)
+        if len(self.stage_stats.errors):
+            raise Exception(f'Could not stage {len(self.stage_stats.errors)} '
+                            f'files into {dest_data_path}')
+        self.log(f'data_stagein TIME: {self.stage_stats.seconds} seconds')
+        if self.config['local_data_path'] is not None:
+            self._broadcast(dest_data_path)
+
         print("Data stagein complete")
 
+    def _broadcast(self, dest_data_path):
+        """
+        Copy the staged data to the node-local path of every host and
+        verify every copy
+
+        :param dest_data_path: The staged data
+        :return: None
+        """
+        hosts = self.jarvis.hostfile.hosts
+        tree = self.jarvis.get_fanout(
+            PsshExecInfo(hostfile=self.jarvis.hostfile, env=self.env),
+            len(hosts), direct=True)
+        broadcast = Broadcast(tree, self.config['local_data_path'],
+                              mode=self.config['local_mode'])
+        self.broadcast_stats = broadcast.run(dest_data_path, hosts)
+        self.log(f'[STAGEIN] {self.broadcast_stats}', Color.GREEN)
+        for host, msg in self.broadcast_stats.errors.items():
+            self.log(f'[STAGEIN] {host}: {msg}', Color.RED)
+        if len(self.broadcast_stats.errors):
+            raise Exception(f'Could not stage data into '
+                            f'{self.config["local_data_path"]} on '
+                            f'{len(self.broadcast_stats.errors)} hosts')
+
     def stop(self):
         """
         Stop a running application. E.g., OrangeFS will terminate the servers,
@@ -194,3 +250,18 @@ class DataStagein(Application):
         :return: None
         """
         pass
+
+    def _get_stat(self, stat_dict):
+        """
+        Get statistics from the application.
+
+        :param stat_dict: A dictionary of statistics.
+        :return: None
+        """
+        if self.stage_stats is not None:
+            for key, val in self.stage_stats.to_dict().items():
+                stat_dict[f'{self.pkg_id}.{key}'] = val
+        if self.broadcast_stats is not None:
+            for key, val in self.broadcast_stats.to_dict().items():
+                stat_dict[f'{self.pkg_id}.local.{key}'] = val
+        stat_dict[f'{self.pkg_id}.runtime'] = self.start_time
@@ -3,10 +3,11 @@ This module provides classes and methods to launch the Ddmd application.
 Ddmd is ....
 """
 from jarvis_cd.basic.pkg import Application
+from jarvis_cd.basic.fanout import FanoutKill
+from jarvis_cd.basic.task_graph import TaskGraph
 from jarvis_util import *
 import os
 import yaml
-import time
 import pathlib, glob, shutil
 
 class Ddmd(Application):
@@ -17,11 +18,7 @@ class Ddmd(Application):
         """
         Initialize paths
         """
-        self.openmm_list = []
-        self.aggregate = None
-        self.train = None
-        self.prev_model_json = None
-        self.inference = None
+        self.task_graph = None
         self.hermes_env_vars = ['HERMES_ADAPTER_MODE', 'HERMES_CLIENT_CONF', 'HERMES_CONF', 'LD_PRELOAD']
 
     def _configure_menu(self):
@@ -129,6 +126,20 @@ class Ddmd(Application):
                 'type': bool,
                 'default': False,
             },
+            {
+                'name': 'gpu_limit',
+                'msg': 'The max number of GPU tasks (simulation, training) '
+                       'running at once. Unlimited by default.',
+                'type': int,
+                'default': None,
+            },
+            {
+                'name': 'cpu_limit',
+                'msg': 'The max number of CPU tasks (aggregation, inference) '
+                       'running at once. Unlimited by default.',
+                'type': int,
+                'default': None,
+            },
             {
                 'name': 'with_hermes',
                 'msg': 'Whether it is used with Hermes (e.g. needs to update environment variables)',
@@ -197,88 +208,82 @@ class Ddmd(Application):
         
         self.config['md_slide'] = self.config['md_runs'] / self.config['nnodes']
     
-    def _run_openmm(self):
+    def _run_openmm(self, task, stage):
         """
-        Run the OpenMM simulation. This method is called by the run method.
+        Run one OpenMM simulation task.
 
-        :return: None
+        :param task: The index of the simulation task
+        :param stage: The stage index
+        :return: The asynchronous Exec of the simulation
         """
+        task_idx = "task" + str(task).zfill(4)
+        stage_idx = "stage" + str(stage).zfill(4)
+        gpu_idx = 0 # dummy now
+        stage_name="molecular_dynamics"
         
-        all_tasks = []
+        node_idx = len(self.jarvis.hostfile) % self.config['nnodes']
+        node_name = self.jarvis.hostfile[node_idx]
         
-        for task in range(self.config['md_start'], self.config['md_runs']):
+        yaml_path = self.config['ddmd_path'] + "/test/bba/" + stage_name + "_stage_test.yaml"
+        dest_path= self.config['experiment_path'] + "/" + stage_name + "_runs/" + stage_idx + "/" + task_idx
         
-            task_idx = "task" + str(task).zfill(4)
-            stage_idx = "stage" + str(self.config['stage_idx']).zfill(4)
-            gpu_idx = 0 # dummy now
-            stage_name="molecular_dynamics"
-            
-            node_idx = len(self.jarvis.hostfile) % self.config['nnodes']
-            node_name = self.jarvis.hostfile[node_idx]
-            
-            yaml_path = self.config['ddmd_path'] + "/test/bba/" + stage_name + "_stage_test.yaml"
-            dest_path= self.config['experiment_path'] + "/" + stage_name + "_runs/" + stage_idx + "/" + task_idx
-            
-            # create the dest_path
-            pathlib.Path(dest_path).mkdir(parents=True, exist_ok=True)
-            
-            # load yaml file to change the parameters
-            with open(yaml_path, 'r') as f:
-                config_vars = yaml.load(f, Loader=yaml.FullLoader)
-                # sed -e "s/\$SIM_LENGTH/${SIM_LENGTH}/" -e "s/\$OUTPUT_PATH/${dest_path//\//\\/}/" -e "s/\$EXPERIMENT_PATH/${EXPERIMENT_PATH//\//\\/}/" -e "s/\$DDMD_PATH/${DDMD_PATH//\//\\/}/" -e "s/\$GPU_IDX/${gpu_idx}/" -e "s/\$STAGE_IDX/${STAGE_IDX}/" $yaml_path  > $dest_path/$(basename $yaml_path)
-                config_vars['output_path'] = dest_path
-                config_vars['experiment_directory'] = self.config['experiment_path']
-                config_vars['initial_pdb_dir'] = self.config['ddmd_path'] + "/data/bba"
-                config_vars['pdb_file'] = self.config['ddmd_path'] + "/data/bba/system/1FME-unfolded.pdb"
-                config_vars['ddmd_path'] = self.config['ddmd_path']
-                config_vars['reference_pdb_file'] = self.config['ddmd_path'] + "/data/bba/1FME-folded.pdb"
-                
-                config_vars['simulation_length_ns'] = self.config['sim_len']
-                config_vars['gpu_idx'] = gpu_idx
-                config_vars['stage_idx'] = self.config['stage_idx']
-                config_vars['task_idx'] = task
-                
-                new_yaml_file = dest_path + "/" + stage_name + "_stage_test.yaml"
-                yaml.dump(config_vars, open(new_yaml_file, 'w'), default_flow_style=False)
-            
-            logfile = dest_path + "/" + task_idx + "_OPENMM.log"
-            
-            cmd = [
-                f'cd {dest_path};',
-                'conda','run', '-n', self.config['conda_openmm'],
-                'mpirun',
-                '--host', node_name,
-                '-np', str(1),
-                '-env',
-                f'PYTHONPATH={self.config["ddmd_path"]}:{self.config["molecules_path"]}',
-                'python',
-                f'{self.config["ddmd_path"]}/deepdrivemd/sim/openmm/run_openmm.py',
-                '-c', new_yaml_file,
-            ]
+        # create the dest_path
+        pathlib.Path(dest_path).mkdir(parents=True, exist_ok=True)
+        
+        # load yaml file to change the parameters
+        with open(yaml_path, 'r') as f:
+            config_vars = yaml.load(f, Loader=yaml.FullLoader)
+            # sed -e "s/\$SIM_LENGTH/${SIM_LENGTH}/" -e "s/\$OUTPUT_PATH/${dest_path//\//\\/}/" -e "s/\$EXPERIMENT_PATH/${EXPERIMENT_PATH//\//\\/}/" -e "s/\$DDMD_PATH/${DDMD_PATH//\//\\/}/" -e "s/\$GPU_IDX/${gpu_idx}/" -e "s/\$STAGE_IDX/${STAGE_IDX}/" $yaml_path  > $dest_path/$(basename $yaml_path)
+            config_vars['output_path'] = dest_path
+            config_vars['experiment_directory'] = self.config['experiment_path']
+            config_vars['initial_pdb_dir'] = self.config['ddmd_path'] + "/data/bba"
+            config_vars['pdb_file'] = self.config['ddmd_path'] + "/data/bba/system/1FME-unfolded.pdb"
+            config_vars['ddmd_path'] = self.config['ddmd_path']
+            config_vars['reference_pdb_file'] = self.config['ddmd_path'] + "/data/bba/1FME-folded.pdb"
             
-            conda_cmd = ' '.join(cmd)
-            print(F"Running OpenMM on {node_name}: {dest_path}")
-            print(f"{conda_cmd} > {logfile}")
-            cur_task = Exec(conda_cmd, LocalExecInfo(env=self.mod_env,
-                                          pipe_stdout=logfile,
-                                          exec_async=True))
+            config_vars['simulation_length_ns'] = self.config['sim_len']
+            config_vars['gpu_idx'] = gpu_idx
+            config_vars['stage_idx'] = stage
+            config_vars['task_idx'] = task
             
-            all_tasks.append(cur_task)
+            new_yaml_file = dest_path + "/" + stage_name + "_stage_test.yaml"
+            yaml.dump(config_vars, open(new_yaml_file, 'w'), default_flow_style=False)
         
-        return all_tasks
+        logfile = dest_path + "/" + task_idx + "_OPENMM.log"
+        
+        cmd = [
+            f'cd {dest_path};',
+            'conda','run', '-n', self.config['conda_openmm'],
+            'mpirun',
+            '--host', node_name,
+            '-np', str(1),
+            '-env',
+            f'PYTHONPATH={self.config["ddmd_path"]}:{self.config["molecules_path"]}',
+            'python',
+            f'{self.config["ddmd_path"]}/deepdrivemd/sim/openmm/run_openmm.py',
+            '-c', new_yaml_file,
+        ]
+        
+        conda_cmd = ' '.join(cmd)
+        print(F"Running OpenMM on {node_name}: {dest_path}")
+        print(f"{conda_cmd} > {logfile}")
+        return Exec(conda_cmd, LocalExecInfo(env=self.mod_env,
+                                             pipe_stdout=logfile,
+                                             exec_async=True))
         
     
     
-    def _run_aggregate(self):
+    def _run_aggregate(self, stage):
         """
         Aggregate the results of the OpenMM simulation.
         
-        :return: None
+        :param stage: The stage index
+        :return: The Exec of the aggregation
         """
         task_idx = "task0000" # fix to 0
         stage_name="aggregate"
         
-        stage_idx = "stage" + str((self.config['stage_idx'])).zfill(4)
+        stage_idx = "stage" + str(stage).zfill(4)
         node_idx = 0 # TODO: allow specify nodes?
         node_name = self.jarvis.hostfile[node_idx]
         yaml_path = self.config['ddmd_path'] + "/test/bba/" + stage_name + "_stage_test.yaml"
@@ -291,7 +296,7 @@ class Ddmd(Application):
             config_vars = yaml.load(f, Loader=yaml.FullLoader)
             # sed -e "s/\$SIM_LENGTH/${SIM_LENGTH}/" -e "s/\$OUTPUT_PATH/${dest_path//\//\\/}/" -e "s/\$EXPERIMENT_PATH/${EXPERIMENT_PATH//\//\\/}/" -e "s/\$DDMD_PATH/${DDMD_PATH//\//\\/}/" -e "s/\$GPU_IDX/${gpu_idx}/" -e "s/\$STAGE_IDX/${STAGE_IDX}/" $yaml_path  > $dest_path/$(basename $yaml_path)
             config_vars['experiment_directory'] = self.config['experiment_path']
-            config_vars['stage_idx'] = self.config['stage_idx']
+            config_vars['stage_idx'] = stage
             config_vars['task_idx'] = 0 # fix to 0
             config_vars['output_path'] = dest_path + "/aggregated.h5"
             config_vars['pdb_file'] = self.config['ddmd_path'] + "/data/bba/system/1FME-unfolded.pdb"
@@ -320,19 +325,51 @@ class Ddmd(Application):
             conda_cmd = ' '.join(cmd)
             print(F"Running Aggregate on {node_name}: {dest_path}")
             print(f"{conda_cmd} > {logfile}")
-            Exec(conda_cmd, LocalExecInfo(env=self.mod_env,
-                                        pipe_stdout=logfile))
+            return Exec(conda_cmd, LocalExecInfo(env=self.mod_env,
+                                                 pipe_stdout=logfile))
     
     
-    def _run_train(self):
+    def _model_json(self, stage):
+        """
+        The path of the model selection json written for a training stage
+
+        :param stage: The stage index of the training
+        :return: The path
+        """
+        stage_idx = "stage" + str(stage).zfill(4)
+        model_tag = stage_idx + "_task0000"
+        return self.config['experiment_path'] + "/model_selection_runs/" + \
+            stage_idx + "/task0000/" + model_tag + ".json"
+
+    def _select_model(self, stage):
+        """
+        Write the model selection json of a training stage, which
+        inference reads.
+
+        :param stage: The stage index of the training
+        :return: The Exec of the copy
+        """
+        model_json = self._model_json(stage)
+        pathlib.Path(os.path.dirname(model_json)).mkdir(parents=True, exist_ok=True)
+        cp_cmd = [
+            'cp','-p',
+            f'{self.config["ddmd_path"]}/test/bba/stage0000_task0000.json',
+            model_json,
+        ]
+        cp_cmd = ' '.join(cp_cmd)
+        print(f"Copying {os.path.basename(model_json)} to {os.path.dirname(model_json)}")
+        return Exec(cp_cmd, LocalExecInfo(env=self.mod_env))
+
+    def _run_train(self, stage):
         """
         Train the model.
         
-        :return: None
+        :param stage: The stage index
+        :return: The asynchronous Exec of the training
         """
         task_idx = "task0000" # fix to 0
         
-        stage_idx = "stage" + str((self.config['stage_idx'])).zfill(4)
+        stage_idx = "stage" + str(stage).zfill(4)
         model_tag = stage_idx + "_" + task_idx
         node_idx = 0 # TODO: allow specify nodes?
         node_name = self.jarvis.hostfile[node_idx]
@@ -342,27 +379,13 @@ class Ddmd(Application):
         # create the dest_path
         pathlib.Path(dest_path).mkdir(parents=True, exist_ok=True)
         
-        model_select_path = self.config['experiment_path'] + "/model_selection_runs/" + stage_idx + "/" + task_idx
-        pathlib.Path(model_select_path).mkdir(parents=True, exist_ok=True)
-        
-        cp_cmd = [
-            'cp','-p',
-            f'{self.config["ddmd_path"]}/test/bba/stage0000_task0000.json',
-            f'{model_select_path}/{model_tag}.json',
-        ]
-        cp_cmd = ' '.join(cp_cmd)
-        print(f"Copying {model_tag}.json to {model_select_path}")
-        Exec(cp_cmd, LocalExecInfo(env=self.mod_env))
-        
-        self.prev_model_json = f'{model_select_path}/{model_tag}.json'
-        
         try:
             # load yaml file to change the parameters
             with open(yaml_path, 'r') as f:
                 config_vars = yaml.load(f, Loader=yaml.FullLoader)
                 # sed -e "s/\$SIM_LENGTH/${SIM_LENGTH}/" -e "s/\$OUTPUT_PATH/${dest_path//\//\\/}/" -e "s/\$EXPERIMENT_PATH/${EXPERIMENT_PATH//\//\\/}/" -e "s/\$DDMD_PATH/${DDMD_PATH//\//\\/}/" -e "s/\$GPU_IDX/${gpu_idx}/" -e "s/\$STAGE_IDX/${STAGE_IDX}/" $yaml_path  > $dest_path/$(basename $yaml_path)
                 config_vars['experiment_directory'] = self.config['experiment_path']
-                config_vars['stage_idx'] = self.config['stage_idx']
+                config_vars['stage_idx'] = stage
                 config_vars['task_idx'] = 0 # fix to 0
                 config_vars['output_path'] = dest_path
                 config_vars['model_tag'] = model_tag
@@ -396,17 +419,19 @@ class Ddmd(Application):
         except Exception as e:
             print("ERROR: " + str(e))
             print("ERROR: Training failed")
-            return None
+            raise
     
-    def _run_inference(self):
+    def _run_inference(self, stage, model_json):
         """
         Run inference on the model.
         
-        :return: None
+        :param stage: The stage index
+        :param model_json: The model selection json of the training stage
+        :return: The Exec of the inference
         """
         task_idx = "task0000" # fix to 0
         
-        stage_idx = "stage" + str((self.config['stage_idx'])).zfill(4)
+        stage_idx = "stage" + str(stage).zfill(4)
         model_tag = stage_idx + "_" + task_idx
         node_idx = 0 
         if len(self.jarvis.hostfile) > 1:
@@ -445,14 +470,13 @@ class Ddmd(Application):
             print(f"Using pretrained model: {pretrained_model}")
             latest_checkpoint = pretrained_model
         
-        prev_stage_idx = "stage" + str((self.config['stage_idx']-1)).zfill(4)
         # replace $MODEL_CHECKPOINT with latest_checkpoint in the json file
-        with open(self.prev_model_json, 'r') as f:
+        with open(model_json, 'r') as f:
             json_str = f.read()
             json_str = json_str.replace("$MODEL_CHECKPOINT", latest_checkpoint)
 
         # save the updated json content back to the file
-        with open(self.prev_model_json, 'w') as f:
+        with open(model_json, 'w') as f:
             f.write(json_str)
 
         try:
@@ -461,7 +485,7 @@ class Ddmd(Application):
                 config_vars = yaml.load(f, Loader=yaml.FullLoader)
                 # sed -e "s/\$SIM_LENGTH/${SIM_LENGTH}/" -e "s/\$OUTPUT_PATH/${dest_path//\//\\/}/" -e "s/\$EXPERIMENT_PATH/${EXPERIMENT_PATH//\//\\/}/" -e "s/\$DDMD_PATH/${DDMD_PATH//\//\\/}/" -e "s/\$GPU_IDX/${gpu_idx}/" -e "s/\$STAGE_IDX/${STAGE_IDX}/" $yaml_path  > $dest_path/$(basename $yaml_path)
                 config_vars['experiment_directory'] = self.config['experiment_path']
-                config_vars['stage_idx'] = self.config['stage_idx']
+                config_vars['stage_idx'] = stage
                 config_vars['task_idx'] = 0 # fix to 0
                 config_vars['output_path'] = dest_path
                 
@@ -494,7 +518,7 @@ class Ddmd(Application):
         except Exception as e:
             print("ERROR: " + str(e))
             print("ERROR: Inference failed")
-            return None
+            raise
     
     def _check_openmm(self):
         """
@@ -523,38 +547,61 @@ class Ddmd(Application):
         conda_envs = [self.config['conda_openmm'], self.config['conda_pytorch']]
         
         for cenv in conda_envs:
-        
-            cmd = ['conda', 'env', 'config', 'vars', 'unset',]
-            
-            for env_var in env_vars_toset:
-                cmd.append(f'{env_var}')
-            cmd.append('-n')
-            cmd.append(cenv)
-            
-            cmd = ' '.join(cmd)
-            Exec(cmd, LocalExecInfo(env=self.mod_env,))
-            self.log(f"DDMD _unset_vfd_vars for {cenv}: {cmd}")
+            self.update_conda_vars(cenv, unset_vars=env_vars_toset)
 
     def _set_env_vars(self, env_vars_toset):
         
         conda_envs = [self.config['conda_openmm'], self.config['conda_pytorch']]
+        env_vars = {env_var: self.mod_env.get(env_var)
+                    for env_var in env_vars_toset}
         
         for cenv in conda_envs:
-            
-            # Unset all env_vars_toset first
-            self._unset_vfd_vars(env_vars_toset)
+            self.update_conda_vars(cenv, set_vars=env_vars)
 
-            cmd = [ 'conda', 'env', 'config', 'vars', 'set']
-            for env_var in env_vars_toset:
-                env_var_val = self.mod_env[env_var]
-                cmd.append(f'{env_var}={env_var_val}')
-            
-            cmd.append('-n')
-            cmd.append(cenv)
-            cmd = ' '.join(cmd)
-            self.log(f"DDMD _set_env_vars for {cenv}: {cmd}")
-            Exec(cmd, LocalExecInfo(env=self.mod_env,))
-        
+    def _build_graph(self):
+        """
+        Build the task graph of the workflow. Each iteration simulates,
+        aggregates, trains and infers. The simulations of the next
+        iteration only wait for the aggregation, so they overlap the
+        training and inference. With short_pipe, aggregation is skipped
+        and inference does not wait for training.
+
+        :return: TaskGraph
+        """
+        graph = TaskGraph({'gpu': self.config.get('gpu_limit'),
+                           'cpu': self.config.get('cpu_limit')})
+        prev = []
+        for i in range(self.config['iter_count']):
+            stage = self.config['stage_idx'] + 2 * i
+            sims = []
+            if self.config['skip_sim'] == False:
+                for task in range(self.config['md_start'], self.config['md_runs']):
+                    graph.add(f'openmm{i}.{task}', self._run_openmm,
+                              args=[task, stage], inputs=prev,
+                              outputs=[f'sim{i}.{task}'],
+                              resources={'gpu': 1})
+                    sims.append(f'sim{i}.{task}')
+            else:
+                print("Skipping OpenMM stage")
+            if self.config['short_pipe'] == False:
+                graph.add(f'aggregate{i}', self._run_aggregate, args=[stage],
+                          inputs=sims, outputs=[f'agg{i}'],
+                          resources={'cpu': 1})
+                sims = [f'agg{i}']
+            prev = sims
+            graph.add(f'select{i}', self._select_model, args=[stage + 1],
+                      outputs=[f'model_json{i}'])
+            graph.add(f'train{i}', self._run_train, args=[stage + 1],
+                      inputs=sims + [f'model_json{i}'],
+                      outputs=[f'model{i}'], resources={'gpu': 1})
+            # Inference reads the trajectories of this iteration
+            inputs = sims + [f'model_json{i}']
+            if self.config['short_pipe'] == False:
+                inputs.append(f'model{i}')
+            graph.add(f'inference{i}', self._run_inference,
+                      args=[stage + 2, self._model_json(stage + 1)],
+                      inputs=inputs, resources={'cpu': 1})
+        return graph
 
     def start(self):
         """
@@ -577,61 +624,24 @@ class Ddmd(Application):
             print("ERROR: OpenMM files not found, cannot skip simulation")
             self.config['skip_sim'] = False
         
-        iter_cnt = self.config['iter_count']
-        
-        total_start = time.time()
-        
-        for i in range(iter_cnt):
-                            
-            if self.config['skip_sim'] == False:
-                start = time.time()
-                self.openmm_list = self._run_openmm()
-                # wait for all self.openmm_list to finish
-                for task in self.openmm_list:
-                    if task is not None:
-                        task.wait()
-                
-                end = time.time()
-            
-                print(f"OpenMM[{(self.config['stage_idx'])}] : " + str(end - start) + " seconds")
-            else:
-                print("Skipping OpenMM stage")
-            
-            if self.config['short_pipe'] == False:
-                start = time.time()
-                self._run_aggregate()
-                end = time.time()
-                print(f"Aggregate[{(self.config['stage_idx'])}] : " + str(end - start) + " seconds")
-                
-            
-            self.config['stage_idx']+=1
-            
-            train_start = time.time()
-            self.train = self._run_train()
-            if self.config['short_pipe'] == False:
-                self.train.wait()
-                end = time.time()
-                print(f"Train[{(self.config['stage_idx'])}] : " + str(end - train_start) + " seconds")
-            else:
-                print("Shortened Pipeline: Train stage not waited")
-            
-            self.config['stage_idx']+=1
-            
-            start = time.time()
-            self.inference = self._run_inference()
-            end = time.time()
-            
-            if self.config['short_pipe'] == False:
-                print(f"Inference stage[{(self.config['stage_idx'])}] : " + str(end - start) + " seconds")
-            else:
-                self.train.wait()
-                end = time.time()
-                print(f"Train[{(self.config['stage_idx']-1)}] and Inference[{(self.config['stage_idx'])}] : " + str(end - train_start) + " seconds")
-
-        total_end = time.time()
-        print(f"Total time: {total_end - total_start} seconds")
+        self.task_graph = self._build_graph()
+        self.task_graph.run()
+        for name, task in self.task_graph.tasks.items():
+            print(f"{name} : {task.seconds()} seconds")
+        self.config['stage_idx'] += 2 * self.config['iter_count']
+        print(f"Total time: {self.task_graph.end - self.task_graph.start} seconds")
     
     
+    def _get_stat(self, stat_dict):
+        """
+        Get statistics from the application.
+
+        :param stat_dict: A dictionary of statistics.
+        :return: None
+        """
+        if self.task_graph is not None:
+            self.task_graph.get_stat(stat_dict, self.pkg_id)
+
     def kill(self):
         """
         Kill a running application. E.g., OrangeFS will kill the servers,
@@ -641,9 +651,9 @@ class Ddmd(Application):
         """
         # FIXME: this will kill all python processes
         print("INFO: killing all python processes")
-        Kill('python',
-             PsshExecInfo(hostfile=self.jarvis.hostfile,
-                          env=self.env))
+        FanoutKill('python',
+                   PsshExecInfo(hostfile=self.jarvis.hostfile,
+                                env=self.env))
         
     def stop(self):
         """
@@ -3,6 +3,9 @@ This module provides classes and methods to launch the DlioBenchmark application
 DlioBenchmark is ....
 """
 from jarvis_cd.basic.pkg import Application, Color
+from jarvis_cd.basic.fanout import FanoutExec
+from jarvis_cd.basic.output_parser import DlioParser
+from jarvis_cd.basic.dataset_cache import DatasetCache
 from jarvis_util import *
 
 
@@ -14,7 +17,7 @@ class DlioBenchmark(Application):
         """
         Initialize paths
         """
-        pass
+        self.dataset_key = None
 
     def _configure_menu(self):
         """
@@ -75,6 +78,41 @@ class DlioBenchmark(Application):
                 'choices': [],
                 'args': [],
             },
+            {
+                'name': 'num_samples_per_file',
+                'msg': 'Number of samples in each file',
+                'type': int,
+                'default': None,
+            },
+            {
+                'name': 'record_length',
+                'msg': 'The size of a sample (e.g., 128k)',
+                'type': str,
+                'default': None,
+            },
+            {
+                'name': 'format',
+                'msg': 'The format of the dataset files (e.g., npz, hdf5)',
+                'type': str,
+                'default': None,
+            },
+            {
+                'name': 'dataset_cache',
+                'msg': 'Keep generated datasets under data_path, keyed by '
+                       'the parameters which change the data, and only '
+                       'generate datasets which are not cached. data_path '
+                       'must be shared by every host (e.g., a PFS). '
+                       'Off by default, so data_path is used as is.',
+                'type': bool,
+                'default': False,
+            },
+            {
+                'name': 'dataset_cache_size',
+                'msg': 'Evict the least recently used cached datasets '
+                       'beyond this size (e.g., 500g). No limit if unset.',
+                'type': str,
+                'default': None,
+            },
             # reader related configurations
             {
                 'name': 'batch_size',
@@ -178,30 +216,14 @@ class DlioBenchmark(Application):
         """
         
         # step1: generate data if it is required before training
+        data_folder = self.config['data_path']
         if self.config['generate_data']:
-            # construct the command
-            gen_cmd = [
-                'dlio_benchmark',
-                f'workload={self.config['workload']}',
-                f'++workload.workflow.generate_data=True',
-                f'++workload.workflow.train=False',
-                f'++workload.dataset.data_folder={self.config['data_path']}' 
-            ]
-
-            if self.config['num_files_train'] is not None:
-                gen_cmd.append(f'++workload.dataset.num_files_train={self.config['num_files_train']}')
-
-            # run the command to generate data
-            Exec(' '.join(gen_cmd),
-                MpiExecInfo(env=self.mod_env,
-                            hostfile=self.jarvis.hostfile,
-                            nprocs=self.config['nprocs'],
-                            ppn=self.config['ppn']))
+            data_folder = self._generate_data()
 
         # step2: clear the system cache
-        Exec('sudo drop_caches',
-             PsshExecInfo(env=self.env,
-                        hostfile=self.jarvis.hostfile))
+        FanoutExec('sudo drop_caches',
+                   PsshExecInfo(env=self.env,
+                                hostfile=self.jarvis.hostfile))
         
         # step3: run the benchmark with the workload
         if self.config['tracing']:
@@ -213,12 +235,8 @@ class DlioBenchmark(Application):
             f'workload={self.config['workload']}',
             f'++workload.workflow.generate_data=False',
             f'++workload.workflow.train=Train',
-            f'++workload.dataset.data_folder={self.config['data_path']}'  
-        ]
+        ] + self._dataset_args(data_folder)
 
-        if self.config['num_files_train'] is not None:
-            run_cmd.append(f'++workload.dataset.num_files_train={self.config['num_files_train']}')
-        
         if self.config['batch_size'] is not None:
             run_cmd.append(f'++workload.reader.batch_size={self.config['batch_size']}')
         
@@ -241,9 +259,108 @@ class DlioBenchmark(Application):
              MpiExecInfo(env=self.mod_env,
                          hostfile=self.jarvis.hostfile,
                          nprocs=self.config['nprocs'],
-                         ppn=self.config['ppn']))
+                         ppn=self.config['ppn'],
+                         pipe_stdout=self.attach_parser(DlioParser())))
         
 
+    def _dataset_fields(self):
+        """
+        The parameters which change the generated data. Parameters which
+        only change how the data is read (e.g., batch_size, read_threads,
+        epochs) are excluded.
+
+        :return: Dict
+        """
+        return {key: self.config.get(key) for key in
+                ['num_files_train', 'num_samples_per_file',
+                 'record_length', 'format']}
+
+    def _dataset_args(self, data_folder):
+        """
+        The dlio_benchmark arguments which describe the dataset
+
+        :param data_folder: Where the dataset is
+        :return: List of str
+        """
+        args = [f'++workload.dataset.data_folder={data_folder}']
+        if self.config['num_files_train'] is not None:
+            args.append(f"++workload.dataset.num_files_train="
+                        f"{self.config['num_files_train']}")
+        if self.config.get('num_samples_per_file') is not None:
+            args.append(f"++workload.dataset.num_samples_per_file="
+                        f"{self.config['num_samples_per_file']}")
+        if self.config.get('record_length') is not None:
+            args.append(f"++workload.dataset.record_length_bytes="
+                        f"{SizeConv.to_int(self.config['record_length'])}")
+        if self.config.get('format') is not None:
+            args.append(f"++workload.dataset.format={self.config['format']}")
+        return args
+
+    def _dataset_cache(self):
+        """
+        Get the cache of generated datasets
+
+        :return: DatasetCache, or None if datasets are not cached
+        """
+        if not self.config.get('dataset_cache'):
+            return None
+        max_bytes = self.config.get('dataset_cache_size')
+        if max_bytes is not None:
+            max_bytes = SizeConv.to_int(max_bytes)
+        return DatasetCache(self.config['data_path'], max_bytes)
+
+    def _generate_data(self):
+        """
+        Generate the dataset, unless a dataset with the same parameters
+        is cached
+
+        :return: The folder of the dataset
+        """
+        cache = self._dataset_cache()
+        if cache is None:
+            self._run_generate(self.config['data_path'])
+            return self.config['data_path']
+        fields = self._dataset_fields()
+        self.dataset_key = cache.key(self.config['workload'], fields)
+        data_folder = cache.path(self.dataset_key)
+        # Sweep workers which need the same dataset wait for each other
+        with cache.lock(self.dataset_key):
+            if cache.lookup(self.dataset_key):
+                self.log(f'[DLIO] Reusing cached dataset {data_folder}',
+                         Color.GREEN)
+                return data_folder
+            cache.prepare(self.dataset_key)
+            node = self._run_generate(data_folder)
+            if node.exit_code != 0:
+                raise Exception(f'Could not generate dataset {data_folder}')
+            size = cache.commit(self.dataset_key, self.config['workload'],
+                                fields)
+        self.log(f'[DLIO] Cached dataset {data_folder} ({size} bytes)',
+                 Color.GREEN)
+        for key in cache.evict(keep=self.dataset_key):
+            self.log(f'[DLIO] Evicted cached dataset {cache.path(key)}',
+                     Color.YELLOW)
+        return data_folder
+
+    def _run_generate(self, data_folder):
+        """
+        Run dlio_benchmark to generate a dataset
+
+        :param data_folder: The folder to generate the dataset in
+        :return: The Exec
+        """
+        gen_cmd = [
+            'dlio_benchmark',
+            f"workload={self.config['workload']}",
+            '++workload.workflow.generate_data=True',
+            '++workload.workflow.train=False',
+        ] + self._dataset_args(data_folder)
+        return Exec(' '.join(gen_cmd),
+                    MpiExecInfo(env=self.mod_env,
+                                hostfile=self.jarvis.hostfile,
+                                nprocs=self.config['nprocs'],
+                                ppn=self.config['ppn']))
+
     def stop(self):
         """
         Stop a running application. E.g., OrangeFS will terminate the servers,
@@ -260,16 +377,23 @@ class DlioBenchmark(Application):
 
         :return: None
         """
-        # clear data path
-        Rm(self.config['data_path'] + '*',
-           PsshExecInfo(env=self.env,
-                        hostfile=self.jarvis.hostfile))
+        # clear data path, unless the generated datasets are cached. The
+        # cache is managed from this node, so data_path must be shared.
+        cache = self._dataset_cache()
+        if cache is not None and self.config['generate_data']:
+            for key in cache.evict(keep=self.dataset_key):
+                self.log(f'[DLIO] Evicted cached dataset {cache.path(key)}',
+                         Color.YELLOW)
+        else:
+            self.rm(self.config['data_path'] + '*',
+                    PsshExecInfo(env=self.env,
+                                 hostfile=self.jarvis.hostfile))
 
-        self.log(f'Removing dataset {self.config['data_path']}', Color.YELLOW)
+            self.log(f'Removing dataset {self.config['data_path']}', Color.YELLOW)
 
         # clear checkpoint
-        Rm(self.config['checkpoint_path'] + '*',
-           PsshExecInfo(env=self.env,
-                        hostfile=self.jarvis.hostfile))
+        self.rm(self.config['checkpoint_path'] + '*',
+                PsshExecInfo(env=self.env,
+                             hostfile=self.jarvis.hostfile))
         
         self.log(f'Removing checkpoints {self.config['checkpoint_path']}', Color.YELLOW)
@@ -3,6 +3,8 @@ This module provides classes and methods to launch Redis.
 Redis cluster is used if the hostfile has many hosts
 """
 from jarvis_cd.basic.pkg import Application
+from jarvis_cd.basic.fanout import FanoutKill
+from jarvis_cd.basic.output_parser import FilebenchParser
 from jarvis_util import *
 
 
@@ -82,6 +84,11 @@ class Filebench(Application):
             'filebench',
             f'-f {self.shared_dir}/{self.config["workload"]}.f',
         ]
+        # Each host writes its own log to the shared directory. The
+        # hostname is escaped so that ssh expands it on the remote host.
+        self.attach_parser(FilebenchParser(),
+                           f'{self.shared_dir}/filebench.*.log')
+        cmd.append(f'| tee {self.shared_dir}/filebench.\\$(hostname).log')
         cmd = ' '.join(cmd)
         self.log(cmd, color=Color.YELLOW)
         Exec(cmd,
@@ -97,9 +104,9 @@ class Filebench(Application):
 
         :return: None
         """
-        Kill('filebench',
-             PsshExecInfo(env=self.env,
-                          hostfile=self.jarvis.hostfile))
+        FanoutKill('filebench',
+                   PsshExecInfo(env=self.env,
+                                hostfile=self.jarvis.hostfile))
 
     def clean(self):
         """
@@ -108,6 +115,6 @@ class Filebench(Application):
 
         :return: None
         """
-        Rm(self.config['dir'] + '*',
-           PsshExecInfo(env=self.env,
-                        hostfile=self.jarvis.hostfile))
+        self.rm(self.config['dir'] + '*',
+                PsshExecInfo(env=self.env,
+                             hostfile=self.jarvis.hostfile))
@@ -3,6 +3,7 @@ This module provides classes and methods to launch the Ior application.
 Ior is ....
 """
 from jarvis_cd.basic.pkg import Application
+from jarvis_cd.basic.output_parser import FioJsonParser
 from jarvis_util import *
 
 
@@ -147,6 +148,7 @@ class Fio(Application):
             f'--filename={self.config["out"]}',
             f'--ioengine={self.config["engine"]}',
             f'--name=job',
+            '--output-format=json',
         ]
         # The path
         if '.' in os.path.basename(self.config['out']):
@@ -154,12 +156,12 @@ class Fio(Application):
                         exist_ok=True)
         else:
             os.makedirs(self.config['out'], exist_ok=True)
-        # pipe_stdout=self.config['log'] 
         Exec(' '.join(cmd),
              LocalExecInfo(env=self.mod_env,
                          hostfile=self.jarvis.hostfile,
                          do_dbg=self.config['do_dbg'],
-                         dbg_port=self.config['dbg_port']))
+                         dbg_port=self.config['dbg_port'],
+                         pipe_stdout=self.attach_parser(FioJsonParser())))
         
     def stop(self):
         """
@@ -177,8 +179,8 @@ class Fio(Application):
 
         :return: None
         """
-        Rm(self.config['out'] + '*',
-           LocalExecInfo())
+        self.rm(self.config['out'] + '*',
+                LocalExecInfo())
 
     def _get_stat(self, stat_dict):
         """
@@ -131,12 +131,21 @@ class Gadget2(Application):
         cmake_opts = YamlFile(buildconf).load()
         if 'FFTW_PATH' in self.env:
             cmake_opts['FFTW_PATH'] = self.env['FFTW_PATH']
-        Cmake(self.env['GADGET2_PATH'],
-              build_dir,
-              opts=cmake_opts,
-              exec_info=LocalExecInfo(env=self.env))
-        Make(build_dir, nthreads=self.config['j'],
-             exec_info=LocalExecInfo(env=self.env))
+
+        def build():
+            Cmake(self.env['GADGET2_PATH'],
+                  build_dir,
+                  opts=cmake_opts,
+                  exec_info=LocalExecInfo(env=self.env))
+            Make(build_dir, nthreads=self.config['j'],
+                 exec_info=LocalExecInfo(env=self.env))
+        # Only the build options matter, so runtime-only parameters
+        # (e.g., time_max) reuse the cached build
+        self.cached_build('gadget2', [build_dir], build,
+                          inputs=cmake_opts,
+                          src_dirs=[self.env['GADGET2_PATH']],
+                          env_vars=['GADGET2_PATH', 'FFTW_PATH',
+                                    'CC', 'CXX'])
 
     def start(self):
         """
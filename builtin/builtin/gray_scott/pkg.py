@@ -122,8 +122,8 @@ class GrayScott(Application):
             adios_dir = os.path.join(self.shared_dir, 'gray-scott-output')
             self.config['output'] = os.path.join(adios_dir,
                                                  'data')
-            Mkdir(adios_dir, PsshExecInfo(hostfile=self.jarvis.hostfile,
-                                          env=self.env))
+            self.mkdir(adios_dir, PsshExecInfo(hostfile=self.jarvis.hostfile,
+                                               env=self.env))
         settings_json = {
             'L': self.config['L'],
             'Du': self.config['Du'],
@@ -137,9 +137,9 @@ class GrayScott(Application):
             'output': f'{self.config["output"]}',
             'adios_config': self.adios2_xml_path
         }
-        Mkdir(self.config['output'],
-              PsshExecInfo(hostfile=self.jarvis.hostfile,
-                           env=self.env))
+        self.mkdir(self.config['output'],
+                   PsshExecInfo(hostfile=self.jarvis.hostfile,
+                                env=self.env))
         JsonFile(self.settings_json_path).save(settings_json)
 
         if self.config['engine'].lower() == 'bp5':
@@ -187,4 +187,4 @@ class GrayScott(Application):
         """
         output_dir = self.config['output'] + "*"
         print(f'Removing {output_dir}')
-        Rm(output_dir)
\ No newline at end of file
+        self.rm(output_dir)
\ No newline at end of file
@@ -3,6 +3,7 @@ This module provides classes and methods to launch the HermesApiBench applicatio
 HermesApiBench is ....
 """
 from jarvis_cd.basic.pkg import Application
+from jarvis_cd.basic.output_parser import HermesApiBenchParser
 from jarvis_util import *
 
 
@@ -126,7 +127,9 @@ class HermesApiBench(Application):
                               hosts=self.jarvis.hostfile,
                               ppn=self.config['ppn'],
                               do_dbg=self.config['do_dbg'],
-                              dbg_port=self.config['dbg_port']))
+                              dbg_port=self.config['dbg_port'],
+                              pipe_stdout=self.attach_parser(
+                                  HermesApiBenchParser())))
 
     def stop(self):
         """
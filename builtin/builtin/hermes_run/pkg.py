@@ -4,6 +4,8 @@ hrun is ....
 """
 
 from jarvis_cd.basic.pkg import Service, Color
+from jarvis_cd.basic.fanout import FanoutKill
+from jarvis_cd.basic.readiness import TcpProbe
 from jarvis_util import *
 
 
@@ -386,8 +388,8 @@ class HermesRun(Service):
                 'slab_sizes': ['4KB', '16KB', '64KB', '1MB']
             }
             self.config['borg_paths'].append(mount)
-            Mkdir(mount, PsshExecInfo(hostfile=self.hostfile,
-                                      env=self.env))
+            self.mkdir(mount, PsshExecInfo(hostfile=self.hostfile,
+                                           env=self.env))
         if 'ram' in self.config and self.config['ram'] != '0':
             hermes_server['devices']['ram'] = {
                 'mount_point': '',
@@ -506,8 +508,17 @@ class HermesRun(Service):
                                              hide_output=self.config['hide_output'],
                                              pipe_stdout=self.config['stdout'],
                                              pipe_stderr=self.config['stderr']))
-        time.sleep(self.config['sleep'])
-        self.log('Done sleeping')
+        self.wait_ready(self.health_probes())
+
+    def health_probes(self):
+        """
+        Every runtime accepts connections while it is up
+
+        :return: List of ReadinessProbes
+        """
+        self.get_hostfile()
+        return [TcpProbe(host, self.config['port'])
+                for host in self.hostfile.hosts]
 
     def stop(self):
         """
@@ -532,13 +543,13 @@ class HermesRun(Service):
 
     def kill(self):
         self.get_hostfile()
-        Kill('hrun',
-             PsshExecInfo(hostfile=self.hostfile,
-                          env=self.env))
+        FanoutKill('hrun',
+                   PsshExecInfo(hostfile=self.hostfile,
+                                env=self.env))
         if self.config['do_dbg']:
-            Kill('gdbserver',
-                 PsshExecInfo(hostfile=self.hostfile,
-                              env=self.env))
+            FanoutKill('gdbserver',
+                       PsshExecInfo(hostfile=self.hostfile,
+                                    env=self.env))
         self.log('Client Exited?')
         if self.daemon_pkg is not None:
             self.daemon_pkg.wait()
@@ -554,7 +565,7 @@ class HermesRun(Service):
         self.get_hostfile()
         for path in self.config['borg_paths']:
             self.log(f'Removing {path}', Color.YELLOW)
-            Rm(path, PsshExecInfo(hostfile=self.hostfile))
+            self.rm(path, PsshExecInfo(hostfile=self.hostfile))
 
     def status(self):
         """
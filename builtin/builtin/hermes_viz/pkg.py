@@ -3,6 +3,7 @@ This module provides classes and methods to launch the Ior application.
 Ior is ....
 """
 from jarvis_cd.basic.pkg import Service
+from jarvis_cd.basic.readiness import TcpProbe
 from jarvis_util import *
 
 
@@ -82,8 +83,15 @@ class HermesViz(Service):
             cmd = f'hermes_viz.py --port {self.config["port"]} --sleep_time {self.config["pooling"]} ' \
                   f'--real {self.config["real"]} --hostfile {self.config["hostfile"]} '
         self.daemon_pkg = Exec(cmd, LocalExecInfo(env=self.env, exec_async=True))
-        time.sleep(self.config['sleep'])
-        print('Finished sleeping for the visualizer')
+        self.wait_ready(self.health_probes())
+
+    def health_probes(self):
+        """
+        The flask server accepts connections while it is up
+
+        :return: List of ReadinessProbes
+        """
+        return [TcpProbe('localhost', self.config['port'])]
 
     def stop(self):
         """
@@ -3,6 +3,7 @@ This module provides classes and methods to launch the Ior application.
 Ior is ....
 """
 from jarvis_cd.basic.pkg import Application
+from jarvis_cd.basic.output_parser import IorParser
 from jarvis_util import *
 import os
 
@@ -136,7 +137,6 @@ class Ior(Application):
                         exist_ok=True)
         else:
             os.makedirs(out, exist_ok=True)
-        # pipe_stdout=self.config['log']
         Exec('which mpiexec',
              LocalExecInfo(env=self.mod_env))
         Exec(' '.join(cmd),
@@ -145,7 +145,8 @@ class Ior(Application):
                          nprocs=self.config['nprocs'],
                          ppn=self.config['ppn'],
                          do_dbg=self.config['do_dbg'],
-                         dbg_port=self.config['dbg_port']))
+                         dbg_port=self.config['dbg_port'],
+                         pipe_stdout=self.attach_parser(IorParser())))
 
     def stop(self):
         """
@@ -163,9 +164,9 @@ class Ior(Application):
 
         :return: None
         """
-        Rm(self.config['out'] + '*',
-           PsshExecInfo(env=self.env,
-                        hostfile=self.jarvis.hostfile))
+        self.rm(self.config['out'] + '*',
+                PsshExecInfo(env=self.env,
+                             hostfile=self.jarvis.hostfile))
 
     def _get_stat(self, stat_dict):
         """
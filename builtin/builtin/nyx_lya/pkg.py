@@ -95,8 +95,8 @@ class NyxLya(Application):
         
         if self.config['output'] is None:
             self.config['output'] = f'{self.nyx_lya_path}/outputs'
-            Mkdir(self.config['output'], PsshExecInfo(hostfile=self.jarvis.hostfile,
-                                          env=self.env))
+            self.mkdir(self.config['output'], PsshExecInfo(hostfile=self.jarvis.hostfile,
+                                               env=self.env))
 
         # copy a template inputs file from NYX installation path to the pkg directory
         self.copy_template_file(f'{self.nyx_lya_path}/inputs', self.inputs_path)
@@ -169,4 +169,4 @@ class NyxLya(Application):
         """
         output_dir = self.config['output'] + "*"
         print(f'Removing {output_dir}')
-        Rm(output_dir)
+        self.rm(output_dir)
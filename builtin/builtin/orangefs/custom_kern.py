@@ -1,3 +1,4 @@
+from jarvis_cd.basic.fanout import FanoutKill
 from jarvis_util import *
 
 
@@ -56,11 +57,11 @@ class OrangefsCustomKern:
                           sudo=True,
                           sudoenv=self.config['sudoenv']))
         self.log(f"Unmounting {self.config['mount']} on each client", Color.YELLOW)
-        Kill('.*pvfs2-client.*', PsshExecInfo(hosts=self.client_hosts,
+        FanoutKill('.*pvfs2-client.*', PsshExecInfo(hosts=self.client_hosts,
+                                      env=self.env))
+        FanoutKill('pvfs2-server',
+                   PsshExecInfo(hosts=self.server_hosts,
                                 env=self.env))
-        Kill('pvfs2-server',
-             PsshExecInfo(hosts=self.server_hosts,
-                          env=self.env))
         Exec('pgrep -la pvfs2-server',
              PsshExecInfo(hosts=self.client_hosts,
                           env=self.env))
@@ -1,4 +1,5 @@
 from jarvis_cd.basic.pkg import Service
+from jarvis_cd.basic.fanout import FanoutKill
 from jarvis_util import *
 import os
 
@@ -40,10 +41,10 @@ class OrangefsFuse:
                                 env=self.env))
         self.log(f"Unmounting {self.config['mount']} on each client", Color.YELLOW)
 
-        Kill('.*pvfs2-client.*', PsshExecInfo(hosts=self.client_hosts,
-                                        env=self.env))
-        Kill('pvfs2-server',
-             PsshExecInfo(hosts=self.server_hosts,
-                          env=self.env))
+        FanoutKill('.*pvfs2-client.*', PsshExecInfo(hosts=self.client_hosts,
+                                              env=self.env))
+        FanoutKill('pvfs2-server',
+                   PsshExecInfo(hosts=self.server_hosts,
+                                env=self.env))
         Exec("pgrep -la pvfs2-server", PsshExecInfo(hosts=self.client_hosts,
                                 env=self.env))
@@ -1,4 +1,5 @@
 from jarvis_cd.basic.pkg import Service
+from jarvis_cd.basic.readiness import CmdProbe
 from jarvis_util import *
 from .custom_kern import OrangefsCustomKern
 from .ares import OrangefsAres
@@ -146,12 +147,12 @@ class Orangefs(Service, OrangefsCustomKern, OrangefsAres, OrangefsFuse):
         self.log(f"Generated pvfs2 config: {self.config['pfs_conf']}", Color.YELLOW)
 
         # Create storage directories
-        Mkdir(self.config['mount'], PsshExecInfo(hosts=self.client_hosts,
-                                                 env=self.env))
-        Mkdir(self.config['storage'], PsshExecInfo(hosts=self.server_hosts,
-                                                   env=self.env))
-        Mkdir(self.config['metadata'], PsshExecInfo(hosts=self.md_hosts,
-                                                    env=self.env))
+        self.mkdir(self.config['mount'], PsshExecInfo(hosts=self.client_hosts,
+                                                      env=self.env))
+        self.mkdir(self.config['storage'], PsshExecInfo(hosts=self.server_hosts,
+                                                        env=self.env))
+        self.mkdir(self.config['metadata'], PsshExecInfo(hosts=self.md_hosts,
+                                                         env=self.env))
         self.log(f"Create mount, metadata and storage directories", Color.YELLOW)
         self.log(f"Mount at: {self.config['mount']}", Color.YELLOW)
 
@@ -197,6 +198,21 @@ class Orangefs(Service, OrangefsCustomKern, OrangefsAres, OrangefsFuse):
         else:
             self.custom_start()
 
+    def health_probes(self):
+        """
+        Every client can reach the servers through the mount while
+        orangefs is up
+
+        :return: List of ReadinessProbes
+        """
+        self._load_config()
+        return [CmdProbe(
+            f'pvfs2-ping -m {self.config["mount"]} | '
+            f'grep -q "appears to be correctly configured"',
+            PsshExecInfo(hosts=self.client_hosts,
+                         env=self.env,
+                         hide_output=True))]
+
     def stop(self):
         self._load_config()
         if self.config['ofs_mode'] == 'ares':
@@ -208,15 +224,15 @@ class Orangefs(Service, OrangefsCustomKern, OrangefsAres, OrangefsFuse):
 
     def clean(self):
         self._load_config()
-        Rm([self.config['mount'], self.config['client_log']],
-           PsshExecInfo(hosts=self.client_hosts,
-                        env=self.env))
-        Rm([self.config['storage'], self.config['log']],
-           PsshExecInfo(hosts=self.server_hosts,
-                        env=self.env))
-        Rm(self.config['metadata'],
-           PsshExecInfo(hosts=self.md_hosts,
-                        env=self.env))
+        self.rm([self.config['mount'], self.config['client_log']],
+                PsshExecInfo(hosts=self.client_hosts,
+                             env=self.env))
+        self.rm([self.config['storage'], self.config['log']],
+                PsshExecInfo(hosts=self.server_hosts,
+                             env=self.env))
+        self.rm(self.config['metadata'],
+                PsshExecInfo(hosts=self.md_hosts,
+                             env=self.env))
 
     def status(self):
         self._load_config()
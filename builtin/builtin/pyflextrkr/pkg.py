@@ -19,6 +19,7 @@ class Pyflextrkr(Application):
         Initialize paths
         """
         self.pkg_type = 'pyflextrkr'
+        self.run_time = None
         self.hermes_env_vars = ['HERMES_ADAPTER_MODE', 'HERMES_CLIENT_CONF', 
                                 'HERMES_CONF', 'LD_PRELOAD']
 
@@ -238,34 +239,16 @@ class Pyflextrkr(Application):
         self.config['config'] = new_yaml_file 
             
     def _unset_vfd_vars(self,env_vars_toset):
-        cmd = ['conda', 'env', 'config', 'vars', 'unset',]
-        
-        for env_var in env_vars_toset:
-            cmd.append(f'{env_var}')
-        cmd.append('-n')
-        cmd.append(self.config['conda_env'])
-        
-        cmd = ' '.join(cmd)
-        Exec(cmd, LocalExecInfo(env=self.mod_env,))
-        self.log(f"Pyflextrkr _unset_vfd_vars: {cmd}")
+        self.update_conda_vars(self.config['conda_env'],
+                               unset_vars=env_vars_toset)
 
     def _set_env_vars(self, env_vars_toset):
         
         self.log(f"Pyflextrkr _set_env_vars")
         
-        # Unset all env_vars_toset first
-        self._unset_vfd_vars(env_vars_toset)
-
-        cmd = [ 'conda', 'env', 'config', 'vars', 'set']
-        for env_var in env_vars_toset:
-            env_var_val = self.mod_env[env_var]
-            cmd.append(f'{env_var}={env_var_val}')
-        
-        cmd.append('-n')
-        cmd.append(self.config['conda_env'])
-        cmd = ' '.join(cmd)
-        self.log(f"Pyflextrkr _set_env_vars: {cmd}")
-        Exec(cmd, LocalExecInfo(env=self.mod_env,))
+        env_vars = {env_var: self.mod_env.get(env_var)
+                    for env_var in env_vars_toset}
+        self.update_conda_vars(self.config['conda_env'], set_vars=env_vars)
         
     
     def _construct_cmd(self):
@@ -356,10 +339,20 @@ class Pyflextrkr(Application):
                            ))
         
         end = time.time()
-        diff = end - start
-        self.log(f'Pyflextrkr TIME: {diff} seconds') # color=Color.GREEN
+        self.run_time = end - start
+        self.log(f'Pyflextrkr TIME: {self.run_time} seconds') # color=Color.GREEN
         
 
+    def _get_stat(self, stat_dict):
+        """
+        Get statistics from the application.
+
+        :param stat_dict: A dictionary of statistics.
+        :return: None
+        """
+        if self.run_time is not None:
+            stat_dict[f'{self.pkg_id}.total_time'] = self.run_time
+
     def stop(self):
         """
         Stop a running application. E.g., Pyflextrkr will terminate the servers,
@@ -3,6 +3,8 @@ This module provides classes and methods to launch the Ior application.
 Ior is ....
 """
 from jarvis_cd.basic.pkg import Service
+from jarvis_cd.basic.fanout import FanoutKill
+from jarvis_cd.basic.readiness import CmdProbe
 from jarvis_util import *
 from jarvis_util.introspect.monitor import Monitor
 
@@ -77,7 +79,10 @@ class Pymonitor(Service):
                 PsshExecInfo(env=self.env,
                             hostfile=hostfile,
                             exec_async=True))
-        time.sleep(self.config['sleep'])
+        self.wait_ready([CmdProbe("pgrep -f '[p]ymonitor'",
+                                  PsshExecInfo(env=self.env,
+                                               hostfile=hostfile,
+                                               hide_output=True))])
 
     def stop(self):
         """
@@ -86,7 +91,7 @@ class Pymonitor(Service):
 
         :return: None
         """
-        Kill('.*pymonitor.*', PsshExecInfo(env=self.env))
+        FanoutKill('.*pymonitor.*', PsshExecInfo(env=self.env))
 
     def status(self):
         pass
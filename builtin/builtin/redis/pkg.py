@@ -3,6 +3,8 @@ This module provides classes and methods to launch Redis.
 Redis cluster is used if the hostfile has many hosts
 """
 from jarvis_cd.basic.pkg import Application
+from jarvis_cd.basic.fanout import FanoutKill
+from jarvis_cd.basic.readiness import TcpProbe, CmdProbe
 from jarvis_util import *
 
 
@@ -81,8 +83,9 @@ class Redis(Application):
                           do_dbg=self.config['do_dbg'],
                           dbg_port=self.config['dbg_port'],
                           exec_async=True))
-        self.log(f'Sleeping for {self.config["sleep"]} seconds', color=Color.YELLOW)
-        time.sleep(self.config['sleep'])
+        self.log('Waiting for the servers', color=Color.YELLOW)
+        self.wait_ready([TcpProbe(host, self.config['port'])
+                         for host in hostfile.hosts])
 
         # Create redis clients
         if len(hostfile) > 1:
@@ -113,8 +116,11 @@ class Redis(Application):
                                hostfile=hostfile,
                                do_dbg=self.config['do_dbg'],
                                dbg_port=self.config['dbg_port']))
-            self.log(f'Sleeping for {self.config["sleep"]} seconds', color=Color.YELLOW)
-            time.sleep(self.config['sleep'])
+            self.log('Waiting for the cluster', color=Color.YELLOW)
+            self.wait_ready([CmdProbe(
+                f'redis-cli -p {self.config["port"]} -h {hostfile.hosts[0]} '
+                f'cluster info | grep -q cluster_state:ok',
+                LocalExecInfo(env=self.mod_env, hide_output=True))])
 
     def stop(self):
         """
@@ -124,9 +130,9 @@ class Redis(Application):
         :return: None
         """
         for i in range(3):
-            Kill('redis-server',
-                 PsshExecInfo(env=self.env,
-                              hostfile=self.jarvis.hostfile))
+            FanoutKill('redis-server',
+                       PsshExecInfo(env=self.env,
+                                    hostfile=self.jarvis.hostfile))
 
     def clean(self):
         """
@@ -4,6 +4,8 @@ SparkCluster is ....
 """
 
 from jarvis_cd.basic.pkg import Service
+from jarvis_cd.basic.fanout import FanoutExec
+from jarvis_cd.basic.readiness import TcpProbe
 from jarvis_util import *
 
 
@@ -64,13 +66,29 @@ class SparkCluster(Service):
         Exec(f'{self.config["SPARK_SCRIPTS"]}/sbin/start-master.sh',
              PsshExecInfo(env=self.env,
                           hosts=self.jarvis.hostfile.subset(1)))
-        time.sleep(1)
+        self.wait_ready([TcpProbe(self.env['SPARK_MASTER_HOST'],
+                                  self.env['SPARK_MASTER_PORT'])])
         # Start the worker nodes
+        workers = self.jarvis.hostfile.subset(self.config['num_nodes'])
         Exec(f'{self.config["SPARK_SCRIPTS"]}/sbin/start-worker.sh '
              f'{self.env["SPARK_MASTER_HOST"]}:{self.env["SPARK_MASTER_PORT"]}',
              PsshExecInfo(env=self.mod_env,
-                          hosts=self.jarvis.hostfile.subset(self.config['num_nodes'])))
-        time.sleep(self.config['sleep'])
+                          hosts=workers))
+        self.wait_ready([TcpProbe(host, self.env['SPARK_WORKER_PORT'])
+                         for host in workers.hosts])
+
+    def health_probes(self):
+        """
+        The master and every worker accept connections while the cluster
+        is up
+
+        :return: List of ReadinessProbes
+        """
+        workers = self.jarvis.hostfile.subset(self.config['num_nodes'])
+        return [TcpProbe(self.env['SPARK_MASTER_HOST'],
+                         self.env['SPARK_MASTER_PORT'])] + \
+            [TcpProbe(host, self.env['SPARK_WORKER_PORT'])
+             for host in workers.hosts]
 
     def stop(self):
         """
@@ -84,10 +102,10 @@ class SparkCluster(Service):
              PsshExecInfo(env=self.env,
                           hosts=self.jarvis.hostfile.subset(1)))
         # Start the worker nodes
-        Exec(f'{self.config["SPARK_SCRIPTS"]}/sbin/stop-worker.sh '
-             f'{self.env["SPARK_MASTER_HOST"]}',
-             PsshExecInfo(env=self.env,
-                          hosts=self.jarvis.hostfile))
+        FanoutExec(f'{self.config["SPARK_SCRIPTS"]}/sbin/stop-worker.sh '
+                   f'{self.env["SPARK_MASTER_HOST"]}',
+                   PsshExecInfo(env=self.env,
+                                hosts=self.jarvis.hostfile))
 
     def clean(self):
         """
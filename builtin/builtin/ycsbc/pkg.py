@@ -3,6 +3,7 @@ This module provides classes and methods to launch Redis.
 Redis cluster is used if the hostfile has many hosts
 """
 from jarvis_cd.basic.pkg import Application
+from jarvis_cd.basic.output_parser import YcsbcParser
 from jarvis_util import *
 
 
@@ -89,7 +90,7 @@ class Ycsbc(Application):
                            hostfile=self.jarvis.hostfile,
                            do_dbg=self.config['do_dbg'],
                            dbg_port=self.config['dbg_port'],
-                           collect_output=True))
+                           pipe_stdout=self.attach_parser(YcsbcParser())))
 
     def stop(self):
         """
@@ -116,8 +117,4 @@ class Ycsbc(Application):
         :param stat_dict: A dictionary of statistics.
         :return: None
         """
-        output = self.exec.stdout['localhost']
-        if 'throughput(ops/sec)' in output:
-            throughput = re.search(r'throughput\(ops\/sec\): ([0-9.]+)', output).group(1)
-            stat_dict[f'{self.pkg_id}.throughput'] = throughput
         stat_dict[f'{self.pkg_id}.runtime'] = self.start_time
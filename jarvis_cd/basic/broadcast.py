@@ -0,0 +1,331 @@
+"""
+This module contains the engine which copies a staged dataset from the
+head node to a node-local path (e.g., /tmp or an NVMe) on many hosts.
+
+In tree mode, every host receives the whole dataset. The head pushes the
+data to one host, then both push to one more host each, and so on. A
+host starts forwarding as soon as its own copy completes instead of
+waiting for the rest of its round, so the copy is pipelined and the total
+time grows with log2(hosts) rather than with the number of hosts.
+
+In shard mode, the files are split into one shard per host, balanced by
+size, and the head pushes every shard concurrently.
+
+Copies are made with rsync, so only changed files are sent again. Hosts
+push to each other over ssh, so they must be able to ssh to one another
+(as is needed for MPI). Each host is verified before run returns.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from jarvis_cd.basic.fanout import SshTransport
+import tempfile
+import time
+import os
+
+
+class BroadcastStats:
+    """
+    The outcome of a broadcast
+    """
+    def __init__(self):
+        self.hosts = 0
+        self.files = 0
+        self.bytes = 0
+        # The number of sequential copies before the last host had data
+        self.steps = 0
+        self.seconds = 0
+        # Dict of {host: error message}
+        self.errors = {}
+
+    def to_dict(self):
+        return {
+            'hosts': self.hosts,
+            'files': self.files,
+            'bytes': self.bytes,
+            'steps': self.steps,
+            'seconds': self.seconds,
+            'failed_hosts': len(self.errors),
+        }
+
+    def __str__(self):
+        return (f'Copied {self.files} files ({self.bytes} bytes) to '
+                f'{self.hosts - len(self.errors)}/{self.hosts} hosts in '
+                f'{self.seconds:.3f} seconds ({self.steps} steps)')
+
+
+class Broadcast:
+    """
+    Copies a directory on the head node to a node-local path on hosts
+    """
+    MODES = ['tree', 'shard']
+
+    def __init__(self, tree, dest, mode='tree', retries=2):
+        """
+        :param tree: The TreeFanout used to reach hosts. Its src is the
+        head node.
+        :param dest: The node-local directory on each host. It is made a
+        mirror of the source (or of the host's shard).
+        :param mode: 'tree' to copy everything to every host, or 'shard'
+        to copy a distinct part of the data to each host
+        :param retries: The number of times a failed copy to a host is
+        attempted again
+        """
+        if mode not in self.MODES:
+            raise Exception(f'Unknown broadcast mode: {mode}. '
+                            f'Options: {", ".join(self.MODES)}')
+        self.tree = tree
+        self.dest = dest.rstrip('/')
+        self.mode = mode
+        self.retries = retries
+        if isinstance(tree.transport, SshTransport):
+            self.ssh = ' '.join(['ssh'] + tree.transport.ssh_opts())
+        else:
+            self.ssh = 'ssh'
+
+    @staticmethod
+    def list_files(src):
+        """
+        List the files in a directory
+
+        :param src: The directory
+        :return: List of (path relative to src, size, whether it is a
+        regular file)
+        """
+        files = []
+        stack = [(src, '')]
+        while len(stack):
+            path, rel = stack.pop()
+            with os.scandir(path) as it:
+                for entry in it:
+                    entry_rel = os.path.join(rel, entry.name)
+                    if entry.is_symlink():
+                        files.append((entry_rel, 0, False))
+                    elif entry.is_dir():
+                        stack.append((entry.path, entry_rel))
+                    else:
+                        files.append((entry_rel, entry.stat().st_size, True))
+        return files
+
+    @staticmethod
+    def shard(files, hosts):
+        """
+        Split files into one shard per host. The largest files are placed
+        first, each on the host with the fewest bytes so far.
+
+        :param files: List of (rel, size, is_file)
+        :param hosts: List of hosts
+        :return: Dict of {host: list of (rel, size, is_file)}
+        """
+        shards = {host: [] for host in hosts}
+        loads = {host: 0 for host in hosts}
+        for stage_file in sorted(files, key=lambda f: (-f[1], f[0])):
+            host = min(hosts, key=lambda h: loads[h])
+            shards[host].append(stage_file)
+            loads[host] += stage_file[1]
+        return shards
+
+    def target(self, host):
+        if isinstance(self.tree.transport, SshTransport):
+            return self.tree.transport.target(host)
+        return host
+
+    def rsync_dest(self, sender, host):
+        """
+        The destination of rsync for a host. A node copying to itself
+        does not use ssh.
+
+        :param sender: The node which runs rsync
+        :param host: The host to copy to
+        :return: (command prefix, rsync options, destination)
+        """
+        if sender == host:
+            return f'mkdir -p {self.dest} && ', '', f'{self.dest}/'
+        return ('',
+                f'-e "{self.ssh}" '
+                f'--rsync-path="mkdir -p {self.dest} && rsync" ',
+                f'{self.target(host)}:{self.dest}/')
+
+    def copy_cmd(self, path, sender, host):
+        """
+        The command a holder of the data runs to copy it to a host
+
+        :param path: The directory holding the data on the sender
+        :param sender: The node which holds the data
+        :param host: The host to copy to
+        :return: The command
+        """
+        prefix, opts, dest = self.rsync_dest(sender, host)
+        return f'{prefix}rsync -a --delete {opts}{path}/ {dest}'
+
+    def shard_cmd(self, path, host, list_path):
+        """
+        The command the head runs to copy a shard to a host
+
+        :param path: The directory holding the data on the head
+        :param host: The host to copy to
+        :param list_path: A file of rsync include patterns for the shard
+        :return: The command
+        """
+        prefix, opts, dest = self.rsync_dest(self.tree.src, host)
+        return (f'{prefix}rsync -a -m --delete --delete-excluded {opts}'
+                f"--include='*/' --include-from={list_path} --exclude='*' "
+                f'{path}/ {dest}')
+
+    def verify_cmd(self):
+        """
+        The command which prints the number of files and bytes in the
+        destination of a host
+
+        :return: The command
+        """
+        return (f'test -d {self.dest} && find {self.dest} -type f '
+                f"-printf '%s\\n' | "
+                f'awk \'{{n++; s+=$1}} END {{printf "%d %.0f\\n", n, s}}\'')
+
+    @staticmethod
+    def include_pattern(rel):
+        # rsync only treats backslashes as escapes in wildcard patterns
+        if any(char in rel for char in '*?['):
+            for char in '\\*?[':
+                rel = rel.replace(char, f'\\{char}')
+        return f'/{rel}'
+
+    def _run_on(self, host, cmd):
+        try:
+            return self.tree.transport.run(self.tree.src, host, cmd)
+        except Exception as e:
+            return 255, '', str(e)
+
+    def _copy_tree(self, src, hosts, stats):
+        """
+        Copy src to every host. Each host which holds the data copies it
+        to the next pending host as soon as it is idle.
+        """
+        # Idle holders of the data: (node, path of the data, the number
+        # of steps before the node was idle)
+        holders = [(self.tree.src, src, 0)]
+        pending = list(hosts)
+        attempts = {host: 0 for host in hosts}
+        running = {}
+        parallel = max(1, self.tree.parallel)
+        with ThreadPoolExecutor(parallel) as pool:
+            while len(pending) or len(running):
+                while len(holders) and len(pending) and \
+                        len(running) < parallel:
+                    sender, path, step = holders.pop(0)
+                    host = pending.pop(0)
+                    attempts[host] += 1
+                    future = pool.submit(self._run_on, sender,
+                                         self.copy_cmd(path, sender, host))
+                    running[future] = (sender, path, step, host)
+                if len(running) == 0:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    sender, path, step, host = running.pop(future)
+                    holders.append((sender, path, step + 1))
+                    code, _, stderr = future.result()
+                    if code == 0:
+                        holders.append((host, self.dest, step + 1))
+                        stats.steps = max(stats.steps, step + 1)
+                    elif attempts[host] <= self.retries:
+                        pending.append(host)
+                    else:
+                        stats.errors[host] = \
+                            f'Copy from {sender} failed ({code}): ' \
+                            f'{stderr.strip()}'
+
+    def _copy_shards(self, src, shards, stats):
+        """
+        Copy the shard of each host from the head
+        """
+        with tempfile.TemporaryDirectory() as list_dir:
+            cmds = {}
+            for i, (host, files) in enumerate(shards.items()):
+                list_path = os.path.join(list_dir, f'shard-{i}')
+                with open(list_path, 'w', encoding='utf-8') as fp:
+                    for rel, _, _ in files:
+                        fp.write(f'{self.include_pattern(rel)}\n')
+                cmds[host] = self.shard_cmd(src, host, list_path)
+            hosts = list(cmds)
+            for _ in range(self.retries + 1):
+                if len(hosts) == 0:
+                    break
+                with ThreadPoolExecutor(max(1, min(self.tree.parallel,
+                                                   len(hosts)))) as pool:
+                    results = list(pool.map(
+                        lambda host: self._run_on(self.tree.src, cmds[host]),
+                        hosts))
+                failed = []
+                for host, (code, _, stderr) in zip(hosts, results):
+                    if code == 0:
+                        stats.errors.pop(host, None)
+                    else:
+                        stats.errors[host] = \
+                            f'Copy of shard failed ({code}): ' \
+                            f'{stderr.strip()}'
+                        failed.append(host)
+                hosts = failed
+        stats.steps = 1 if len(shards) else 0
+
+    def verify(self, hosts, expected):
+        """
+        Check that every host has the files it should
+
+        :param hosts: List of hosts
+        :param expected: Dict of {host: (files, bytes)}
+        :return: Dict of {host: error message}
+        """
+        errors = {}
+        result = self.tree.run(self.verify_cmd(), hosts)
+        for host in hosts:
+            code = result.exit_code.get(host, 255)
+            if code != 0:
+                errors[host] = f'Could not verify {self.dest} ({code}): ' \
+                               f'{result.stderr.get(host, "").strip()}'
+                continue
+            lines = result.stdout[host].strip().splitlines()
+            try:
+                found = tuple(int(val) for val in lines[-1].split())
+            except (IndexError, ValueError):
+                found = None
+            if found != tuple(expected[host]):
+                errors[host] = f'Expected {expected[host][0]} files ' \
+                               f'({expected[host][1]} bytes) in ' \
+                               f'{self.dest}, found: {found}'
+        return errors
+
+    def run(self, src, hosts):
+        """
+        Copy a directory to every host and verify the copies
+
+        :param src: The directory on the head node
+        :param hosts: The list of hosts
+        :return: BroadcastStats
+        """
+        stats = BroadcastStats()
+        start = time.time()
+        src = os.path.abspath(src).rstrip('/')
+        hosts = list(dict.fromkeys(hosts))
+        stats.hosts = len(hosts)
+        files = self.list_files(src)
+        if self.mode == 'tree':
+            total = (sum(1 for f in files if f[2]),
+                     sum(f[1] for f in files))
+            expected = {host: total for host in hosts}
+            self._copy_tree(src, hosts, stats)
+        else:
+            shards = self.shard(files, hosts)
+            expected = {host: (sum(1 for f in shard if f[2]),
+                               sum(f[1] for f in shard))
+                        for host, shard in shards.items()}
+            self._copy_shards(src, shards, stats)
+        # Hosts which could not be copied to are not verified
+        verify_hosts = [host for host in hosts if host not in stats.errors]
+        stats.errors.update(self.verify(verify_hosts, expected))
+        for host in verify_hosts:
+            if host not in stats.errors:
+                stats.files += expected[host][0]
+                stats.bytes += expected[host][1]
+        stats.seconds = time.time() - start
+        return stats
@@ -0,0 +1,205 @@
+"""
+This module contains a content-addressed cache of build artifacts. Pkgs
+which compile during configure store their build outputs here, keyed by a
+hash of the build inputs, and reuse them when the inputs did not change.
+"""
+
+import hashlib
+import shutil
+import json
+import time
+import os
+import yaml
+
+
+class BuildCache:
+    """
+    Stores build outputs under cache_dir/<key>. An entry holds one copy of
+    each cached path (file or directory) and a meta.yaml. The mtime of
+    meta.yaml is the last time the entry was used.
+    """
+    # Files which can change the result of a build
+    SOURCE_SUFFIXES = ('.c', '.cc', '.cpp', '.cxx', '.h', '.hh', '.hpp',
+                       '.f', '.F', '.f90', '.F90', '.inc', '.cmake', '.txt',
+                       '.sh', '.in', '.py', '.cu', 'Makefile')
+    META = 'meta.yaml'
+
+    def __init__(self, cache_dir, max_bytes, max_age):
+        """
+        :param cache_dir: Where cached builds are stored
+        :param max_bytes: Evict the least-recently used builds beyond this
+        :param max_age: Evict builds unused for this many seconds
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    @staticmethod
+    def source_signature(src_dir):
+        """
+        Hash the path, size, and mtime of every source file in a tree.
+        Build outputs (e.g., .o, .exe) do not affect the signature.
+
+        :param src_dir: The root of the source tree
+        :return: The hex digest
+        """
+        sha = hashlib.sha1()
+        for root, dirs, files in os.walk(src_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if not name.endswith(BuildCache.SOURCE_SUFFIXES):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                rel = os.path.relpath(path, src_dir)
+                sha.update(f'{rel}:{stat.st_size}:{stat.st_mtime_ns}\n'
+                           .encode('utf-8'))
+        return sha.hexdigest()
+
+    def key(self, name, inputs=None, src_dirs=None, env=None):
+        """
+        Compute the key of a build
+
+        :param name: The name of the build (e.g., the pkg type)
+        :param inputs: Build options (e.g., cmake opts)
+        :param src_dirs: Source trees the build reads
+        :param env: The environment variables the build depends on
+        :return: The hex digest
+        """
+        desc = {
+            'name': name,
+            'inputs': inputs,
+            'src': {src_dir: self.source_signature(src_dir)
+                    for src_dir in (src_dirs or [])},
+            'env': env,
+        }
+        text = json.dumps(desc, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    @staticmethod
+    def _remove(path):
+        if os.path.islink(path) or os.path.isfile(path):
+            os.remove(path)
+        elif os.path.isdir(path):
+            shutil.rmtree(path)
+
+    @staticmethod
+    def _size(path):
+        if os.path.isfile(path):
+            return os.path.getsize(path)
+        size = 0
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+        return size
+
+    def restore(self, key, paths, mode='link'):
+        """
+        Place a cached build at the given paths
+
+        :param key: The key of the build
+        :param paths: The paths the build produces
+        :param mode: 'link' to symlink into the cache, 'copy' to copy
+        :return: True if the build was cached
+        """
+        entry = self.entry_dir(key)
+        meta_path = os.path.join(entry, self.META)
+        if not os.path.exists(meta_path):
+            return False
+        for i, path in enumerate(paths):
+            cached = os.path.join(entry, str(i))
+            if not os.path.lexists(cached):
+                return False
+            if os.path.islink(path) and os.readlink(path) == cached:
+                continue
+            self._remove(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if mode == 'link':
+                os.symlink(cached, path)
+            elif os.path.isdir(cached):
+                shutil.copytree(cached, path, symlinks=True)
+            else:
+                shutil.copy2(cached, path)
+        os.utime(meta_path)
+        return True
+
+    def store(self, key, paths, name=None):
+        """
+        Copy freshly built paths into the cache
+
+        :param key: The key of the build
+        :param paths: The paths the build produced
+        :param name: The name of the build
+        :return: None
+        """
+        entry = self.entry_dir(key)
+        if os.path.exists(entry):
+            return
+        tmp_entry = f'{entry}.{os.getpid()}.tmp'
+        self._remove(tmp_entry)
+        os.makedirs(tmp_entry)
+        size = 0
+        for i, path in enumerate(paths):
+            cached = os.path.join(tmp_entry, str(i))
+            if os.path.isdir(path):
+                shutil.copytree(path, cached, symlinks=True)
+            else:
+                shutil.copy2(path, cached)
+            size += self._size(cached)
+        with open(os.path.join(tmp_entry, self.META), 'w',
+                  encoding='utf-8') as fp:
+            yaml.dump({'name': name, 'paths': list(paths), 'size': size,
+                       'created': time.time()}, fp)
+        try:
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # Another process stored the same build first
+            self._remove(tmp_entry)
+
+    def entries(self):
+        """
+        List the cached builds
+
+        :return: List of (key, size, last_used), most recently used first
+        """
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for key in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, key, self.META)
+            if key.endswith('.tmp') or not os.path.exists(meta_path):
+                continue
+            with open(meta_path, 'r', encoding='utf-8') as fp:
+                meta = yaml.safe_load(fp)
+            entries.append((key, meta['size'], os.path.getmtime(meta_path)))
+        entries.sort(key=lambda entry: entry[2], reverse=True)
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Remove builds unused for longer than max_age, then the least
+        recently used builds until the cache fits in max_bytes.
+
+        :param keep: A key which must not be evicted
+        :return: The list of evicted keys
+        """
+        evicted = []
+        total = 0
+        now = time.time()
+        for key, size, last_used in self.entries():
+            if key != keep and (now - last_used > self.max_age or
+                                total + size > self.max_bytes):
+                shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+                evicted.append(key)
+                continue
+            total += size
+        return evicted
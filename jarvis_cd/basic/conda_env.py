@@ -0,0 +1,136 @@
+"""
+This module manages the environment variables of conda environments
+(i.e., what "conda env config vars set/unset" does) without the conda CLI.
+conda keeps the variables of an environment in the JSON file
+<prefix>/conda-meta/state as {"env_vars": {...}}. The variables are read
+from it directly, and the file is only rewritten if they changed.
+"""
+
+import subprocess
+import json
+import os
+
+
+class CondaEnv:
+    """
+    The variables of one conda environment
+    """
+    # Prefixes found with "conda env list" (slow), by name
+    prefixes = None
+
+    def __init__(self, name, env=None):
+        """
+        :param name: The name or prefix of the conda environment
+        :param env: The environment used to locate conda (e.g., CONDA_EXE).
+        Defaults to os.environ.
+        """
+        self.name = name
+        self.prefix = self.find_prefix(name, env)
+        self.state_path = os.path.join(self.prefix, 'conda-meta', 'state')
+
+    @staticmethod
+    def envs_dirs(env):
+        """
+        The directories conda creates named environments in
+
+        :param env: The environment variables
+        :return: List of directories
+        """
+        dirs = []
+        for var in ['CONDA_ENVS_PATH', 'CONDA_ENVS_DIRS']:
+            if env.get(var):
+                dirs += env[var].split(os.pathsep)
+        if env.get('CONDA_EXE'):
+            root = os.path.dirname(os.path.dirname(env['CONDA_EXE']))
+            dirs.append(os.path.join(root, 'envs'))
+        dirs.append(os.path.join(os.path.expanduser('~'), '.conda', 'envs'))
+        return [envs_dir for envs_dir in dirs if len(envs_dir)]
+
+    @staticmethod
+    def find_prefix(name, env=None):
+        """
+        Find the prefix of a conda environment
+
+        :param name: The name or prefix of the environment
+        :param env: The environment variables
+        :return: The prefix
+        """
+        if env is None:
+            env = os.environ
+        if os.sep in name:
+            if os.path.isdir(os.path.join(name, 'conda-meta')):
+                return name
+            raise Exception(f'{name} is not a conda environment')
+        candidates = [os.path.join(envs_dir, name)
+                      for envs_dir in CondaEnv.envs_dirs(env)]
+        if env.get('CONDA_PREFIX') and \
+                os.path.basename(env['CONDA_PREFIX']) == name:
+            candidates.insert(0, env['CONDA_PREFIX'])
+        if name == 'base' and env.get('CONDA_EXE'):
+            candidates.insert(0, os.path.dirname(os.path.dirname(
+                env['CONDA_EXE'])))
+        for prefix in candidates:
+            if os.path.isdir(os.path.join(prefix, 'conda-meta')):
+                return prefix
+        # Ask conda as a last resort
+        if CondaEnv.prefixes is None:
+            CondaEnv.prefixes = {}
+            try:
+                proc = subprocess.run(['conda', 'env', 'list', '--json'],
+                                      capture_output=True, text=True,
+                                      env=dict(env), check=True)
+                for prefix in json.loads(proc.stdout).get('envs', []):
+                    CondaEnv.prefixes.setdefault(os.path.basename(prefix),
+                                                 prefix)
+            except (OSError, ValueError, subprocess.CalledProcessError):
+                pass
+        if name in CondaEnv.prefixes:
+            return CondaEnv.prefixes[name]
+        raise Exception(f'Could not find the conda environment {name}')
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, 'r', encoding='utf-8') as fp:
+            text = fp.read()
+        return json.loads(text) if text.strip() else {}
+
+    def save_state(self, state):
+        tmp_path = f'{self.state_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            fp.write(json.dumps(state, ensure_ascii=False))
+        os.replace(tmp_path, self.state_path)
+
+    def get_vars(self):
+        """
+        Get the variables of the environment
+
+        :return: Dict of {name: value}
+        """
+        return dict(self.load_state().get('env_vars') or {})
+
+    def update(self, set_vars=None, unset_vars=None):
+        """
+        Set and unset variables in one write. Nothing is written if the
+        variables already have these values.
+
+        :param set_vars: Dict of {name: value}. None values are unset.
+        :param unset_vars: List of names to unset
+        :return: The sorted list of names which changed
+        """
+        state = self.load_state()
+        old_vars = dict(state.get('env_vars') or {})
+        new_vars = dict(old_vars)
+        for name in unset_vars or []:
+            new_vars.pop(name, None)
+        for name, val in (set_vars or {}).items():
+            if val is None:
+                new_vars.pop(name, None)
+            else:
+                new_vars[name] = str(val)
+        changed = sorted(name for name in set(old_vars) | set(new_vars)
+                         if old_vars.get(name) != new_vars.get(name))
+        if len(changed):
+            state['env_vars'] = new_vars
+            self.save_state(state)
+        return changed
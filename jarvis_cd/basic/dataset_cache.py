@@ -0,0 +1,202 @@
+"""
+This module contains a cache of generated datasets. A benchmark which
+generates a synthetic dataset (e.g., dlio_benchmark) generates it into
+<data_path>/<key>, where the key is a fingerprint of the parameters which
+change the data. Parameters which only change how the data is read
+(e.g., batch size) are not part of the key, so iterator points which only
+vary them reuse the dataset.
+
+A dataset is complete once its DATASET_META file exists. The mtime of the
+file is the last time the dataset was used. The data path must be on
+storage every host sees (e.g., a PFS), like the data of the benchmark,
+since the cache is only managed from the head node.
+
+Concurrent sweep workers share the data path. A dataset is generated and
+evicted while holding a lock on <data_path>/<key>.lock, so two workers
+never generate the same dataset at once, and a dataset being generated is
+never evicted.
+"""
+
+from contextlib import contextmanager
+import hashlib
+import fcntl
+import shutil
+import json
+import time
+import re
+import os
+import yaml
+
+
+class DatasetCache:
+    """
+    Keeps generated datasets under data_path, one directory per key
+    """
+    META = 'DATASET_META.yaml'
+    KEY_LEN = 16
+    KEY_RE = re.compile(r'^[0-9a-f]{16}$')
+    # Incomplete datasets modified more recently than this may still be
+    # generated by a process which does not hold the lock
+    STALE_SECONDS = 3600
+
+    def __init__(self, data_path, max_bytes=None):
+        """
+        :param data_path: The directory holding the datasets
+        :param max_bytes: Evict the least-recently used datasets beyond
+        this. None for no limit.
+        """
+        self.data_path = data_path
+        self.max_bytes = max_bytes
+
+    def key(self, name, fields):
+        """
+        Compute the key of a dataset
+
+        :param name: The name of the generator (e.g., the workload)
+        :param fields: Dict of the parameters which change the data
+        :return: The hex digest
+        """
+        text = json.dumps({'name': name, 'fields': fields}, sort_keys=True,
+                          default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:self.KEY_LEN]
+
+    def path(self, key):
+        return os.path.join(self.data_path, key)
+
+    @contextmanager
+    def lock(self, key, blocking=True):
+        """
+        Lock a dataset against other processes. Hold the lock while
+        looking up, preparing, and generating a dataset.
+
+        :param key: The key of the dataset
+        :param blocking: Wait for the lock instead of giving up
+        :return: Whether the lock was acquired
+        """
+        os.makedirs(self.data_path, exist_ok=True)
+        fd = os.open(os.path.join(self.data_path, f'{key}.lock'),
+                     os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX |
+                            (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+
+    def lookup(self, key):
+        """
+        Check whether a complete dataset exists. Marks it as used.
+
+        :param key: The key of the dataset
+        :return: bool
+        """
+        meta_path = os.path.join(self.path(key), self.META)
+        if not os.path.exists(meta_path):
+            return False
+        os.utime(meta_path)
+        return True
+
+    def prepare(self, key):
+        """
+        Remove what an interrupted generation left behind, so the dataset
+        can be generated into an empty directory. Call while holding the
+        lock of the dataset.
+
+        :param key: The key of the dataset
+        :return: The path of the dataset
+        """
+        path = self.path(key)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        return path
+
+    @staticmethod
+    def _size(path):
+        size = 0
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+        return size
+
+    def commit(self, key, name=None, fields=None):
+        """
+        Mark a freshly generated dataset as complete
+
+        :param key: The key of the dataset
+        :param name: The name of the generator
+        :param fields: The parameters of the dataset
+        :return: The size of the dataset in bytes
+        """
+        path = self.path(key)
+        size = self._size(path)
+        tmp_path = os.path.join(path, f'{self.META}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            yaml.dump({'name': name, 'fields': fields, 'size': size,
+                       'created': time.time()}, fp)
+        os.replace(tmp_path, os.path.join(path, self.META))
+        return size
+
+    def entries(self):
+        """
+        List the datasets. Only directories named like keys are
+        considered, so other files in the data path are never touched.
+
+        :return: List of (key, size, last_used), most recently used
+        first. Incomplete datasets have a size of None, and last_used is
+        the mtime of their directory.
+        """
+        entries = []
+        if not os.path.isdir(self.data_path):
+            return entries
+        for key in os.listdir(self.data_path):
+            if not self.KEY_RE.match(key) or \
+                    not os.path.isdir(self.path(key)):
+                continue
+            meta_path = os.path.join(self.path(key), self.META)
+            if not os.path.exists(meta_path):
+                entries.append((key, None, os.path.getmtime(self.path(key))))
+                continue
+            with open(meta_path, 'r', encoding='utf-8') as fp:
+                meta = yaml.safe_load(fp)
+            entries.append((key, meta['size'], os.path.getmtime(meta_path)))
+        entries.sort(key=lambda entry: entry[2], reverse=True)
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Remove incomplete datasets, then the least recently used datasets
+        until the cache fits in max_bytes. Datasets locked by another
+        process and recently modified incomplete datasets are skipped,
+        since they may still be generated.
+
+        :param keep: A key which must not be evicted
+        :return: The list of evicted keys
+        """
+        evicted = []
+        entries = self.entries()
+        total = sum(size or 0 for key, size, _ in entries if key == keep)
+        now = time.time()
+        for key, size, last_used in entries:
+            if key == keep:
+                continue
+            if size is None:
+                remove = now - last_used > self.STALE_SECONDS
+            else:
+                remove = self.max_bytes is not None and \
+                    total + size > self.max_bytes
+            if remove:
+                with self.lock(key, blocking=False) as locked:
+                    if locked:
+                        shutil.rmtree(self.path(key), ignore_errors=True)
+                        evicted.append(key)
+                        continue
+            total += size or 0
+        return evicted
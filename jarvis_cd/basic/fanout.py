@@ -0,0 +1,405 @@
+"""
+This module contains a tree fanout for running a command on many hosts.
+Instead of connecting to every host directly, the head node connects to
+K relays. Each relay runs the command on its own subset of hosts (and
+recursively fans out again if the subset is large) and sends the exit
+codes and output back to the head.
+
+A relay is started over ssh as:
+
+python3 -m jarvis_cd.basic.fanout relay <payload>
+
+The fanout can be benchmarked on a single machine with a simulated cluster:
+
+python3 -m jarvis_cd.basic.fanout bench [num_hosts] [latency] [fanout]
+"""
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import threading
+import base64
+import shlex
+import json
+import math
+import time
+import sys
+import os
+from jarvis_cd.basic.tracing import Tracer, span
+
+
+class FanoutResult:
+    """
+    The aggregated outcome of running a command on many hosts
+    """
+    def __init__(self):
+        self.exit_code = {}
+        self.stdout = {}
+        self.stderr = {}
+        # The relays the head node contacted
+        self.relays = []
+        # The hosts whose relay failed and were contacted by the head
+        self.retried = []
+
+    def add(self, host, exit_code, stdout='', stderr=''):
+        self.exit_code[host] = exit_code
+        self.stdout[host] = stdout
+        self.stderr[host] = stderr
+
+    def update(self, results):
+        """
+        Merge results sent back by a relay
+
+        :param results: Dict of {host: [exit_code, stdout, stderr]}
+        :return: None
+        """
+        for host, (exit_code, stdout, stderr) in results.items():
+            self.add(host, exit_code, stdout, stderr)
+
+    def failed_hosts(self):
+        return [host for host, exit_code in self.exit_code.items()
+                if exit_code != 0]
+
+    def to_dict(self):
+        return {host: [self.exit_code[host], self.stdout[host],
+                       self.stderr[host]]
+                for host in self.exit_code}
+
+
+class FanoutTransport(ABC):
+    """
+    How a node runs a command on another host, or asks a relay to
+    run it on a subset of hosts
+    """
+    @abstractmethod
+    def run(self, src, host, cmd, env=None):
+        """
+        Run a command on a host
+
+        :param src: The node issuing the command
+        :param host: The host to run the command on
+        :param cmd: The command
+        :param env: Environment variables to set
+        :return: (exit_code, stdout, stderr)
+        """
+        pass
+
+    @abstractmethod
+    def relay(self, src, relay, hosts, cmd, env, fanout, parallel):
+        """
+        Ask a relay to run a command on hosts
+
+        :param src: The node issuing the command
+        :param relay: The relay host (also one of hosts)
+        :param hosts: The hosts the relay is responsible for
+        :param cmd: The command
+        :param env: Environment variables to set
+        :param fanout: The number of relays each relay may use
+        :param parallel: The max concurrent connections of a node
+        :return: Dict of {host: [exit_code, stdout, stderr]}
+        """
+        pass
+
+
+class SshTransport(FanoutTransport):
+    """
+    Run commands over ssh. Relays run this module on the relay host, so
+    jarvis_cd must be importable there (e.g., on a shared file system).
+    """
+    def __init__(self, user=None, pkey=None, port=None, strict_ssh=False,
+                 python='python3'):
+        self.user = user
+        self.pkey = pkey
+        self.port = port
+        self.strict_ssh = strict_ssh
+        self.python = python
+
+    def ssh_opts(self):
+        """
+        The options of ssh, excluding the host
+
+        :return: List of str
+        """
+        opts = []
+        if not self.strict_ssh:
+            opts += ['-o', 'StrictHostKeyChecking=no']
+        if self.pkey is not None:
+            opts += ['-i', self.pkey]
+        if self.port is not None:
+            opts += ['-p', str(self.port)]
+        return opts
+
+    def target(self, host):
+        if self.user is not None:
+            return f'{self.user}@{host}'
+        return host
+
+    def ssh_args(self, host):
+        return ['ssh'] + self.ssh_opts() + [self.target(host)]
+
+    @staticmethod
+    def env_cmd(cmd, env):
+        if not env:
+            return cmd
+        exports = ' '.join(f'{key}={shlex.quote(str(val))}'
+                           for key, val in env.items()
+                           if val is not None)
+        return f'export {exports}; {cmd}'
+
+    def run(self, src, host, cmd, env=None):
+        cmd = f'export JARVIS_FANOUT_HOST={shlex.quote(host)}; ' \
+              f'{self.env_cmd(cmd, env)}'
+        if host == src:
+            args = ['bash', '-c', cmd]
+        else:
+            args = self.ssh_args(host) + [cmd]
+        proc = subprocess.run(args, capture_output=True, text=True,
+                              stdin=subprocess.DEVNULL, check=False)
+        return proc.returncode, proc.stdout, proc.stderr
+
+    def relay(self, src, relay, hosts, cmd, env, fanout, parallel):
+        payload = encode_payload({
+            'relay': relay, 'hosts': hosts, 'cmd': cmd, 'env': env,
+            'fanout': fanout, 'parallel': parallel,
+            'ssh': {'user': self.user, 'pkey': self.pkey, 'port': self.port,
+                    'strict_ssh': self.strict_ssh, 'python': self.python},
+        })
+        code, stdout, stderr = self.run(
+            src, relay, f'{self.python} -m jarvis_cd.basic.fanout '
+                        f'relay {payload}')
+        if code != 0:
+            raise Exception(f'Relay {relay} failed ({code}): {stderr}')
+        return json.loads(stdout.strip().splitlines()[-1])
+
+
+class LocalTransport(FanoutTransport):
+    """
+    A stand-in for a cluster. Every "host" runs on the local machine and
+    each connection costs latency seconds, like an ssh handshake.
+    """
+    def __init__(self, latency=.01, run_cmds=False):
+        """
+        :param latency: The cost of opening a connection (seconds)
+        :param run_cmds: Actually run commands in a local shell. Otherwise,
+        commands succeed immediately.
+        """
+        self.latency = latency
+        self.run_cmds = run_cmds
+        self.lock = threading.Lock()
+        # The number of connections opened by each node
+        self.connections = {}
+        # Hosts whose relay should fail (to test recovery)
+        self.bad_relays = set()
+
+    def connect(self, src):
+        with self.lock:
+            self.connections[src] = self.connections.get(src, 0) + 1
+        time.sleep(self.latency)
+
+    def run(self, src, host, cmd, env=None):
+        if host != src:
+            self.connect(src)
+        if not self.run_cmds:
+            return 0, '', ''
+        proc_env = dict(os.environ)
+        proc_env.update({key: str(val) for key, val in (env or {}).items()
+                         if val is not None})
+        proc_env['JARVIS_FANOUT_HOST'] = host
+        proc = subprocess.run(['bash', '-c', cmd], capture_output=True,
+                              text=True, env=proc_env, check=False)
+        return proc.returncode, proc.stdout, proc.stderr
+
+    def relay(self, src, relay, hosts, cmd, env, fanout, parallel):
+        self.connect(src)
+        if relay in self.bad_relays:
+            raise Exception(f'Relay {relay} is unreachable')
+        tree = TreeFanout(self, fanout, parallel, src=relay)
+        return tree.run(cmd, hosts, env).to_dict()
+
+
+class TreeFanout:
+    """
+    Runs a command on many hosts through a tree of relays
+    """
+    def __init__(self, transport, fanout=32, parallel=64, src='localhost'):
+        """
+        :param transport: The FanoutTransport
+        :param fanout: The number of relays a node contacts. The hosts are
+        contacted directly if there are at most this many.
+        :param parallel: The max concurrent connections of a node
+        :param src: The name of the node running this fanout
+        """
+        self.transport = transport
+        self.fanout = fanout
+        self.parallel = parallel
+        self.src = src
+
+    def partition(self, hosts):
+        """
+        Split hosts into contiguous groups, one per relay. The first host
+        of a group is its relay.
+
+        :param hosts: The list of hosts
+        :return: List of lists of hosts
+        """
+        size = math.ceil(len(hosts) / self.fanout)
+        return [hosts[i:i + size] for i in range(0, len(hosts), size)]
+
+    def run(self, cmd, hosts, env=None):
+        """
+        Run a command on every host
+
+        :param cmd: The command
+        :param hosts: The list of hosts
+        :param env: Environment variables to set
+        :return: FanoutResult
+        """
+        result = FanoutResult()
+        hosts = list(hosts)
+        if self.fanout <= 1 or len(hosts) <= self.fanout:
+            self._run_direct(cmd, hosts, env, result)
+            return result
+        groups = self.partition(hosts)
+        result.relays = [group[0] for group in groups]
+        retry = []
+        with ThreadPoolExecutor(self.parallel) as pool:
+            futures = [(group, pool.submit(
+                self.transport.relay, self.src, group[0], group, cmd, env,
+                self.fanout, self.parallel)) for group in groups]
+            for group, future in futures:
+                try:
+                    result.update(future.result())
+                except Exception:
+                    pass
+                retry += [host for host in group
+                          if host not in result.exit_code]
+        # Contact the hosts of failed relays directly
+        if len(retry):
+            result.retried = retry
+            self._run_direct(cmd, retry, env, result)
+        return result
+
+    def _run_direct(self, cmd, hosts, env, result):
+        def run_host(host):
+            try:
+                return self.transport.run(self.src, host, cmd, env)
+            except Exception as e:
+                return 255, '', str(e)
+
+        with ThreadPoolExecutor(max(1, min(self.parallel,
+                                           len(hosts)))) as pool:
+            for host, (code, stdout, stderr) in zip(
+                    hosts, pool.map(run_host, hosts)):
+                result.add(host, code, stdout, stderr)
+
+
+class FanoutExec:
+    """
+    A drop-in for Exec(cmd, PsshExecInfo(...)) which goes through a tree
+    of relays when fanout is enabled in the jarvis config and the
+    hostfile is large enough. Otherwise, it runs the command with Exec.
+    """
+    def __init__(self, cmd, exec_info, jarvis=None):
+        """
+        :param cmd: The command to run on every host
+        :param exec_info: The PsshExecInfo
+        :param jarvis: The JarvisManager (defaults to the singleton)
+        """
+        from jarvis_util.shell.exec import Exec
+        if jarvis is None:
+            from jarvis_cd.basic.jarvis_manager import JarvisManager
+            jarvis = JarvisManager.get_instance()
+        hosts = []
+        if exec_info.hostfile is not None:
+            hosts = list(exec_info.hostfile.hosts)
+        tree = jarvis.get_fanout(exec_info, len(hosts))
+        if tree is None:
+            exe = Exec(cmd, exec_info)
+            self.exit_code = exe.exit_code
+            self.stdout = exe.stdout
+            self.stderr = exe.stderr
+            self.result = None
+            return
+        with span('fanout', 'exec', cmd=str(cmd)[:Tracer.MAX_CMD],
+                  hosts=len(hosts), fanout=tree.fanout):
+            self.result = tree.run(cmd, hosts, exec_info.env)
+        self.exit_code = self.result.exit_code
+        self.stdout = self.result.stdout
+        self.stderr = self.result.stderr
+
+
+class FanoutKill(FanoutExec):
+    """
+    A drop-in for Kill(cmd, PsshExecInfo(...)) which goes through the
+    tree of relays like FanoutExec
+    """
+    def __init__(self, cmd, exec_info, partial=True, jarvis=None):
+        """
+        :param cmd: The pattern of the processes to kill
+        :param exec_info: The PsshExecInfo
+        :param partial: Match the pattern against the full command line
+        :param jarvis: The JarvisManager (defaults to the singleton)
+        """
+        partial_cmd = '-f' if partial else ''
+        super().__init__(f'pkill -9 {partial_cmd} {cmd}', exec_info, jarvis)
+
+
+def encode_payload(payload):
+    text = json.dumps(payload)
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+
+def decode_payload(payload):
+    return json.loads(base64.urlsafe_b64decode(payload.encode('ascii')))
+
+
+def run_relay(payload):
+    """
+    The entry point of a relay. Prints the results as a line of JSON.
+
+    :param payload: The payload encoded by SshTransport.relay
+    :return: None
+    """
+    payload = decode_payload(payload)
+    transport = SshTransport(**payload['ssh'])
+    tree = TreeFanout(transport, payload['fanout'], payload['parallel'],
+                      src=payload['relay'])
+    result = tree.run(payload['cmd'], payload['hosts'], payload['env'])
+    print(json.dumps(result.to_dict()))
+
+
+def bench(num_hosts=1000, latency=.01, fanout=32, parallel=64):
+    """
+    Compare a direct fanout and a tree fanout on a simulated cluster
+
+    :param num_hosts: The number of simulated hosts
+    :param latency: The cost of opening a connection (seconds)
+    :param fanout: The number of relays of each node
+    :param parallel: The max concurrent connections of a node
+    :return: Dict of {mode: (seconds, head connections)}
+    """
+    hosts = [f'host{i}' for i in range(num_hosts)]
+    stats = {}
+    for mode, tree_fanout in [('direct', 1), ('tree', fanout)]:
+        transport = LocalTransport(latency)
+        tree = TreeFanout(transport, tree_fanout, parallel)
+        start = time.time()
+        result = tree.run('true', hosts)
+        seconds = time.time() - start
+        assert len(result.exit_code) == num_hosts
+        stats[mode] = (seconds, transport.connections['localhost'])
+        print(f'{mode}: {num_hosts} hosts in {seconds:.3f}s, '
+              f'{transport.connections["localhost"]} head connections')
+    return stats
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == 'relay':
+        run_relay(sys.argv[2])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        args = sys.argv[2:]
+        bench(int(args[0]) if len(args) > 0 else 1000,
+              float(args[1]) if len(args) > 1 else .01,
+              int(args[2]) if len(args) > 2 else 32)
+    else:
+        print(__doc__)
@@ -0,0 +1,154 @@
+"""
+This module contains a batch of remote file system operations. While a
+pipeline configures or cleans its pkgs, the directories they create and
+remove are queued instead of each opening its own ssh sessions. The batch
+then runs as a single script on every host (through one fanout), and
+reports which operations failed on which hosts.
+"""
+
+import shlex
+
+
+class FsOp:
+    """
+    A queued file system operation
+    """
+    CMDS = {
+        'mkdir': 'mkdir -p',
+        'rm': 'rm -rf',
+    }
+
+    def __init__(self, index, kind, paths, hosts, pkg_id=None):
+        """
+        :param index: The position of the operation in the batch
+        :param kind: 'mkdir' or 'rm'
+        :param paths: The list of paths. Globs are expanded on each host.
+        :param hosts: The hosts to run the operation on
+        :param pkg_id: The pkg which issued the operation
+        """
+        self.index = index
+        self.kind = kind
+        self.paths = paths
+        self.hosts = hosts
+        self.pkg_id = pkg_id
+
+    def cmd(self):
+        return f'{self.CMDS[self.kind]} {" ".join(self.paths)}'
+
+    def __str__(self):
+        if self.pkg_id is not None:
+            return f'{self.pkg_id}: {self.cmd()}'
+        return self.cmd()
+
+
+class FsBatch:
+    """
+    Queues file system operations and runs them as one script per host
+    """
+    # The batch pkgs currently queue operations in
+    active = None
+    FAIL_MARKER = 'JARVIS_FS_FAIL'
+
+    def __init__(self):
+        self.ops = []
+        self.exec_info = None
+        self.errors = []
+
+    @staticmethod
+    def get_hosts(exec_info):
+        """
+        Get the hosts an exec_info runs on
+
+        :param exec_info: A LocalExecInfo, PsshExecInfo, or None
+        :return: List of hosts
+        """
+        hostfile = getattr(exec_info, 'hostfile', None)
+        if hostfile is None or len(hostfile.hosts) == 0:
+            return ['localhost']
+        return list(hostfile.hosts)
+
+    def add(self, kind, paths, exec_info=None, pkg_id=None):
+        """
+        Queue an operation
+
+        :param kind: 'mkdir' or 'rm'
+        :param paths: A path or list of paths
+        :param exec_info: Where the operation would have run
+        :param pkg_id: The pkg which issued the operation
+        :return: None
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+        paths = [str(path) for path in paths]
+        if len(paths) == 0:
+            return
+        if self.exec_info is None and exec_info is not None and \
+                getattr(exec_info, 'hostfile', None) is not None:
+            self.exec_info = exec_info
+        self.ops.append(FsOp(len(self.ops), kind, paths,
+                             self.get_hosts(exec_info), pkg_id))
+
+    def hosts(self):
+        hosts = []
+        seen = set()
+        for op in self.ops:
+            for host in op.hosts:
+                if host not in seen:
+                    seen.add(host)
+                    hosts.append(host)
+        return hosts
+
+    def script(self):
+        """
+        Build the script run on every host. Operations which only target
+        some hosts check JARVIS_FANOUT_HOST, which the fanout sets to the
+        name of the host in the hostfile.
+
+        :return: The script
+        """
+        all_hosts = set(self.hosts())
+        lines = []
+        for op in self.ops:
+            line = (f'out=$({op.cmd()} 2>&1) || echo "{self.FAIL_MARKER} '
+                    f'{op.index} $(echo "$out" | tr "\\n" " ")"')
+            if set(op.hosts) != all_hosts:
+                pattern = '|'.join(shlex.quote(host) for host in op.hosts)
+                line = f'case "$JARVIS_FANOUT_HOST" in {pattern}) {line};; esac'
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def parse(self, host, stdout):
+        """
+        Find the operations which failed on a host
+
+        :param host: The host
+        :param stdout: The output of the script on the host
+        :return: List of (FsOp, host, message)
+        """
+        errors = []
+        for line in stdout.splitlines():
+            if not line.startswith(self.FAIL_MARKER):
+                continue
+            parts = line.split(' ', 2)
+            op = self.ops[int(parts[1])]
+            errors.append((op, host, parts[2] if len(parts) > 2 else ''))
+        return errors
+
+    def flush(self, tree):
+        """
+        Run the queued operations
+
+        :param tree: The TreeFanout to run the script with
+        :return: List of (FsOp, host, message) for each failure
+        """
+        self.errors = []
+        if len(self.ops) == 0:
+            return self.errors
+        result = tree.run(self.script(), self.hosts())
+        for host, exit_code in result.exit_code.items():
+            errors = self.parse(host, result.stdout[host])
+            if exit_code != 0 and len(errors) == 0:
+                errors = [(None, host, result.stderr[host].strip())]
+            self.errors += errors
+        self.ops = []
+        return self.errors
@@ -11,12 +11,16 @@ from jarvis_util.util.import_mod import load_class
 from jarvis_util.util.naming import to_camel_case
 from jarvis_util.util.expand_env import expand_env
 from jarvis_util.util.hostfile import Hostfile
-from jarvis_util.introspect.system_info import ResourceGraph
-from jarvis_util.shell.filesystem import Mkdir
 from jarvis_util.shell.pssh_exec import PsshExecInfo
 from jarvis_util.shell.local_exec import LocalExecInfo
+from jarvis_cd.basic.pkg_index import PkgIndex
+from jarvis_cd.basic.build_cache import BuildCache
+from jarvis_cd.basic.lib_index import LibIndex
+from jarvis_cd.basic.fanout import TreeFanout, SshTransport, FanoutExec
 from pathlib import Path
 import getpass
+import hashlib
+import shlex
 import yaml
 import sys
 
@@ -49,6 +53,8 @@ class JarvisManager:
         self.shared_dir = None
         # The current pipeline (per-user)
         self.cur_pipeline = None
+        # The state backend for new pipelines (yaml or sqlite)
+        self.pipeline_store = 'yaml'
         # Path to local jarvis configuration directory
         self.local_config_dir = os.path.join(Path.home(), '.jarvis')
         # Path to local jarvis builtin package directory
@@ -64,8 +70,41 @@ class JarvisManager:
         #  The path to the jarvis resource graph (global across users)
         self.resource_graph_path = os.path.join(self.local_config_dir,
                                                 'resource_graph.yaml')
-        # The Jarvis resource graph (global across users)
-        self.resource_graph = None
+        # The Jarvis resource graph (global across users, loaded on access)
+        self._resource_graph = None
+        # Path to the persistent index of pkg types across repos
+        self.pkg_index_path = os.path.join(self.local_config_dir,
+                                           'pkg_index.yaml')
+        # The index of pkg types (loaded on first construct_pkg)
+        self.pkg_index = None
+        # Path to the record of directories created on each hostfile
+        self.prepared_dirs_path = os.path.join(self.local_config_dir,
+                                               'prepared_dirs.yaml')
+        # The max number of distinct hostfiles to remember prepared dirs for
+        self.max_prepared_hostfiles = 32
+        # Where cached build artifacts are stored
+        self.build_cache_dir = os.path.join(self.local_config_dir,
+                                            'build_cache')
+        # Evict cached builds beyond this size (bytes) or age (seconds)
+        self.build_cache_max_size = 20 * (1 << 30)
+        self.build_cache_max_age = 30 * 24 * 3600
+        # Path to the persistent index of shared libraries
+        self.lib_index_path = os.path.join(self.local_config_dir,
+                                           'lib_index.yaml')
+        # The index of shared libraries (loaded on first find_library)
+        self.lib_index = None
+        # The number of relays for hostfile-wide commands (0 disables)
+        self.fanout = 0
+        # Use relays only for at least this many hosts
+        self.fanout_min_hosts = 128
+        # The max concurrent connections of the head and each relay
+        self.fanout_parallel = 64
+        # Reuse one ssh connection per host while a pipeline runs
+        self.ssh_pool = False
+        # Pooled connections close after being idle this long (seconds)
+        self.ssh_pool_persist = 600
+        # Record spans of pipeline phases and export them as trace files
+        self.trace = False
         self.hostfile = None
         self.repos = []
         self.load()
@@ -95,9 +134,10 @@ class JarvisManager:
             # Per-user parameters
             'HOSTFILE': None,
             'CUR_PIPELINE': None,
+            'PIPELINE_STORE': 'yaml',
         }
         self.load_repos()
-        self.resource_graph = ResourceGraph()
+        self.resource_graph = self._new_resource_graph()
         self.hostfile = Hostfile()
         os.makedirs(self.local_config_dir, exist_ok=True)
         self.save()
@@ -136,17 +176,31 @@ class JarvisManager:
         os.makedirs(f'{self.config_dir}', exist_ok=True)
         os.makedirs(f'{self.env_dir}', exist_ok=True)
         self.private_dir = expand_env(self.jarvis_conf['PRIVATE_DIR'])
-        Mkdir(self.private_dir,
-              PsshExecInfo(hostfile=self.hostfile))
         if self.jarvis_conf['SHARED_DIR'] is not None:
             self.shared_dir = expand_env(self.jarvis_conf['SHARED_DIR'])
             os.makedirs(f'{self.shared_dir}', exist_ok=True)
-        # Read global resource graph
-        if os.path.exists(self.resource_graph_path):
-            self.resource_graph = ResourceGraph().load(self.resource_graph_path)
-        else:
-            self.resource_graph = ResourceGraph()
+        # The global resource graph is read on first access
+        self._resource_graph = None
         self.cur_pipeline = self.jarvis_conf['CUR_PIPELINE']
+        self.pipeline_store = self.jarvis_conf.get('PIPELINE_STORE', 'yaml')
+        # Builds must be visible on every node, so prefer the shared dir
+        if self.shared_dir is not None:
+            self.build_cache_dir = os.path.join(self.shared_dir, 'build_cache')
+        self.build_cache_dir = expand_env(self.jarvis_conf.get(
+            'BUILD_CACHE_DIR', self.build_cache_dir))
+        self.build_cache_max_size = self.jarvis_conf.get(
+            'BUILD_CACHE_MAX_SIZE', self.build_cache_max_size)
+        self.build_cache_max_age = self.jarvis_conf.get(
+            'BUILD_CACHE_MAX_AGE', self.build_cache_max_age)
+        self.fanout = self.jarvis_conf.get('FANOUT', self.fanout)
+        self.fanout_min_hosts = self.jarvis_conf.get(
+            'FANOUT_MIN_HOSTS', self.fanout_min_hosts)
+        self.fanout_parallel = self.jarvis_conf.get(
+            'FANOUT_PARALLEL', self.fanout_parallel)
+        self.ssh_pool = self.jarvis_conf.get('SSH_POOL', self.ssh_pool)
+        self.ssh_pool_persist = self.jarvis_conf.get(
+            'SSH_POOL_PERSIST', self.ssh_pool_persist)
+        self.trace = self.jarvis_conf.get('TRACE', self.trace)
         try:
             self.hostfile = Hostfile(hostfile=self.jarvis_conf['HOSTFILE'])
         except Exception as e:
@@ -154,8 +208,34 @@ class JarvisManager:
             self.hostfile = Hostfile()
             print(f"An error occurred: {e}")
             print(f"Error arguments: {e.args}")
+        self.prepare_dirs([self.private_dir])
         return self
 
+    @staticmethod
+    def _new_resource_graph():
+        # The resource graph pulls in the introspection stack, so it is
+        # imported only by commands which actually use it
+        from jarvis_util.introspect.system_info import ResourceGraph
+        return ResourceGraph()
+
+    @property
+    def resource_graph(self):
+        """
+        The global resource graph. Loaded from resource_graph_path on
+        first access.
+        """
+        if self._resource_graph is None:
+            if os.path.exists(self.resource_graph_path):
+                self._resource_graph = self._new_resource_graph().load(
+                    self.resource_graph_path)
+            else:
+                self._resource_graph = self._new_resource_graph()
+        return self._resource_graph
+
+    @resource_graph.setter
+    def resource_graph(self, resource_graph):
+        self._resource_graph = resource_graph
+
     def save(self):
         """
         Save the jarvis config to config/jarvis_config.yaml
@@ -165,12 +245,13 @@ class JarvisManager:
         # Update jarvis conf
         if self.jarvis_conf:
             self.jarvis_conf['CUR_PIPELINE'] = self.cur_pipeline
+            self.jarvis_conf['PIPELINE_STORE'] = self.pipeline_store
             self.jarvis_conf['HOSTFILE'] = self.hostfile.path
         # Update repos
         YamlFile(self.jarvis_repos_path).save({'REPOS': self.repos})
-        # Save global resource graph
-        if self.resource_graph:
-            self.resource_graph.save(self.resource_graph_path)
+        # Save global resource graph (only if it was ever loaded)
+        if self._resource_graph:
+            self._resource_graph.save(self.resource_graph_path)
         # Save global and per-user conf
         if self.jarvis_conf:
             YamlFile(self.jarvis_conf_path).save(self.jarvis_conf)
@@ -186,6 +267,67 @@ class JarvisManager:
         else:
             self.hostfile = Hostfile()
 
+    def hostfile_hash(self):
+        """
+        Hash the contents of the current hostfile
+
+        :return: A hex digest of the host list
+        """
+        hosts = '\n'.join(self.hostfile.hosts)
+        return hashlib.sha1(hosts.encode('utf-8')).hexdigest()
+
+    def _load_prepared_dirs(self):
+        if not os.path.exists(self.prepared_dirs_path):
+            return []
+        prepared = YamlFile(self.prepared_dirs_path).load()
+        if not isinstance(prepared, list):
+            return []
+        return prepared
+
+    def prepare_dirs(self, paths, force=False):
+        """
+        Create directories on every host in the hostfile. Directories which
+        were already created for a hostfile with the same contents are
+        skipped, so no ssh sessions are opened when nothing changed.
+
+        :param paths: A list of directories to create
+        :param force: Create the directories even if they were recorded
+        :return: None
+        """
+        key = self.hostfile_hash()
+        prepared = self._load_prepared_dirs()
+        entry = {'hostfile': key, 'dirs': []}
+        for prepared_entry in prepared:
+            if prepared_entry['hostfile'] == key:
+                entry = prepared_entry
+                break
+        if force:
+            missing = list(paths)
+        else:
+            missing = [path for path in paths if path not in entry['dirs']]
+        if len(missing) == 0:
+            return
+        FanoutExec(f'mkdir -p {" ".join(shlex.quote(path) for path in missing)}',
+                   PsshExecInfo(hostfile=self.hostfile), jarvis=self)
+        entry['dirs'] += [path for path in missing
+                          if path not in entry['dirs']]
+        # The most recently prepared hostfile goes last
+        prepared = [prepared_entry for prepared_entry in prepared
+                    if prepared_entry['hostfile'] != key]
+        prepared.append(entry)
+        prepared = prepared[-self.max_prepared_hostfiles:]
+        os.makedirs(self.local_config_dir, exist_ok=True)
+        YamlFile(self.prepared_dirs_path).save(prepared)
+
+    def clear_prepared_dirs(self):
+        """
+        Forget which directories were created on each hostfile
+
+        :return: None
+        """
+        if os.path.exists(self.prepared_dirs_path):
+            os.remove(self.prepared_dirs_path)
+
     def bootstrap_from(self, machine):
         """
         Bootstrap jarvis for a particular machine
@@ -211,7 +353,7 @@ class JarvisManager:
 
         rg_path = f'{self.builtin_dir}/resource_graph/{machine}.yaml'
         if os.path.exists(rg_path):
-            self.resource_graph = ResourceGraph().load(rg_path)
+            self.resource_graph = self._new_resource_graph().load(rg_path)
             new_rg_path = f'{self.local_config_dir}/resource_graph.yaml'
             self.resource_graph.save(new_rg_path)
 
@@ -232,8 +374,19 @@ class JarvisManager:
         :return: None
         """
         Rm(self.shared_dir, LocalExecInfo())
-        Rm(self.private_dir, PsshExecInfo(
-            hostfile=self.hostfile))
+        FanoutExec(f'rm -rf {shlex.quote(self.private_dir)}',
+                   PsshExecInfo(hostfile=self.hostfile), jarvis=self)
+        self.clear_prepared_dirs()
+
+    def set_pipeline_store(self, backend):
+        """
+        Set the state backend used by new pipelines
+
+        :param backend: Either 'yaml' (one file per pkg) or 'sqlite'
+        (one file per pipeline)
+        :return: None
+        """
+        self.pipeline_store = backend
 
     def print_config(self):
         print(yaml.dump(self.jarvis_conf))
@@ -258,7 +411,7 @@ class JarvisManager:
 
         :return: None
         """
-        self.resource_graph = ResourceGraph()
+        self.resource_graph = self._new_resource_graph()
         self.resource_graph.build(
             PsshExecInfo(hostfile=self.hostfile), net_sleep=net_sleep)
 
@@ -269,6 +422,48 @@ class JarvisManager:
         self.resource_graph.modify(
             PsshExecInfo(hostfile=self.hostfile), net_sleep=net_sleep)
 
+    def get_build_cache(self):
+        """
+        Get the cache of build artifacts
+
+        :return: BuildCache
+        """
+        return BuildCache(self.build_cache_dir, self.build_cache_max_size,
+                          self.build_cache_max_age)
+
+    def get_fanout(self, exec_info, num_hosts, direct=False):
+        """
+        Get the tree fanout for a command on many hosts
+
+        :param exec_info: The PsshExecInfo of the command
+        :param num_hosts: The number of hosts the command runs on
+        :param direct: Return a fanout which contacts every host directly
+        instead of None when relays should not be used
+        :return: TreeFanout, or None if the hosts should be contacted
+        directly
+        """
+        use_relays = self.fanout and \
+            num_hosts >= max(self.fanout_min_hosts, 2)
+        if not use_relays and not direct:
+            return None
+        transport = SshTransport(user=getattr(exec_info, 'user', None),
+                                 pkey=getattr(exec_info, 'pkey', None),
+                                 port=getattr(exec_info, 'port', None),
+                                 strict_ssh=getattr(exec_info, 'strict_ssh',
+                                                    False))
+        return TreeFanout(transport, self.fanout if use_relays else 1,
+                          self.fanout_parallel)
+
+    def get_lib_index(self):
+        """
+        Get the index of shared libraries used by Pkg.find_library
+
+        :return: LibIndex
+        """
+        if self.lib_index is None:
+            self.lib_index = LibIndex(self.lib_index_path)
+        return self.lib_index
+
     def list_pipelines(self):
         """
         Get a list of all created pipelines
@@ -415,6 +610,32 @@ class JarvisManager:
             if not pkg_type.startswith('_'):
                 print(f'  {pkg_type}')
 
+    def load_pkg_index(self, rebuild=False):
+        """
+        Load the index of pkg types across all repos. The index is rebuilt
+        automatically if the repos or their directories changed.
+
+        :param rebuild: Force the index to be rebuilt from the repos
+        :return: PkgIndex
+        """
+        if self.pkg_index is None:
+            self.pkg_index = PkgIndex(self.pkg_index_path)
+        if rebuild:
+            self.pkg_index.build(self.repos).save()
+        else:
+            self.pkg_index.load(self.repos)
+        return self.pkg_index
+
+    def index_repos(self):
+        """
+        Rebuild the pkg index and print a summary
+
+        :return: None
+        """
+        index = self.load_pkg_index(rebuild=True)
+        print(f'Indexed {len(index.pkgs)} pkgs across '
+              f'{len(self.repos)} repos in {self.pkg_index_path}')
+
     def construct_pkg(self, pkg_type):
         """
         Construct a pkg by searching repos for the pkg type
@@ -422,6 +643,11 @@ class JarvisManager:
         :param pkg_type: The type of pkg to load (snake case).
         :return: A object of type "pkg_type"
         """
+        entry = self.load_pkg_index().find(pkg_type)
+        if entry is not None:
+            cls = load_class(entry['module'], entry['path'], entry['cls'])
+            if cls is not None:
+                return cls()
         for repo in self.repos:
             cls = load_class(f"{repo['name']}.{pkg_type}.pkg",
                              repo['path'],
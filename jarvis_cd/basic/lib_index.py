@@ -0,0 +1,274 @@
+"""
+This module contains a persistent index of the shared libraries in the
+library search path. It lets Pkg.find_library resolve a library without
+spawning a compiler or listing every directory of LD_LIBRARY_PATH.
+"""
+
+from jarvis_util.shell.exec import Exec
+from jarvis_util.shell.local_exec import LocalExecInfo
+from collections import Counter
+import struct
+import os
+import yaml
+
+
+class LibIndex:
+    """
+    An index of {directory: shared objects} stored as YAML under the local
+    jarvis config dir. A directory is listed again only when its mtime
+    changes. The system libraries are read from ld.so.cache.
+    """
+    LD_CACHE_PATH = '/etc/ld.so.cache'
+    # Searched after ld.so.cache, just like the dynamic loader
+    DEFAULT_DIRS = ['/lib64', '/usr/lib64', '/lib', '/usr/lib',
+                    '/usr/local/lib64', '/usr/local/lib']
+    OLD_MAGIC = b'ld.so-1.7.0'
+    NEW_MAGIC = b'glibc-ld.so.cache1.1'
+
+    def __init__(self, index_path, ld_cache_path=None):
+        """
+        :param index_path: Where the index is persisted
+        :param ld_cache_path: The ld.so.cache to read system libraries from
+        """
+        self.index_path = index_path
+        self.ld_cache_path = ld_cache_path or self.LD_CACHE_PATH
+        self.dirs = {}
+        self.loaded = False
+        self.dirty = False
+        self.num_scans = 0
+        self.ld_cache = None
+        self.ld_cache_mtime = None
+        # {dirs: (mtimes, {soname: path})}, one per distinct search path
+        self.envs = {}
+        # {(compiler, PATH, LIBRARY_PATH, name): path}
+        self.compiler_libs = {}
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        """
+        Load the persisted index
+
+        :return: self
+        """
+        if self.loaded:
+            return self
+        self.dirs = {}
+        if os.path.exists(self.index_path):
+            loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+            with open(self.index_path, 'r', encoding='utf-8') as fp:
+                index = yaml.load(fp, Loader=loader)
+            if isinstance(index, dict):
+                self.dirs = index.get('DIRS', {})
+        self.loaded = True
+        return self
+
+    def save(self):
+        """
+        Atomically persist the index if it changed
+
+        :return: self
+        """
+        if not self.dirty:
+            return self
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            yaml.dump({'DIRS': self.dirs}, fp)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+        return self
+
+    def dir_libs(self, path, mtime):
+        """
+        Get the shared objects in a directory, listing it only if it
+        changed since it was indexed
+
+        :param path: The directory
+        :param mtime: The current mtime of the directory
+        :return: List of file names
+        """
+        entry = self.dirs.get(path)
+        if entry is not None and entry['mtime'] == mtime:
+            return entry['libs']
+        try:
+            libs = sorted(name for name in os.listdir(path) if '.so' in name)
+        except OSError:
+            libs = []
+        self.dirs[path] = {'mtime': mtime, 'libs': libs}
+        self.dirty = True
+        self.num_scans += 1
+        return libs
+
+    @classmethod
+    def parse_ld_cache(cls, path):
+        """
+        Parse the soname to path mapping of an ld.so.cache. Only entries
+        of the native ABI (the most common one in the cache) are kept.
+
+        :param path: The path to ld.so.cache
+        :return: Dict of {soname: path}, in the cache's priority order
+        """
+        try:
+            with open(path, 'rb') as fp:
+                data = fp.read()
+        except OSError:
+            return {}
+        off = 0
+        if data.startswith(cls.OLD_MAGIC):
+            nlibs = struct.unpack_from('<I', data, 12)[0]
+            off = 16 + nlibs * 12
+            off = (off + 7) & ~7
+        if data[off:off + len(cls.NEW_MAGIC)] != cls.NEW_MAGIC:
+            return {}
+        nlibs = struct.unpack_from('<I', data, off + 20)[0]
+
+        def read_str(str_off):
+            start = off + str_off
+            end = data.find(b'\0', start)
+            return data[start:end].decode('utf-8', errors='replace')
+
+        entries = []
+        for i in range(nlibs):
+            flags, key, value = struct.unpack_from('<iII', data,
+                                                   off + 48 + i * 24)
+            entries.append((flags, key, value))
+        if len(entries) == 0:
+            return {}
+        native = Counter(flags for flags, _, _ in entries).most_common(1)[0][0]
+        libs = {}
+        for flags, key, value in entries:
+            if flags != native:
+                continue
+            soname = read_str(key)
+            if soname not in libs:
+                libs[soname] = read_str(value)
+        return libs
+
+    def get_ld_cache(self):
+        """
+        Get the libraries of ld.so.cache, parsing it again if it changed
+
+        :return: Dict of {soname: path}
+        """
+        mtime = self._mtime(self.ld_cache_path)
+        if self.ld_cache is None or mtime != self.ld_cache_mtime:
+            self.ld_cache = self.parse_ld_cache(self.ld_cache_path)
+            self.ld_cache_mtime = mtime
+        return self.ld_cache
+
+    def env_index(self, dirs):
+        """
+        Get the {soname: path} index of a search path. Earlier directories
+        take priority, followed by ld.so.cache and the default directories.
+        The index is rebuilt only if one of the directories changed.
+
+        :param dirs: The ordered list of directories to search
+        :return: Dict of {soname: path}, in priority order
+        """
+        self.load()
+        dirs = tuple(dirs)
+        mtimes = tuple(self._mtime(path) for path in dirs + tuple(
+            self.DEFAULT_DIRS)) + (self._mtime(self.ld_cache_path),)
+        cached = self.envs.get(dirs)
+        if cached is not None and cached[0] == mtimes:
+            return cached[1]
+        index = {}
+        for path, mtime in zip(dirs, mtimes):
+            if mtime is None:
+                continue
+            for name in self.dir_libs(path, mtime):
+                index.setdefault(name, os.path.join(path, name))
+        for name, path in self.get_ld_cache().items():
+            index.setdefault(name, path)
+        for path, mtime in zip(self.DEFAULT_DIRS, mtimes[len(dirs):]):
+            if mtime is None:
+                continue
+            for name in self.dir_libs(path, mtime):
+                index.setdefault(name, os.path.join(path, name))
+        self.envs[dirs] = (mtimes, index)
+        self.save()
+        return index
+
+    @staticmethod
+    def soname_version(soname, prefixes):
+        """
+        Get the version of a versioned soname (e.g., libasan.so.8.0.0)
+
+        :param soname: The soname
+        :param prefixes: The unversioned names, each followed by a dot
+        :return: Tuple of ints, or None if the soname does not match
+        """
+        if not soname.startswith(prefixes):
+            return None
+        version = soname[soname.index('.so.') + 4:].split('.')
+        if not all(part.isdigit() for part in version):
+            return None
+        return tuple(int(part) for part in version)
+
+    def find(self, names, dirs):
+        """
+        Find the first library which exactly matches one of the names
+
+        :param names: The file names to search for (e.g., libasan.so)
+        :param dirs: The ordered list of directories to search
+        :return: The path to the library or None
+        """
+        index = self.env_index(dirs)
+        for name in names:
+            if name in index:
+                return index[name]
+        return None
+
+    def find_compiler(self, names, env):
+        """
+        Ask the compiler where it would link one of the names from
+        (cc -print-file-name). This finds the runtimes shipped with the
+        compiler (e.g., libasan.so). Results are memoized per compiler,
+        PATH and LIBRARY_PATH.
+
+        :param names: The file names to search for
+        :param env: The environment the compiler runs in. CC selects the
+        compiler, which defaults to cc.
+        :return: The path to the library or None
+        """
+        compiler = env.get('CC') or 'cc'
+        for name in names:
+            key = (compiler, env.get('PATH'), env.get('LIBRARY_PATH'), name)
+            if key not in self.compiler_libs:
+                exe = Exec(f'{compiler} -print-file-name={name}',
+                           LocalExecInfo(env=env,
+                                         hide_output=True,
+                                         collect_output=True))
+                res = exe.stdout['localhost'].strip()
+                self.compiler_libs[key] = \
+                    res if len(res) and res != name else None
+            if self.compiler_libs[key] is not None:
+                return self.compiler_libs[key]
+        return None
+
+    def find_versioned(self, names, dirs):
+        """
+        Find the highest versioned soname of one of the names (e.g.,
+        libasan.so.8 over libasan.so.6). Ties go to the earlier directory.
+
+        :param names: The unversioned file names to search for
+        :param dirs: The ordered list of directories to search
+        :return: The path to the library or None
+        """
+        index = self.env_index(dirs)
+        prefixes = tuple(f'{name}.' for name in names)
+        best = None
+        best_version = None
+        for soname, path in index.items():
+            version = self.soname_version(soname, prefixes)
+            if version is not None and \
+                    (best_version is None or version > best_version):
+                best = path
+                best_version = version
+        return best
@@ -0,0 +1,335 @@
+"""
+This module contains parsers which turn the output of benchmarks into
+typed metrics. An Application attaches a parser to a log file which its
+output is piped to. After each iterator run, the log is parsed line by
+line and the metrics are added to the stats as {pkg_id}.{metric}.
+
+E.g., in the start() of a pkg:
+
+Exec(cmd, MpiExecInfo(...,
+                      pipe_stdout=self.attach_parser(IorParser())))
+"""
+
+from abc import ABC, abstractmethod
+import json
+import re
+
+
+def to_number(text):
+    """
+    Convert a number printed by a benchmark to an int or float
+
+    :param text: The text of the number
+    :return: int, float, or None if the text is not a number
+    """
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def to_metric_name(text):
+    """
+    Convert a label printed by a benchmark (e.g., "LPUSH (needed ...)")
+    to a metric name (e.g., lpush_needed)
+
+    :param text: The label
+    :return: The metric name
+    """
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+class OutputParser(ABC):
+    """
+    Turns the output of a benchmark into a dict of metrics
+    """
+    # Metrics summed when merging the output of several hosts. Other
+    # metrics are averaged.
+    SUM = set()
+
+    @abstractmethod
+    def parse(self, lines):
+        """
+        Parse the output of a benchmark
+
+        :param lines: An iterable of the lines of output (e.g., a file)
+        :return: Dict of {metric: int or float}
+        """
+        pass
+
+    def parse_file(self, path):
+        """
+        Parse an output file without reading it into memory
+
+        :param path: The path to the output
+        :return: Dict of {metric: int or float}
+        """
+        with open(path, 'r', encoding='utf-8', errors='replace') as fp:
+            return self.parse(fp)
+
+    def merge(self, metrics_list):
+        """
+        Combine the metrics of several output files (e.g., one per host)
+
+        :param metrics_list: List of metric dicts
+        :return: Dict of {metric: int or float}
+        """
+        if len(metrics_list) == 1:
+            return metrics_list[0]
+        merged = {}
+        for metrics in metrics_list:
+            for key, val in metrics.items():
+                merged.setdefault(key, []).append(val)
+        return {key: sum(vals) if key.split('.')[-1] in self.SUM
+                else sum(vals) / len(vals)
+                for key, vals in merged.items()}
+
+
+class IorParser(OutputParser):
+    """
+    Parses the "Summary of all tests" table of IOR. Bandwidths are in
+    MiB/s and times in seconds. E.g., write_bw_mean, read_iops_max.
+    """
+    COLUMNS = {
+        'Max(MiB)': 'bw_max',
+        'Min(MiB)': 'bw_min',
+        'Mean(MiB)': 'bw_mean',
+        'Max(OPs)': 'iops_max',
+        'Min(OPs)': 'iops_min',
+        'Mean(OPs)': 'iops_mean',
+        'Mean(s)': 'time_mean',
+    }
+    MAX_BW = re.compile(r'^Max (Write|Read):\s+([0-9.]+) MiB/sec')
+
+    def parse(self, lines):
+        metrics = {}
+        header = None
+        for line in lines:
+            tokens = line.split()
+            if len(tokens) == 0:
+                header = None
+                continue
+            if tokens[0] == 'Operation':
+                header = tokens
+                continue
+            match = self.MAX_BW.match(line)
+            if match:
+                metrics.setdefault(f'{match.group(1).lower()}_bw_max',
+                                   to_number(match.group(2)))
+                continue
+            if header is None or tokens[0] not in ('write', 'read'):
+                continue
+            for col, val in zip(header[1:], tokens[1:]):
+                if col in self.COLUMNS:
+                    val = to_number(val)
+                    if val is not None:
+                        metrics[f'{tokens[0]}_{self.COLUMNS[col]}'] = val
+        return metrics
+
+
+class FioJsonParser(OutputParser):
+    """
+    Parses the output of fio --output-format=json. The bandwidth (KiB/s)
+    and IOPS of each job are summed. Latencies (usec) are averaged.
+    E.g., read_bw, write_iops, write_lat_mean.
+    """
+    SUM = {'read_bw', 'read_iops', 'read_io_bytes',
+           'write_bw', 'write_iops', 'write_io_bytes'}
+
+    def parse(self, lines):
+        # fio may print warnings before the JSON document
+        text = ''.join(lines)
+        start = text.find('{')
+        if start < 0:
+            return {}
+        doc = json.loads(text[start:])
+        metrics = {}
+        lats = {}
+        for job in doc.get('jobs', []):
+            for op in ('read', 'write'):
+                stats = job.get(op)
+                if not stats or stats.get('io_bytes', 0) == 0:
+                    continue
+                for key in ('bw', 'iops', 'io_bytes'):
+                    name = f'{op}_{key}'
+                    metrics[name] = metrics.get(name, 0) + stats.get(key, 0)
+                lat_ns = stats.get('lat_ns', stats.get('clat_ns', {}))
+                if 'mean' in lat_ns:
+                    lats.setdefault(op, []).append(lat_ns['mean'] / 1000)
+        for op, vals in lats.items():
+            metrics[f'{op}_lat_mean'] = sum(vals) / len(vals)
+        return metrics
+
+
+class RedisBenchmarkCsvParser(OutputParser):
+    """
+    Parses the output of redis-benchmark --csv. Every test (e.g., SET)
+    reports its requests per second and, in newer versions, latencies
+    (ms). E.g., set_rps, get_p99_latency_ms.
+    """
+    def parse(self, lines):
+        metrics = {}
+        columns = ['test', 'rps']
+        for line in lines:
+            fields = [field.strip().strip('"') for field in
+                      line.strip().split('","')]
+            if len(fields) < 2:
+                continue
+            if fields[0] == 'test':
+                columns = fields
+                continue
+            test = to_metric_name(fields[0].split('(')[0])
+            for col, val in zip(columns[1:], fields[1:]):
+                val = to_number(val)
+                if val is not None:
+                    metrics[f'{test}_{to_metric_name(col)}'] = val
+        return metrics
+
+
+class YcsbcParser(OutputParser):
+    """
+    Parses the throughput (ops/sec) printed by YCSB
+    """
+    SUM = {'throughput'}
+    THROUGHPUT = re.compile(r'throughput\(ops/sec\)[:,]\s*([0-9.]+)',
+                            re.IGNORECASE)
+
+    def parse(self, lines):
+        metrics = {}
+        for line in lines:
+            match = self.THROUGHPUT.search(line)
+            if match:
+                metrics['throughput'] = to_number(match.group(1))
+        return metrics
+
+
+class FilebenchParser(OutputParser):
+    """
+    Parses the "IO Summary" line of filebench. E.g., ops, ops_per_sec,
+    mb_per_sec, lat_ms.
+    """
+    SUM = {'ops', 'ops_per_sec', 'mb_per_sec'}
+    PATTERNS = [
+        ('ops', re.compile(r'IO Summary:\s*([0-9]+) ops')),
+        ('ops_per_sec', re.compile(r'([0-9.]+) ops/s')),
+        ('mb_per_sec', re.compile(r'([0-9.]+)mb/s')),
+        ('lat_ms', re.compile(r'([0-9.]+)ms(?:/op| latency)')),
+    ]
+
+    def parse(self, lines):
+        metrics = {}
+        for line in lines:
+            if 'IO Summary' not in line:
+                continue
+            for name, pattern in self.PATTERNS:
+                match = pattern.search(line)
+                if match:
+                    metrics[name] = to_number(match.group(1))
+        return metrics
+
+
+class DlioParser(OutputParser):
+    """
+    Parses the per-epoch training throughput and the final [METRIC]
+    summary of dlio_benchmark. E.g., epoch1.throughput (samples/s),
+    epoch1.time (s), train_throughput, train_io_throughput (MB/s).
+    """
+    EPOCH = re.compile(r'Epoch (\d+) - Block \d+ \[Training\] '
+                       r'(Accelerator Utilization \[AU\] \(%\)|'
+                       r'Throughput \(samples/second\)):\s*([0-9.]+)')
+    EPOCH_END = re.compile(r'Ending epoch (\d+) - (\d+) steps completed '
+                           r'in ([0-9.]+) s')
+    SUMMARY = {
+        'Training Accelerator Utilization [AU] (%)': 'train_au',
+        'Training Throughput (samples/second)': 'train_throughput',
+        'Training I/O Throughput (MB/second)': 'train_io_throughput',
+    }
+
+    def parse(self, lines):
+        metrics = {}
+        blocks = {}
+        for line in lines:
+            match = self.EPOCH.search(line)
+            if match:
+                name = 'au' if match.group(2).startswith('Acc') \
+                    else 'throughput'
+                blocks.setdefault(f'epoch{match.group(1)}.{name}', []).append(
+                    to_number(match.group(3)))
+                continue
+            match = self.EPOCH_END.search(line)
+            if match:
+                metrics[f'epoch{match.group(1)}.steps'] = \
+                    to_number(match.group(2))
+                metrics[f'epoch{match.group(1)}.time'] = \
+                    to_number(match.group(3))
+                continue
+            if '[METRIC]' not in line:
+                continue
+            for label, name in self.SUMMARY.items():
+                pos = line.find(f'{label}:')
+                if pos >= 0:
+                    val = line[pos + len(label) + 1:].split()
+                    if len(val):
+                        metrics[name] = to_number(val[0])
+        # Average the blocks of each epoch
+        for name, vals in blocks.items():
+            metrics[name] = sum(vals) / len(vals)
+        return metrics
+
+
+class HermesApiBenchParser(OutputParser):
+    """
+    Parses the timings of hermes_api_bench. Each test prints a line like:
+    "Put: Time: 1.5 sec, MBps (or MOps): 100, Count: 1024, Nprocs: 4".
+    E.g., put.time, put.mbps.
+    """
+    FIELDS = {
+        'Time': 'time',
+        'MBps (or MOps)': 'mbps',
+        'Count': 'count',
+        'Nprocs': 'nprocs',
+    }
+    FIELD = re.compile(r'([A-Za-z][A-Za-z ()/]*?):\s*(-?[0-9][0-9.eE+-]*)')
+
+    def parse(self, lines):
+        metrics = {}
+        for line in lines:
+            if 'Time:' not in line:
+                continue
+            test, fields = line.split(':', 1)
+            test = to_metric_name(test)
+            for field, val in self.FIELD.findall(fields):
+                field = field.strip()
+                val = to_number(val)
+                if val is not None:
+                    name = self.FIELDS.get(field, to_metric_name(field))
+                    metrics[f'{test}.{name}'] = val
+        return metrics
+
+
+PARSERS = {
+    'ior': IorParser,
+    'fio': FioJsonParser,
+    'redis_benchmark': RedisBenchmarkCsvParser,
+    'ycsbc': YcsbcParser,
+    'filebench': FilebenchParser,
+    'dlio': DlioParser,
+    'hermes_api_bench': HermesApiBenchParser,
+}
+
+
+def make_parser(name):
+    """
+    Create a builtin output parser by name
+
+    :param name: The name of the parser (e.g., ior)
+    :return: An OutputParser
+    """
+    if name not in PARSERS:
+        raise Exception(f'Unknown output parser: {name}. '
+                        f'Options: {", ".join(PARSERS)}')
+    return PARSERS[name]()
@@ -0,0 +1,137 @@
+"""
+This module contains a single-file state store for pipelines. It keeps the
+configs and environments of every pkg in a pipeline tree in one SQLite
+database instead of one YAML file per pkg.
+"""
+
+from contextlib import contextmanager
+import sqlite3
+import json
+import os
+
+
+class PipelineStore:
+    """
+    Stores {global_id: (config, env)} for a whole pipeline tree. Sub-pkg
+    order is kept in the 'sub_pkgs' entry of each config, just like the
+    YAML layout. Writes are buffered and committed in a single SQLite
+    transaction, so a pipeline is either saved entirely or not at all.
+    """
+    FILE_NAME = 'pipeline.db'
+
+    def __init__(self, path):
+        """
+        :param path: The path to the database file
+        """
+        self.path = path
+        self.conn = None
+        self.records = None
+        self.pending = {}
+        self.deleted = set()
+        self.depth = 0
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS pkgs ('
+                              'global_id TEXT PRIMARY KEY, '
+                              'config TEXT, '
+                              'env TEXT)')
+        return self.conn
+
+    def _load(self):
+        if self.records is None:
+            self.records = {}
+            if os.path.exists(self.path):
+                rows = self._connect().execute(
+                    'SELECT global_id, config, env FROM pkgs')
+                for global_id, config, env in rows:
+                    self.records[global_id] = (config, env)
+        return self.records
+
+    def has_config(self, global_id):
+        return global_id in self._load()
+
+    def has_env(self, global_id):
+        record = self._load().get(global_id)
+        return record is not None and record[1] is not None
+
+    def get_config(self, global_id):
+        return json.loads(self._load()[global_id][0])
+
+    def get_env(self, global_id):
+        return json.loads(self._load()[global_id][1])
+
+    def put(self, global_id, config, env=None):
+        """
+        Stage the config and env of a pkg. Committed immediately unless
+        inside of a transaction.
+
+        :param global_id: The global id of the pkg
+        :param config: The pkg configuration dict
+        :param env: The pkg environment dict, or None if it has none
+        :return: None
+        """
+        record = (json.dumps(config),
+                  json.dumps(env) if env is not None else None)
+        self._load()[global_id] = record
+        self.pending[global_id] = record
+        if self.depth == 0:
+            self.commit()
+
+    def remove_tree(self, global_id):
+        """
+        Remove a pkg and all of its sub-pkgs from the store.
+
+        :param global_id: The global id of the pkg
+        :return: None
+        """
+        prefix = f'{global_id}.'
+        for test_id in list(self._load().keys()):
+            if test_id == global_id or test_id.startswith(prefix):
+                del self.records[test_id]
+                self.pending.pop(test_id, None)
+        self.deleted.add(global_id)
+        if self.depth == 0:
+            self.commit()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group puts and removes into one atomic commit. Transactions may
+        be nested; only the outermost one commits.
+        """
+        self.depth += 1
+        try:
+            yield self
+        finally:
+            self.depth -= 1
+        if self.depth == 0:
+            self.commit()
+
+    def commit(self):
+        """
+        Atomically write all staged changes
+
+        :return: None
+        """
+        if len(self.pending) == 0 and len(self.deleted) == 0:
+            return
+        conn = self._connect()
+        with conn:
+            for global_id in self.deleted:
+                prefix = f'{global_id}.'
+                conn.execute('DELETE FROM pkgs WHERE global_id = ? OR '
+                             'substr(global_id, 1, ?) = ?',
+                             (global_id, len(prefix), prefix))
+            conn.executemany('INSERT OR REPLACE INTO pkgs VALUES (?, ?, ?)',
+                             [(global_id, config, env) for
+                              global_id, (config, env) in self.pending.items()])
+        self.pending = {}
+        self.deleted = set()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -5,6 +5,16 @@ pkg types in Jarvis.
 
 from abc import ABC, abstractmethod
 from jarvis_cd.basic.jarvis_manager import JarvisManager
+from jarvis_cd.basic.pipeline_store import PipelineStore
+from jarvis_cd.basic.readiness import Readiness
+from jarvis_cd.basic.fanout import FanoutExec
+from jarvis_cd.basic.ssh_pool import SshPool
+from jarvis_cd.basic.fs_batch import FsBatch
+from jarvis_cd.basic.search import make_strategy
+from jarvis_cd.basic.template_file import render_template_file
+from jarvis_cd.basic.tracing import Tracer, span
+from jarvis_cd.basic.output_parser import make_parser
+from jarvis_cd.basic.conda_env import CondaEnv
 from jarvis_util.util.logging import ColorPrinter, Color
 from jarvis_util.util.naming import to_snake_case
 from jarvis_util.serialize.yaml_file import YamlFile
@@ -14,14 +24,22 @@ from jarvis_util.util.argparse import ArgParse
 from jarvis_util.jutil_manager import JutilManager
 from jarvis_util.shell.filesystem import Mkdir, Rm
 from jarvis_util.shell.pssh_exec import PsshExecInfo
+from jarvis_util.util.hostfile import Hostfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext, contextmanager
+import multiprocessing
+import glob
+import contextvars
+import queue as queue_mod
 import yaml
+import hashlib
 import inspect
 import pathlib
 import shutil
+import json
 import math
 import os
 import time
-import pandas as pd
 
 
 class PkgArgParse(ArgParse):
@@ -48,18 +66,22 @@ class PipelineZip:
 
 class PipelineIterator:
     """
-    Grid searching pipeline parameters
+    Searching pipeline parameters. The full grid is searched unless a
+    search strategy is set in the iterator config.
     """
     def __init__(self, ppl):
         """
         Initialize grid search
 
         fors: A list of lists [(pkg, var_name, var_vals)]
+        strategy: The search strategy (None for the full grid)
+        point_stats: The stats of each repeat of the current point
         """
         self.ppl = ppl
         self.norerun = set()
         if 'norerun' in ppl.config['iterator']:
             self.norerun = set(ppl.config['iterator']['norerun'])
+        self.warm = ppl.config['iterator'].get('warm', False)
         self.fors = []
         self.cur_iters = []
         self.cur_pos = []
@@ -76,6 +98,7 @@ class PipelineIterator:
         print(f'ITER OUT: {self.iter_out} '
               f"(from: {ppl.config['iterator']['output']})")
         self.stats_path = f'{self.iter_out}/stats_dict.csv'
+        self.records_path = f'{self.iter_out}/stats_records.jsonl'
         self.stats = []
 
         Mkdir(self.iter_out)
@@ -86,6 +109,10 @@ class PipelineIterator:
                 pkg_name, var_name = zip_name.split('.')
                 pkg = ppl.sub_pkgs_dict[pkg_name]
                 self.add_to_for_zip(pkg, var_name, self.iter_vars[zip_name])
+        self.strategy = make_strategy(
+            [for_zip.zip_len for for_zip in self.fors], self.repeat,
+            ppl.config['iterator'].get('search'))
+        self.point_stats = []
 
     def add_for(self):
         self.fors.append(PipelineZip())
@@ -104,8 +131,28 @@ class PipelineIterator:
         self.iter_count = 0
         self.max_iter_count = math.prod([for_zip.zip_len for for_zip
                                          in self.fors])
+        self.point_stats = []
+        if self.strategy is not None:
+            self.strategy.begin()
+            self.max_iter_count = self.strategy.max_points()
+            return self.move_to(self.strategy.propose(), first=True)
         return self.conf_dict
 
+    def move_to(self, pos, first=False):
+        """
+        Go to a point proposed by the search strategy
+
+        :param pos: A tuple with one position per loop zip, or None
+        :param first: Whether this is the first point of the search
+        :return: The conf_dict of the point, or None
+        """
+        if pos is None:
+            return None
+        self.cur_pos_diff = [int(first or new_pos != old_pos)
+                             for new_pos, old_pos in zip(pos, self.cur_pos)]
+        self.cur_pos = list(pos)
+        return self.current()
+
     def current(self):
         for i in range(len(self.cur_iters)):
             for pkg, var_name, var_vals in self.fors[i].zip:
@@ -117,6 +164,12 @@ class PipelineIterator:
         return self.conf_dict
 
     def next(self):
+        self.point_stats = []
+        if self.strategy is not None:
+            conf_dict = self.move_to(self.strategy.propose())
+            if conf_dict is not None:
+                self.iter_count += 1
+            return conf_dict
         self.cur_pos_diff = [0] * len(self.cur_pos)
         for i in range(len(self.cur_iters) - 1, -1, -1):
             try:
@@ -134,27 +187,151 @@ class PipelineIterator:
         self.iter_count += 1
         return conf_dict
 
-    def config_pkgs(self, conf_dict):
-        for pkg, conf in conf_dict.items():
-            pkg.skip_run = False
-            if pkg.pkg_id in self.norerun and pkg.iter_diff == 0:
-                pkg.skip_run = True
-            pkg.set_config_env_vars()
-            pkg.configure(**conf)
-            pkg.save()
+    def set_iter_diff(self, last_pos):
+        """
+        Mark which pkgs changed relative to a point other than the
+        previous one. Used when points are skipped (e.g., by sweep workers).
+
+        :param last_pos: The cur_pos of the last point which was run, or
+        None if no point was run yet
+        :return: None
+        """
+        for i in range(len(self.fors)):
+            for pkg, var_name, var_vals in self.fors[i].zip:
+                if last_pos is None:
+                    pkg.iter_diff = 1
+                else:
+                    pkg.iter_diff = int(self.cur_pos[i] != last_pos[i])
+
+    def rep_range(self):
+        """
+        The repeats to run for the current point
+
+        :return: range
+        """
+        if self.strategy is not None:
+            return self.strategy.rep_range()
+        return range(self.repeat)
 
-    def save_run(self, conf_dict):
+    def finish_point(self):
+        """
+        Give the stats of the current point to the search strategy
+
+        :return: None
+        """
+        if self.strategy is not None:
+            self.strategy.observe(tuple(self.cur_pos), self.point_stats)
+
+    def is_warm_eligible(self, pkg):
+        """
+        Whether a pkg may keep running between iterator points. Norerun
+        pkgs may, and so may every long-running service in warm mode.
+        Applications always run again.
+
+        :param pkg: A sub-pkg of the pipeline
+        :return: bool
+        """
+        if not isinstance(pkg, Service) or isinstance(pkg, Application):
+            return False
+        return self.warm or pkg.pkg_id in self.norerun
+
+    def config_pkgs(self, conf_dict):
+        with self.ppl.batched_fs():
+            for pkg, conf in conf_dict.items():
+                pkg.skip_run = False
+                if pkg.pkg_id in self.norerun and pkg.iter_diff == 0:
+                    pkg.skip_run = True
+                pkg.set_config_env_vars()
+                pkg.configure(**conf)
+                pkg.save()
+
+    def save_run(self, conf_dict, rep=0):
         if conf_dict:
             print('WARNING: conf_dict is defined but not used.')
         stat_dict = {**self.linear_conf_dict}
         # Get the package-specific stats
         for pkg in self.ppl.sub_pkgs:
+            if isinstance(pkg, Application):
+                pkg.parse_output(stat_dict)
             if hasattr(pkg, '_get_stat'):
                 pkg._get_stat(stat_dict)
         # Save the stats to the list
         self.stats.append(stat_dict)
+        self.point_stats.append(stat_dict)
+        self.append_record(self.iter_count, rep, self.linear_conf_dict,
+                           stat_dict)
+
+    def append_record(self, iter_count, rep, linear_conf_dict, stat_dict):
+        """
+        Persist the stats of one (iteration, repeat) as soon as it finishes,
+        so a crashed sweep can be resumed.
+
+        :param iter_count: The index of the parameter point
+        :param rep: The index of the repeat
+        :param linear_conf_dict: The parameters of the point
+        :param stat_dict: The stats of the run
+        :return: None
+        """
+        if self.records_path is None:
+            return
+        record = {
+            'iter': iter_count,
+            'rep': rep,
+            'conf': linear_conf_dict,
+            'stat': stat_dict,
+        }
+        with open(self.records_path, 'a', encoding='utf-8') as fp:
+            fp.write(json.dumps(record, default=str) + '\n')
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    def load_records(self):
+        """
+        Load the persisted stats of a previous sweep. A partially-written
+        last line (e.g., from a crash) is ignored.
+
+        :return: Dict mapping (iter_count, rep) to the record
+        """
+        records = {}
+        if self.records_path is None or \
+                not os.path.exists(self.records_path):
+            return records
+        with open(self.records_path, 'r', encoding='utf-8') as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[(record['iter'], record['rep'])] = record
+        return records
+
+    def reset_records(self):
+        """
+        Forget the persisted stats of a previous sweep
+
+        :return: None
+        """
+        if self.records_path is not None and \
+                os.path.exists(self.records_path):
+            os.remove(self.records_path)
+
+    def is_recorded(self, records, rep):
+        """
+        Check whether a repeat of the current point already finished
+
+        :param records: The records from load_records
+        :param rep: The index of the repeat
+        :return: bool
+        """
+        record = records.get((self.iter_count, rep))
+        if record is None:
+            return False
+        conf = json.loads(json.dumps(self.linear_conf_dict, default=str))
+        return record['conf'] == conf
 
     def analysis(self):
+        # Pandas is only needed here, so avoid paying for it on every CLI call
+        import pandas as pd
         for pkg in self.ppl.sub_pkgs:
             if hasattr(pkg, '_analysis'):
                 pkg._analysis(self.stats)
@@ -187,12 +364,21 @@ class Pkg(ABC):
         sub_pkgs_dict: the sub-packages of this package (dict)
         env_path: the path to the environment file
         env: the environment data
+        config_hash: hash of the config as last loaded or written
+        env_hash: hash of the env as last loaded or written
+        num_written: number of config/env files written (root pkg only)
+        num_skipped: number of unchanged files not rewritten (root pkg only)
+        store: the single-file state store (root pkg only, False if unused)
         mod_env: the environment data + LD_PRELOAD
         iter_vars: the iteration variables
         iter_loop: the iteration loop
         iter_out: the iteration output
         stats_path: the path to the statistics file
         stats: the statistics list
+        skip_run: whether start is skipped since the pkg is still running
+        warm: whether the pkg is kept running between iterator points
+        warm_hash: the config hash of the running warm pkg (None if stopped)
+        out_parsers: the output parsers attached by the pkg (path -> parser)
         """
         self.jarvis = JarvisManager.get_instance()
         self.jutil = JutilManager.get_instance()
@@ -212,12 +398,21 @@ class Pkg(ABC):
         self.sub_pkgs_dict = {}
         self.env_path = None
         self.env = None
+        self.config_hash = None
+        self.env_hash = None
+        self.num_written = 0
+        self.num_skipped = 0
+        self.store = None
         self.mod_env = None
         self.iterator = None
         self.exit_code = 0
         self.start_time = 0
+        self.ready_time = 0
         self.stop_time = 0
         self.skip_run = False
+        self.warm = False
+        self.warm_hash = None
+        self.out_parsers = {}
 
     def log(self, msg, color=None):
         ColorPrinter.print(msg, color)
@@ -262,12 +457,13 @@ class Pkg(ABC):
         :return: self
         """
         self._init_common(global_id, self.root)
-        if os.path.exists(self.config_path):
+        if self._has_config():
             self.load(global_id, self.root)
             return self
         self.config = {
             'sub_pkgs': []
         }
+        self.config_hash = None
         self.sub_pkgs = []
         self.env_path = f'{self.config_dir}/env.yaml'
         if self.env is None:
@@ -290,15 +486,17 @@ class Pkg(ABC):
         :return: self
         """
         self._init_common(global_id, root)
-        if self.env_path is not None and os.path.exists(self.env_path):
-            self.env = YamlFile(self.env_path).load()
+        if self.env_path is not None and self._has_env():
+            self.env = self._read_env()
+            self.env_hash = self._hash_state(self.env)
         elif self.root is not None:
             self.env = self.root.env
-        if not os.path.exists(self.config_path):
+        if not self._has_config():
             return self.create(global_id)
         if not with_config:
             return self
-        self.config = YamlFile(self.config_path).load()
+        self.config = self._read_config()
+        self.config_hash = self._hash_state(self.config)
         for sub_pkg_type, sub_pkg_id in self.config['sub_pkgs']:
             sub_pkg = self.jarvis.construct_pkg(sub_pkg_type)
             if sub_pkg is None:
@@ -313,17 +511,174 @@ class Pkg(ABC):
 
     def save(self):
         """
-        Save a pkg and its sub-pkgs
+        Save a pkg and its sub-pkgs. Files whose contents did not change
+        since they were loaded or last written are skipped.
+
         :return: Self
         """
         self.config['pkg_type'] = self.pkg_type
-        YamlFile(self.config_path).save(self.config)
-        if self.env_path is not None:
-            YamlFile(self.env_path).save(self.env)
-        for pkg in self.sub_pkgs:
-            pkg.save()
+        store = self._get_store()
+        with store.transaction() if store else nullcontext():
+            self._write_state()
+            for pkg in self.sub_pkgs:
+                pkg.save()
         return self
 
+    def _get_pkg_tree(self):
+        """
+        Get this pkg and all of its (nested) sub-pkgs
+
+        :return: List of pkgs
+        """
+        pkgs = [self]
+        for pkg in self.sub_pkgs:
+            pkgs += pkg._get_pkg_tree()
+        return pkgs
+
+    def _get_store(self):
+        """
+        Get the single-file state store of the root pipeline. A pipeline
+        uses the store if its database exists. New pipelines use the
+        store if it is the default.
+
+        :return: PipelineStore or None if the pipeline uses YAML files
+        """
+        root = self.root if self.root is not None else self
+        if root.store is None:
+            path = os.path.join(root.config_dir, PipelineStore.FILE_NAME)
+            if os.path.exists(path):
+                root.store = PipelineStore(path)
+            elif self.jarvis.pipeline_store == 'sqlite' and \
+                    not os.path.exists(root.config_path):
+                root.store = PipelineStore(path)
+            else:
+                root.store = False
+        if root.store is False:
+            return None
+        return root.store
+
+    def _has_config(self):
+        store = self._get_store()
+        if store is None:
+            return os.path.exists(self.config_path)
+        return store.has_config(self.global_id)
+
+    def _read_config(self):
+        store = self._get_store()
+        if store is None:
+            return YamlFile(self.config_path).load()
+        return store.get_config(self.global_id)
+
+    def _has_env(self):
+        store = self._get_store()
+        if store is None:
+            return os.path.exists(self.env_path)
+        return store.has_env(self.global_id)
+
+    def _read_env(self):
+        store = self._get_store()
+        if store is None:
+            return YamlFile(self.env_path).load()
+        return store.get_env(self.global_id)
+
+    @staticmethod
+    def _hash_state(data):
+        """
+        Hash the contents of a config or env dict
+
+        :param data: The dict to hash
+        :return: The hex digest
+        """
+        text = json.dumps(data, default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _save_yaml(path, data):
+        """
+        Atomically write a YAML file
+
+        :param path: The destination path
+        :param data: The data to serialize
+        :return: None
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            yaml.dump(data, fp)
+        os.replace(tmp_path, path)
+
+    def _count_save(self, written):
+        root = self.root if self.root is not None else self
+        if written:
+            root.num_written += 1
+        else:
+            root.num_skipped += 1
+
+    def _write_state(self):
+        """
+        Write the config and env of this pkg (not its sub-pkgs) if they
+        changed since they were last loaded or written
+
+        :return: None
+        """
+        store = self._get_store()
+        config_hash = self._hash_state(self.config)
+        config_dirty = config_hash != self.config_hash
+        env = None
+        env_hash = None
+        env_dirty = False
+        if self.env_path is not None:
+            # The ssh pool's wrapper in PATH is never persisted
+            env = SshPool.strip_env(self.env)
+            env_hash = self._hash_state(env)
+            env_dirty = env_hash != self.env_hash
+        if store is None:
+            if not config_dirty and not os.path.exists(self.config_path):
+                config_dirty = True
+            if self.env_path is not None and not env_dirty and \
+                    not os.path.exists(self.env_path):
+                env_dirty = True
+            if config_dirty:
+                self._save_yaml(self.config_path, self.config)
+            self._count_save(config_dirty)
+            if self.env_path is not None:
+                if env_dirty:
+                    self._save_yaml(self.env_path, env)
+                self._count_save(env_dirty)
+        else:
+            if config_dirty or env_dirty or \
+                    not store.has_config(self.global_id):
+                store.put(self.global_id, self.config, env)
+                self._count_save(True)
+            else:
+                self._count_save(False)
+        self.config_hash = config_hash
+        self.env_hash = env_hash
+
+    def _mark_dirty(self):
+        """
+        Force the next save to rewrite this pkg and its sub-pkgs
+
+        :return: None
+        """
+        for pkg in self._get_pkg_tree():
+            pkg.config_hash = None
+            pkg.env_hash = None
+
+    def _remove_state(self):
+        """
+        Remove the config of this pkg and its sub-pkgs from the store.
+        Raises FileNotFoundError if there is no config.
+
+        :return: None
+        """
+        store = self._get_store()
+        if store is None:
+            os.remove(self.config_path)
+            return
+        if not store.has_config(self.global_id):
+            raise FileNotFoundError(self.global_id)
+        store.remove_tree(self.global_id)
+
     def set_config_env_vars(self, cur_iter_temp=None):
         if cur_iter_temp is not None:
             os.environ['ITER_DIR'] = cur_iter_temp
@@ -351,7 +706,7 @@ class Pkg(ABC):
                 path = os.path.join(self.config_dir, dir_name)
                 if os.path.isdir(path):
                     shutil.rmtree(path)
-            os.remove(self.config_path)
+            self._remove_state()
             self.create(self.global_id)
         except FileNotFoundError:
             pass
@@ -372,9 +727,15 @@ class Pkg(ABC):
 
         :return: None
         """
-        for pkg in self.sub_pkgs:
-            if pkg is not None:
-                pkg.destroy()
+        store = self._get_store()
+        with store.transaction() if store else nullcontext():
+            for pkg in self.sub_pkgs:
+                if pkg is not None:
+                    pkg.destroy()
+            if store is not None and self.root is not self:
+                store.remove_tree(self.global_id)
+        if store is not None and self.root is self:
+            store.close()
         try:
             shutil.rmtree(self.config_dir)
         except FileNotFoundError:
@@ -410,6 +771,7 @@ class Pkg(ABC):
         if pkg is None:
             raise Exception(f'Could not find pkg: {pkg_type}')
         global_id = f'{self.global_id}.{pkg_id}'
+        pkg.root = self.root
         pkg.create(global_id)
         if do_configure:
             pkg.update_env(self.env)
@@ -511,6 +873,8 @@ class Pkg(ABC):
         env.update(self.env)
         self.env = env
         self.mod_env = mod_env
+        SshPool.wrap_env(self.env)
+        SshPool.wrap_env(self.mod_env)
 
     @staticmethod
     def _track_env(env, env_track_dict=None):
@@ -617,10 +981,77 @@ class Pkg(ABC):
         """
         self.env[env_var] = val
 
+    def cached_build(self, name, paths, build, inputs=None, src_dirs=None,
+                     env_vars=None, mode='link'):
+        """
+        Run a build only if no build with the same inputs is cached.
+        Otherwise, the cached outputs are placed at paths.
+
+        :param name: The name of the build (e.g., the pkg type)
+        :param paths: The files or directories the build produces
+        :param build: A function which runs the build
+        :param inputs: Build options (e.g., cmake opts)
+        :param src_dirs: Source trees the build reads
+        :param env_vars: Names of the env variables the build depends on
+        :param mode: 'link' to symlink cached outputs, 'copy' to copy them
+        :return: The key of the build
+        """
+        cache = self.jarvis.get_build_cache()
+        env = {var: self.env.get(var) for var in (env_vars or [])}
+        key = cache.key(name, inputs, src_dirs, env)
+        if cache.restore(key, paths, mode):
+            self.log(f'[BUILD] {self.pkg_id}: Reusing cached build {key}',
+                     Color.GREEN)
+            return key
+        # Never build into a cached entry
+        for path in paths:
+            if os.path.islink(path):
+                os.remove(path)
+        build()
+        cache.store(key, paths, name)
+        cache.evict(keep=key)
+        self.log(f'[BUILD] {self.pkg_id}: Cached build {key}', Color.GREEN)
+        return key
+
+    def mkdir(self, paths, exec_info=None):
+        """
+        Create directories. While the pipeline batches file system
+        operations, this is queued and runs with the rest of the batch.
+        The directories do not exist until the batch is flushed (e.g., at
+        the end of configure), so do not write into them before then.
+
+        :param paths: A path or list of paths
+        :param exec_info: Where to create the directories
+        :return: None
+        """
+        if FsBatch.active is not None:
+            FsBatch.active.add('mkdir', paths, exec_info, self.pkg_id)
+        else:
+            Mkdir(paths, exec_info)
+
+    def rm(self, paths, exec_info=None):
+        """
+        Remove files and directories (globs are expanded). While the
+        pipeline batches file system operations, this is queued and runs
+        with the rest of the batch.
+
+        :param paths: A path or list of paths
+        :param exec_info: Where to remove the paths
+        :return: None
+        """
+        if FsBatch.active is not None:
+            FsBatch.active.add('rm', paths, exec_info, self.pkg_id)
+        else:
+            Rm(paths, exec_info)
+
     def find_library(self, lib_name, env_vars=None):
         """
         Find the location of a shared object automatically using environment
-        variables. If None, will search LD_LIBRARY_PATH.
+        variables. If None, will search LD_LIBRARY_PATH. LIBRARY_PATH,
+        ld.so.cache, and the default library directories are searched
+        afterwards. Libraries found in none of them are searched for in
+        the compiler's internal directories (e.g., libasan.so). Only then
+        is the highest versioned soname (e.g., libasan.so.8) returned.
 
         :param lib_name: The library to search for. We will search for
         any file matching lib{lib_name}.so and {lib_name}.so.
@@ -632,29 +1063,40 @@ class Pkg(ABC):
             f'{lib_name}.so',
             f'lib{lib_name}.so',
         ]
-        for name in name_opts:
-            exe = Exec(f'cc -print-file-name={name}',
-                        LocalExecInfo(env=self.env,
-                                      hide_output=True,
-                                      collect_output=True))
-            res = exe.stdout['localhost'].strip()
-            if len(res) and res != name:
-                return res
         if env_vars is None:
             env_vars = ['LD_LIBRARY_PATH']
-
-        for env_var in env_vars:
-            if env_var not in self.env:
+        if isinstance(env_vars, str):
+            env_vars = [env_vars]
+        dirs = []
+        for env_var in list(env_vars) + ['LIBRARY_PATH']:
+            if env_var not in self.env or self.env[env_var] is None:
                 continue
-            paths = self.env[env_var].split(':')
-            for path in paths:
-                if not os.path.exists(path):
-                    continue
-                filenames = os.listdir(path)
-                for name_opt in name_opts:
-                    if name_opt in filenames:
-                        return f'{path}/{name_opt}'
-        return None
+            for path in self.env[env_var].split(':'):
+                if len(path) and path not in dirs:
+                    dirs.append(path)
+        lib_index = self.jarvis.get_lib_index()
+        path = lib_index.find(name_opts, dirs)
+        if path is None:
+            path = lib_index.find_compiler(name_opts, self.env)
+        if path is None:
+            path = lib_index.find_versioned(name_opts, dirs)
+        return path
+
+    def update_conda_vars(self, conda_env, set_vars=None, unset_vars=None):
+        """
+        Set and unset the variables of a conda environment, like
+        "conda env config vars set/unset", without the conda CLI. The
+        environment's state file is only rewritten if a variable changed.
+
+        :param conda_env: The name or prefix of the conda environment
+        :param set_vars: Dict of {name: value}. None values are unset.
+        :param unset_vars: List of names to unset
+        :return: The list of names which changed
+        """
+        changed = CondaEnv(conda_env, self.env).update(set_vars, unset_vars)
+        if len(changed):
+            self.log(f'[CONDA] {conda_env}: Updated {", ".join(changed)}')
+        return changed
 
     def __str__(self):
         return self.to_string_pretty()
@@ -707,6 +1149,13 @@ class SimplePkg(Pkg):
                 'type': int,
                 'default': 0,
             },
+            {
+                'name': 'ready_timeout',
+                'msg': 'How long to wait for a service to become ready '
+                       'during start (seconds)',
+                'type': int,
+                'default': 60,
+            },
             {
                 'name': 'reinit',
                 'msg': 'Destroy previous configuration and rebuild',
@@ -745,6 +1194,20 @@ class SimplePkg(Pkg):
                 'type': bool,
                 'default': False
             },
+            {
+                'name': 'depends_on',
+                'msg': 'The ids of the pkgs which must start before this '
+                       'one. By default, all pkgs before it in the pipeline.',
+                'type': list,
+                'default': None,
+                'args': [
+                    {
+                        'name': 'pkg_id',
+                        'msg': 'The id of a pkg earlier in the pipeline',
+                        'type': str
+                    },
+                ],
+            },
         ]
         return menu
 
@@ -770,8 +1233,9 @@ class SimplePkg(Pkg):
             kwargs['stdout'] = kwargs['stderr']
         if kwargs['stderr'] == 'stdout':
             kwargs['stderr'] = kwargs['stdout']
-        self.update_config(kwargs, rebuild=kwargs['reinit'])
-        self._configure(**kwargs)
+        with span('configure', 'pkg', pkg_id=self.pkg_id):
+            self.update_config(kwargs, rebuild=kwargs['reinit'])
+            self._configure(**kwargs)
 
     @abstractmethod
     def _configure(self, **kwargs):
@@ -794,8 +1258,7 @@ class SimplePkg(Pkg):
         from self.conifgure_menu
         :return:
         """
-        Mkdir(self.private_dir,
-              PsshExecInfo(hostfile=self.jarvis.hostfile))
+        self.jarvis.prepare_dirs([self.private_dir])
         menu = self.configure_menu()
         menu_keys = {m['name']: True for m in menu}
         args = []
@@ -835,25 +1298,23 @@ class SimplePkg(Pkg):
         """
         Copy and configure an application template file
         Template files makr constants using the notation
-        ##CONST_NAME##
+        ##CONST_NAME##. The destination is not rewritten if its
+        contents would not change.
 
         :param src: Path to the template
         :param dst: Destination of the template
         :param replacements: A list of 2-tuples or dict. First entry is the name
         of the constant to replace, right is the value to replace it with.
-        :return: None
+        :return: TemplateRender
         """
-        with open(src, 'r', encoding='utf-8') as fp:
-            text = fp.read()
-        if replacements is not None:
-            if isinstance(replacements, list):
-                for const_name, replace in replacements:
-                    text = text.replace(f'##{const_name}##', str(replace))
-            elif isinstance(replacements, dict):
-                for const_name, replace in replacements.items():
-                    text = text.replace(f'##{const_name}##', str(replace))
-        with open(dst, 'w', encoding='utf-8') as fp:
-            fp.write(text)
+        render = render_template_file(src, dst, replacements)
+        if len(render.unknown):
+            ColorPrinter.print(f'{src}: no value for constants: '
+                               f'{", ".join(render.unknown)}', Color.YELLOW)
+        if len(render.unused):
+            ColorPrinter.print(f'{src}: unused constants: '
+                               f'{", ".join(render.unused)}', Color.YELLOW)
+        return render
 
 
 class Interceptor(SimplePkg):
@@ -887,6 +1348,60 @@ class Service(SimplePkg):
         """
         pass
 
+    def health_probes(self):
+        """
+        The probes which pass while the service is up. Used to wait for
+        the service during start and to check warm services between
+        iterator points.
+
+        :return: List of ReadinessProbes
+        """
+        return []
+
+    def is_healthy(self, timeout=5):
+        """
+        Check whether a running service is still up. Uses the health
+        probes if there are any, otherwise status().
+
+        :param timeout: How long to wait for the probes
+        :return: bool
+        """
+        probes = self.health_probes()
+        if len(probes):
+            return Readiness(probes, timeout).wait()
+        return bool(self.status())
+
+    def wait_ready(self, probes, timeout=None, min_time=0):
+        """
+        Block until every readiness probe passes or the deadline expires.
+        Probes are polled with exponential backoff.
+
+        :param probes: A list of ReadinessProbes (e.g., TcpProbe)
+        :param timeout: The deadline in seconds. Defaults to ready_timeout.
+        :param min_time: Wait at least this long, even if the probes pass
+        earlier. Off by default.
+        :return: True. Raises an exception if the service is not ready
+        before the deadline.
+        """
+        if timeout is None:
+            timeout = self.config.get('ready_timeout', 60)
+        readiness = Readiness(probes, timeout)
+        with span('readiness', 'pkg', pkg_id=self.pkg_id,
+                  probes=len(probes), timeout=timeout):
+            ready = readiness.wait()
+        self.ready_time = readiness.wait_time
+        if not ready:
+            pending = ', '.join(str(probe) for probe in readiness.pending)
+            self.log(f'[READY] {self.pkg_id}: not ready after {timeout} '
+                     f'seconds. Waiting on: {pending}', Color.RED)
+            raise Exception(f'{self.pkg_id} was not ready after {timeout} '
+                            f'seconds. Waiting on: {pending}')
+        self.log(f'[READY] {self.pkg_id}: ready in '
+                 f'{self.ready_time} seconds', Color.GREEN)
+        if min_time and self.ready_time < min_time:
+            time.sleep(min_time - self.ready_time)
+        return True
+
     @abstractmethod
     def stop(self):
         """
@@ -927,13 +1442,63 @@ class Application(Service):
     def status(self):
         return True
 
+    def attach_parser(self, parser, path=None):
+        """
+        Parse an output file of the application after it runs. The metrics
+        are added to the stats of each iterator run as {pkg_id}.{metric}.
+        Output left over from an earlier run is removed.
+
+        :param parser: An OutputParser or the name of a builtin parser
+        :param path: The output file. A glob matches the output of several
+        hosts. Defaults to {pkg_id}.log in the directory of the current
+        iterator run, or in the pkg's config directory.
+        :return: The path to pipe the output to (e.g., pipe_stdout)
+        """
+        if isinstance(parser, str):
+            parser = make_parser(parser)
+        if path is None:
+            out_dir = os.environ.get('ITER_DIR', self.config_dir)
+            os.makedirs(out_dir, exist_ok=True)
+            path = os.path.join(out_dir, f'{self.pkg_id}.log')
+        for old_path in glob.glob(path):
+            os.remove(old_path)
+        self.out_parsers[path] = parser
+        return path
+
+    def parse_output(self, stat_dict):
+        """
+        Add the metrics of the attached output parsers to the stats
+
+        :param stat_dict: A dictionary of statistics.
+        :return: None
+        """
+        for path, parser in self.out_parsers.items():
+            paths = sorted(glob.glob(path))
+            if len(paths) == 0:
+                self.log(f'[PARSE] {self.pkg_id}: No output in {path}',
+                         Color.YELLOW)
+                continue
+            try:
+                metrics = parser.merge([parser.parse_file(out_path)
+                                        for out_path in paths])
+            except Exception as e:
+                self.log(f'[PARSE] {self.pkg_id}: Could not parse {path}: '
+                         f'{e}', Color.RED)
+                continue
+            for key, val in metrics.items():
+                stat_dict[f'{self.pkg_id}.{key}'] = val
+
 
 class Pipeline(Pkg):
     """
     A pipeline connects the different pkg types together in a chain.
     """
     def _init(self):
-        pass
+        self.critical_path = []
+        self.ssh_pool = None
+        self.ssh_pool_stats = None
+        self.trace = False
+        self.trace_parts = []
 
     def configure(self, pkg_id, **kwargs):
         """
@@ -1006,15 +1571,24 @@ class Pipeline(Pkg):
         self.reset()
         if path:
             self.config['JARVIS_YAML_PATH'] = path
+        # The static env update_yaml compares the yaml against. Pkgs modify
+        # self.env, so it cannot be compared directly.
+        self.config['JARVIS_YAML_ENV'] = None
         if 'env' in config:
             self.copy_static_env(config['env'])
-        for sub_pkg in config['pkgs']:
-            pkg_type = sub_pkg['pkg_type']
-            pkg_name = sub_pkg['pkg_name']
-            del sub_pkg['pkg_type']
-            del sub_pkg['pkg_name']
-            self.append(pkg_type, pkg_name,
-                        do_configure, **sub_pkg)
+            self.config['JARVIS_YAML_ENV'] = self._hash_state(YamlFile(
+                self.get_static_env_path(config['env'])).load())
+        # The entries update_yaml compares the yaml against
+        self.config['JARVIS_YAML_PKGS'] = [dict(sub_pkg)
+                                           for sub_pkg in config['pkgs']]
+        with self.batched_fs():
+            for sub_pkg in config['pkgs']:
+                pkg_type = sub_pkg['pkg_type']
+                pkg_name = sub_pkg['pkg_name']
+                del sub_pkg['pkg_type']
+                del sub_pkg['pkg_name']
+                self.append(pkg_type, pkg_name,
+                            do_configure, **sub_pkg)
         return self
 
     def from_yaml_iter_dict(self, config, path=None, do_configure=True):
@@ -1037,12 +1611,27 @@ class Pipeline(Pkg):
             - [pkg_name.var1, pkg_name.var2]
             - [pkg_name.var3]
         output: my_dir
+        workers: 1
+        warm: false
+        search:
+          strategy: random
+          samples: 10
 
         :param path:
         :param do_configure: Whether to append and configure
         :return: self
         """
         self.from_yaml_dict(config['config'], path, do_configure)
+        self._load_iterator_yaml(config)
+        return self
+
+    def _load_iterator_yaml(self, config):
+        """
+        Set the iterator config from an iterator YAML
+
+        :param config: The YAML dict
+        :return: None
+        """
         self.config['iterator'] = {}
         self.config['iterator']['vars'] = config['vars']
         self.config['iterator']['loop'] = config['loop']
@@ -1050,7 +1639,12 @@ class Pipeline(Pkg):
         self.config['iterator']['repeat'] = config['repeat']
         if 'norerun' in config:
             self.config['iterator']['norerun'] = config['norerun']
-        return self
+        if 'workers' in config:
+            self.config['iterator']['workers'] = config['workers']
+        if 'search' in config:
+            self.config['iterator']['search'] = config['search']
+        if 'warm' in config:
+            self.config['iterator']['warm'] = config['warm']
 
     def get_static_env_path(self, env_name):
         """
@@ -1110,14 +1704,211 @@ class Pipeline(Pkg):
             print(env)
         return self
 
-    def update_yaml(self):
+    def update_yaml(self, dry_run=False):
         """
-        Reload the pipeline from the stored yaml file
+        Reload the pipeline from the stored yaml file. Only the pkgs whose
+        entries changed are inserted, removed, or reconfigured. The other
+        pkgs keep their configuration.
+
+        If the static env named by the yaml changed, the pipeline env is
+        rebuilt from it and every pkg is reconfigured. Otherwise, the env
+        is kept as is, so variables set by a removed or reconfigured pkg
+        remain until the pipeline is loaded again with from_yaml.
+
+        :param dry_run: Only print the plan
+        :return: self
         """
-        if 'JARVIS_YAML_PATH' in self.config:
-            self.from_yaml(self.config['JARVIS_YAML_PATH'])
+        if 'JARVIS_YAML_PATH' not in self.config:
+            self.log(f'[YAML] {self.global_id} was not loaded from a yaml. '
+                     f'Reconfiguring every pkg', Color.YELLOW)
+            if not dry_run:
+                self.update()
+            return self
+        path = self.config['JARVIS_YAML_PATH']
+        config = YamlFile(path).load()
+        iter_config = None
+        if 'loop' in config:
+            iter_config = config
+            config = config['config']
+        if config['name'] != self.global_id:
+            self.log(f'[YAML] The pipeline was renamed to {config["name"]}. '
+                     f'Reloading every pkg', Color.YELLOW)
+            if not dry_run:
+                self.from_yaml(path)
+            return self
+        env = None
+        if 'env' in config:
+            env = YamlFile(self.get_static_env_path(config['env'])).load()
+        plan = self.plan_yaml(config['pkgs'], env)
+        self._log_plan(plan)
+        if dry_run:
+            return self
+        if self._env_changed(env):
+            self.env = env
+            self.config['JARVIS_YAML_ENV'] = self._hash_state(env)
+        self._apply_plan(plan)
+        self.config['JARVIS_YAML_PKGS'] = [dict(sub_pkg)
+                                           for sub_pkg in config['pkgs']]
+        if iter_config is not None:
+            self._load_iterator_yaml(iter_config)
+        return self
+
+    def plan_yaml(self, entries, env=None):
+        """
+        Compare the pkg entries of a pipeline yaml with the stored pkgs.
+        Entries are compared with the entries of the yaml the pipeline was
+        last loaded from. Pipelines loaded before entries were recorded
+        compare the entries with the pkg configs.
+
+        :param entries: The 'pkgs' list of the yaml
+        :param env: The static environment named by the yaml, or None.
+        If it differs from the one the pipeline was loaded with, every pkg
+        is reconfigured.
+        :return: List of steps in yaml order, followed by removals. A step
+        is a dict with the action ('insert', 'remove', 'configure', or
+        'keep'), pkg_id, pkg_type, kwargs, and the changed keys.
+        """
+        old_entries = {entry['pkg_name']: entry for entry in
+                       self.config.get('JARVIS_YAML_PKGS', [])}
+        pkg_types = {pkg_id: pkg_type
+                     for pkg_type, pkg_id in self.config['sub_pkgs']}
+        env_changed = self._env_changed(env)
+        plan = []
+        for entry in entries:
+            pkg_id = entry['pkg_name']
+            pkg_type = entry['pkg_type']
+            kwargs = {key: val for key, val in entry.items()
+                      if key not in ('pkg_type', 'pkg_name')}
+            step = {'action': 'keep', 'pkg_id': pkg_id, 'pkg_type': pkg_type,
+                    'kwargs': kwargs, 'changed': []}
+            plan.append(step)
+            pkg = self.get_pkg(pkg_id)
+            if pkg is None:
+                step['action'] = 'insert'
+                continue
+            if pkg_types.get(pkg_id) != pkg_type:
+                step['changed'] = ['pkg_type']
+            elif pkg_id in old_entries:
+                old = old_entries[pkg_id]
+                step['changed'] = sorted(
+                    key for key in set(old) | set(entry)
+                    if old.get(key) != entry.get(key))
+            else:
+                step['changed'] = sorted(
+                    key for key, val in kwargs.items()
+                    if pkg.config.get(key) != val)
+            if env_changed and len(step['changed']) == 0:
+                step['changed'] = ['env']
+            if len(step['changed']):
+                step['action'] = 'configure'
+        yaml_ids = {entry['pkg_name'] for entry in entries}
+        for pkg_type, pkg_id in self.config['sub_pkgs']:
+            if pkg_id not in yaml_ids:
+                plan.append({'action': 'remove', 'pkg_id': pkg_id,
+                             'pkg_type': pkg_type, 'kwargs': {},
+                             'changed': []})
+        return plan
+
+    def _env_changed(self, env):
+        """
+        Whether the static env named by a yaml differs from the one the
+        pipeline was loaded with
+
+        :param env: The static env, or None if the yaml names none
+        :return: bool
+        """
+        if env is None:
+            return False
+        return self._hash_state(env) != self.config.get('JARVIS_YAML_ENV')
+
+    def _log_plan(self, plan):
+        labels = {'insert': 'inserted', 'remove': 'removed',
+                  'configure': 'reconfigured', 'keep': 'unchanged'}
+        counts = {action: 0 for action in labels}
+        for step in plan:
+            counts[step['action']] += 1
+        self.log(f'[YAML] Reload plan for {self.global_id}: ' +
+                 ', '.join(f'{count} {labels[action]}'
+                           for action, count in counts.items()),
+                 Color.BRIGHT_BLUE)
+        for step in plan:
+            if step['action'] == 'insert':
+                self.log(f'[YAML] + {step["pkg_id"]} ({step["pkg_type"]})',
+                         Color.GREEN)
+            elif step['action'] == 'remove':
+                self.log(f'[YAML] - {step["pkg_id"]}', Color.RED)
+            elif step['action'] == 'configure':
+                self.log(f'[YAML] ~ {step["pkg_id"]}: '
+                         f'{", ".join(step["changed"])} changed',
+                         Color.YELLOW)
+            else:
+                self.log(f'[YAML] = {step["pkg_id"]}')
+
+    def _apply_plan(self, plan):
+        """
+        Insert, remove, and reconfigure pkgs as planned by plan_yaml.
+        Reconfigured pkgs are recreated, so parameters removed from the
+        yaml return to their defaults.
+
+        :param plan: The steps returned by plan_yaml
+        :return: None
+        """
+        with self.batched_fs():
+            for step in plan:
+                if step['action'] == 'remove':
+                    self.remove(step['pkg_id'])
+                    self.sub_pkgs_dict.pop(step['pkg_id'], None)
+            steps = [step for step in plan if step['action'] != 'remove']
+            for pos, step in enumerate(steps):
+                pkg = self.get_pkg(step['pkg_id'])
+                if step['action'] == 'keep':
+                    # Move the pkg to its position in the yaml
+                    off = self.sub_pkgs.index(pkg)
+                    if off != pos:
+                        self.sub_pkgs.insert(pos, self.sub_pkgs.pop(off))
+                        self.config['sub_pkgs'].insert(
+                            pos, self.config['sub_pkgs'].pop(off))
+                    continue
+                if pkg is not None:
+                    self.remove(step['pkg_id'])
+                self.insert(pos, step['pkg_type'], step['pkg_id'],
+                            **step['kwargs'])
+
+    def migrate_store(self, backend):
+        """
+        Move the state of this pipeline to another backend. 'sqlite' keeps
+        the entire pipeline tree in one file, 'yaml' stores one YAML file
+        per pkg.
+
+        :param backend: Either 'sqlite' or 'yaml'
+        :return: self
+        """
+        old_store = self._get_store()
+        db_path = os.path.join(self.config_dir, PipelineStore.FILE_NAME)
+        pkgs = self._get_pkg_tree()
+        if backend == 'sqlite':
+            if old_store is not None:
+                return self
+            self.store = PipelineStore(db_path)
+            self._mark_dirty()
+            self.save()
+            for pkg in pkgs:
+                for path in [pkg.config_path,
+                             os.path.join(pkg.config_dir, 'env.yaml')]:
+                    if os.path.exists(path):
+                        os.remove(path)
+        elif backend == 'yaml':
+            if old_store is None:
+                return self
+            old_store.close()
+            self.store = False
+            self._mark_dirty()
+            self.save()
+            os.remove(db_path)
         else:
-            self.update()
+            raise Exception(f'Unknown pipeline store backend: {backend}')
+        self.log(f'Migrated {len(pkgs)} pkgs of {self.global_id} to {backend}',
+                 Color.GREEN)
         return self
 
     def update(self):
@@ -1126,41 +1917,383 @@ class Pipeline(Pkg):
 
         :return: self
         """
-        for pkg in self.sub_pkgs:
-            pkg.env = self.env
-            pkg.configure()
+        with self.traced(), self.batched_fs():
+            for pkg in self.sub_pkgs:
+                pkg.env = self.env
+                pkg.configure()
         return self
 
-    def run_iter(self, resume=False):
+    @contextmanager
+    def batched_fs(self):
+        """
+        Queue the directories pkgs create and remove (Pkg.mkdir, Pkg.rm)
+        in this context and run them as one script per host at the end.
+        Nested contexts join the outer batch. Raises an exception if an
+        operation failed.
+
+        :return: None
+        """
+        if FsBatch.active is not None:
+            yield
+            return
+        batch = FsBatch()
+        FsBatch.active = batch
+        try:
+            yield
+        finally:
+            FsBatch.active = None
+        self.flush_fs(batch)
+
+    def flush_fs(self, batch):
+        """
+        Run a batch of file system operations. Raises an exception if
+        any operation failed.
+
+        :param batch: The FsBatch
+        :return: None
+        """
+        if len(batch.ops) == 0:
+            return
+        num_ops = len(batch.ops)
+        hosts = batch.hosts()
+        tree = self.jarvis.get_fanout(batch.exec_info, len(hosts),
+                                      direct=True)
+        with self.pooled_ssh(), span('fs_batch', 'exec', hosts=len(hosts),
+                                     ops=num_ops):
+            errors = batch.flush(tree)
+        self.log(f'[FS] Ran {num_ops} file system operations on '
+                 f'{len(hosts)} hosts', Color.GREEN)
+        for op, host, msg in errors:
+            self.log(f'[FS] {host}: {op if op else "batch"} failed: {msg}',
+                     Color.RED)
+        if len(errors):
+            raise Exception(f'{len(errors)} file system operations failed. '
+                            f'See the [FS] errors above.')
+
+    def run_iter(self, resume=False, workers=None):
         """
         Run the pipeline repeatedly with new configurations
+
+        :param resume: Whether to resume a previous sweep
+        :param workers: The number of disjoint sub-hostfiles to run
+        parameter points on concurrently. Defaults to the 'workers' entry
+        of the iterator config, or 1.
         """
-        if resume:
-            self.log('[ITER] resume=True')
+        if workers is None:
+            workers = self.config['iterator'].get('workers', 1)
         self.iterator = PipelineIterator(self)
-        conf_dict = self.iterator.begin()
-        while conf_dict is not None:
-            self.clean(with_iter_out=False)
-            for i in range(self.iterator.repeat):
-                cur_iter_tmp = os.path.join(
-                    self.iterator.iter_out,
-                    f'{self.iterator.iter_count}-{i}')
-                self.set_config_env_vars(cur_iter_tmp)
-                self.log(f'[ITER] Iteration'
-                         f'[(param) {self.iterator.iter_count + 1}/ \
-                         {self.iterator.max_iter_count}]'
-                         f'[(rep) {i + 1}/{self.iterator.repeat}]: '
-                         f'{self.iterator.linear_conf_dict}', Color.BRIGHT_BLUE)
-                self.iterator.config_pkgs(conf_dict)
-                self.run(kill=True)
-                self.iterator.save_run(conf_dict)
-                self.clean(with_iter_out=False)
-            conf_dict = self.iterator.next()
+        if workers > 1 and self.iterator.strategy is not None and \
+                self.iterator.strategy.adaptive:
+            self.log('[ITER] Adaptive search strategies run on a single '
+                     'worker', Color.YELLOW)
+            workers = 1
+        records = {}
+        if resume:
+            records = self.iterator.load_records()
+            self.log(f'[ITER] Resuming: {len(records)} runs already recorded '
+                     f'in {self.iterator.records_path}', Color.BRIGHT_BLUE)
+        else:
+            self.iterator.reset_records()
+        with self.traced(self.iterator.iter_out), self.pooled_ssh():
+            if workers > 1:
+                self._run_iter_workers(workers, records)
+            else:
+                try:
+                    for conf_dict, done_reps in self._iter_points(records):
+                        self._run_iter_point(conf_dict, done_reps=done_reps)
+                finally:
+                    self._stop_warm()
+        # The records hold every run, including those of earlier attempts
+        self.iterator.stats = [
+            record['stat'] for key, record in
+            sorted(self.iterator.load_records().items())]
         self.log('[ITER] Beginning analysis', Color.BRIGHT_BLUE)
         self.iterator.analysis()
         self.log('[ITER] Finished analysis', Color.BRIGHT_BLUE)
         self.log(f'[ITER] Stored results in: {self.iterator.stats_path}',
                  Color.BRIGHT_BLUE)
+        self.log(f'[ITER] Config saves: {self.num_written} written, '
+                 f'{self.num_skipped} unchanged', Color.BRIGHT_BLUE)
+
+    def _iter_points(self, records, worker_id=0, num_workers=1):
+        """
+        Iterate over the parameter points this process should run. Points
+        of other workers and points whose repeats are all recorded are
+        skipped.
+
+        :param records: The records of a previous sweep
+        :param worker_id: The index of this worker
+        :param num_workers: The number of workers
+        :return: Generator of (conf_dict, set of recorded repeats)
+        """
+        conf_dict = self.iterator.begin()
+        last_pos = None
+        last_iter = -1
+        while conf_dict is not None:
+            iter_count = self.iterator.iter_count
+            reps = self.iterator.rep_range()
+            done_reps = {rep for rep in reps
+                         if self.iterator.is_recorded(records, rep)}
+            for rep in sorted(done_reps):
+                self.iterator.point_stats.append(
+                    records[(iter_count, rep)]['stat'])
+            if iter_count % num_workers == worker_id and \
+                    len(done_reps) < len(reps):
+                if last_iter != iter_count - 1:
+                    self.iterator.set_iter_diff(last_pos)
+                yield conf_dict, done_reps
+                last_pos = list(self.iterator.cur_pos)
+                last_iter = iter_count
+            self.iterator.finish_point()
+            conf_dict = self.iterator.next()
+
+    def _run_iter_point(self, conf_dict, queue=None, done_reps=None):
+        """
+        Run every repeat of the current parameter point
+
+        :param conf_dict: The configuration of the current point
+        :param queue: Where a sweep worker sends its stats
+        :param done_reps: Repeats which already finished in an earlier run
+        :return: None
+        """
+        self.clean(with_iter_out=False)
+        for i in self.iterator.rep_range():
+            if done_reps and i in done_reps:
+                continue
+            cur_iter_tmp = os.path.join(
+                self.iterator.iter_out,
+                f'{self.iterator.iter_count}-{i}')
+            self.set_config_env_vars(cur_iter_tmp)
+            self.log(f'[ITER] Iteration'
+                     f'[(param) {self.iterator.iter_count + 1}/ \
+                     {self.iterator.max_iter_count}]'
+                     f'[(rep) {i + 1}/{self.iterator.repeat}]: '
+                     f'{self.iterator.linear_conf_dict}', Color.BRIGHT_BLUE)
+            with span('iteration', 'iter', iter=self.iterator.iter_count,
+                      rep=i):
+                self.iterator.config_pkgs(conf_dict)
+                self._plan_warm()
+                self.run(kill=True)
+                self.iterator.save_run(conf_dict, i)
+                if queue is not None:
+                    queue.put(('stat', self.iterator.iter_count, i,
+                               self.iterator.linear_conf_dict,
+                               self.iterator.stats[-1]))
+                self.clean(with_iter_out=False)
+
+    def _plan_warm(self):
+        """
+        Decide which services keep running from the previous run. A warm
+        service is restarted if its config changed since it started, a
+        service or interceptor it depends on changed, or its health check
+        fails. Running services which are restarted are killed and cleaned
+        here.
+
+        :return: None
+        """
+        deps = self.get_deps()
+        changed = set()
+        for pkg in self.sub_pkgs:
+            config_hash = self._hash_state(pkg.config)
+            if isinstance(pkg, Interceptor):
+                if pkg.warm_hash != config_hash:
+                    changed.add(pkg.pkg_id)
+                pkg.warm_hash = config_hash
+                continue
+            eligible = self.iterator.is_warm_eligible(pkg)
+            running = pkg.warm_hash is not None
+            keep = running and eligible and \
+                pkg.warm_hash == config_hash and \
+                len(deps[pkg.pkg_id] & changed) == 0
+            if keep:
+                pkg.update_env(self.env, self.mod_env)
+                keep = pkg.is_healthy()
+                if not keep:
+                    self.log(f'[RUN] (warm) {pkg.pkg_id}: Health check failed',
+                             color=Color.YELLOW)
+            if running and not keep:
+                self._teardown_warm(pkg)
+            if eligible and not keep:
+                changed.add(pkg.pkg_id)
+            pkg.skip_run = keep
+            pkg.warm = eligible
+            if eligible:
+                pkg.warm_hash = config_hash
+
+    def _teardown_warm(self, pkg):
+        """
+        Kill and clean a service which was kept running
+
+        :param pkg: The service
+        :return: None
+        """
+        pkg.warm = False
+        pkg.warm_hash = None
+        pkg.update_env(self.env, self.mod_env)
+        self._kill_pkg(pkg)
+        pkg.clean()
+
+    def _stop_warm(self):
+        """
+        Kill and clean every service still kept running at the end of
+        a sweep
+
+        :return: None
+        """
+        for pkg in reversed(self.sub_pkgs):
+            if isinstance(pkg, Service) and pkg.warm_hash is not None:
+                self._teardown_warm(pkg)
+            pkg.warm = False
+            pkg.warm_hash = None
+            pkg.skip_run = False
+
+    def partition_hostfile(self, num_parts, out_dir):
+        """
+        Split the jarvis hostfile into disjoint, equally-sized hostfiles.
+        Leftover hosts are not used.
+
+        :param num_parts: The number of hostfiles to create
+        :param out_dir: Where to store the hostfiles
+        :return: List of hostfile paths
+        """
+        hosts = self.jarvis.hostfile.hosts
+        if len(hosts) < num_parts:
+            raise Exception(f'Cannot split {len(hosts)} hosts '
+                            f'into {num_parts} workers')
+        per_part = len(hosts) // num_parts
+        paths = []
+        for i in range(num_parts):
+            path = os.path.join(out_dir, str(i), 'hostfile')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as fp:
+                fp.write('\n'.join(hosts[i * per_part:(i + 1) * per_part]))
+            paths.append(path)
+        return paths
+
+    def _run_iter_workers(self, num_workers, records):
+        """
+        Run the parameter points of the iterator concurrently. Each worker
+        is a forked process with its own sub-hostfile and its own copy of
+        the pipeline's config, shared, and private directories. Point i is
+        run by worker i % num_workers. Stats are merged in point order.
+
+        :param num_workers: The number of workers
+        :param records: The records of a previous sweep
+        :return: None
+        """
+        worker_dir = os.path.join(self.iterator.iter_out, 'workers')
+        hostfiles = self.partition_hostfile(num_workers, worker_dir)
+        self.log(f'[ITER] Running on {num_workers} workers with '
+                 f'{len(self.jarvis.hostfile.hosts) // num_workers} '
+                 f'hosts each', Color.BRIGHT_BLUE)
+        ctx = multiprocessing.get_context('fork')
+        queue = ctx.Queue()
+        procs = []
+        for worker_id, hostfile_path in enumerate(hostfiles):
+            if Tracer.active is not None:
+                self.trace_parts.append(
+                    os.path.join(worker_dir, f'trace-{worker_id}.json'))
+            proc = ctx.Process(target=self._iter_worker,
+                               args=(worker_id, num_workers, worker_dir,
+                                     hostfile_path, records, queue))
+            proc.start()
+            procs.append(proc)
+        errors = []
+        done = set()
+        while len(done) < len(procs):
+            try:
+                msg = queue.get(timeout=1)
+            except queue_mod.Empty:
+                for worker_id, proc in enumerate(procs):
+                    if worker_id not in done and not proc.is_alive() and \
+                            proc.exitcode != 0:
+                        errors.append(f'worker {worker_id} exited with '
+                                      f'code {proc.exitcode}')
+                        done.add(worker_id)
+                continue
+            if msg[0] == 'stat':
+                self.iterator.append_record(*msg[1:])
+            elif msg[0] == 'done':
+                self.exit_code += msg[2]
+                self.num_written += msg[3]
+                self.num_skipped += msg[4]
+                done.add(msg[1])
+            elif msg[0] == 'error':
+                errors.append(f'worker {msg[1]}: {msg[2]}')
+                done.add(msg[1])
+        for proc in procs:
+            proc.join()
+        if len(errors):
+            raise Exception('[ITER] Sweep workers failed: ' +
+                            '; '.join(errors))
+
+    def _iter_worker(self, worker_id, num_workers, worker_dir,
+                     hostfile_path, records, queue):
+        """
+        The body of a sweep worker process
+
+        :param worker_id: The index of this worker
+        :param num_workers: The number of workers
+        :param worker_dir: The root of all worker directories
+        :param hostfile_path: The sub-hostfile of this worker
+        :param records: The records of a previous sweep
+        :param queue: Where to send stats and completion
+        :return: None
+        """
+        try:
+            root = os.path.join(worker_dir, str(worker_id))
+            relpath = self.global_id.replace('.', '/')
+            old_shared_dir = self.shared_dir
+            old_private_dir = self.private_dir
+            # Point jarvis at the worker's hostfile and directories
+            self.jarvis.hostfile = Hostfile(hostfile=hostfile_path)
+            self.jarvis.prepared_dirs_path = os.path.join(
+                root, 'prepared_dirs.yaml')
+            self.jarvis.config_dir = os.path.join(root, 'config')
+            self.jarvis.private_dir = os.path.join(
+                self.jarvis.private_dir, '.workers', relpath, str(worker_id))
+            if self.jarvis.shared_dir is not None:
+                self.jarvis.shared_dir = os.path.join(root, 'shared')
+            # Copy the pipeline's directories
+            iter_out = os.path.abspath(self.iterator.iter_out)
+
+            def ignore(src, names):
+                # Do not copy the sweep output into the workers
+                return [name for name in names
+                        if os.path.abspath(os.path.join(src, name)) ==
+                        iter_out]
+
+            shutil.copytree(self.config_dir,
+                            os.path.join(self.jarvis.config_dir, relpath),
+                            ignore=ignore, dirs_exist_ok=True)
+            if old_shared_dir is not None and os.path.exists(old_shared_dir):
+                shutil.copytree(old_shared_dir,
+                                os.path.join(self.jarvis.shared_dir, relpath),
+                                ignore=ignore, dirs_exist_ok=True)
+            private_dir = os.path.join(self.jarvis.private_dir, relpath)
+            FanoutExec(f'if [ -d {old_private_dir} ]; then '
+                       f'mkdir -p {private_dir} && '
+                       f'cp -r {old_private_dir}/. {private_dir}; fi',
+                       PsshExecInfo(hostfile=self.jarvis.hostfile))
+            # Re-configure the copy for the worker's hostfile and directories
+            ppl = Pipeline().load(self.global_id)
+            ppl.update().save()
+            ppl.iterator = PipelineIterator(ppl)
+            # The parent persists the records of all workers
+            ppl.iterator.records_path = None
+            try:
+                for conf_dict, done_reps in ppl._iter_points(
+                        records, worker_id, num_workers):
+                    ppl._run_iter_point(conf_dict, queue, done_reps)
+            finally:
+                ppl._stop_warm()
+                if Tracer.active is not None:
+                    Tracer.active.save_part(
+                        os.path.join(worker_dir, f'trace-{worker_id}.json'))
+            queue.put(('done', worker_id, ppl.exit_code,
+                       ppl.num_written, ppl.num_skipped))
+        except Exception as e:
+            queue.put(('error', worker_id, str(e)))
 
     def run(self, kill=False):
         """
@@ -1169,15 +2302,79 @@ class Pipeline(Pkg):
         :param kill: Whether to kill the pipeline
         :return: None
         """
-        self.start()
-        if kill:
-            self.kill()
-        else:
-            self.stop()
+        with self.traced(), self.pooled_ssh():
+            self.start()
+            if kill:
+                self.kill()
+            else:
+                self.stop()
+
+    @contextmanager
+    def traced(self, out_dir=None):
+        """
+        Record spans for every phase and command in this context and
+        export them to trace.json (Chrome trace) and trace.csv. Enabled by
+        TRACE in the jarvis config or the trace attribute. Nested contexts
+        record into the outer trace.
+
+        :param out_dir: Where to export the trace. Defaults to a trace
+        directory in the pipeline's config directory.
+        :return: None
+        """
+        if Tracer.active is not None or \
+                not (self.trace or self.jarvis.trace):
+            yield
+            return
+        if out_dir is None:
+            out_dir = os.path.join(self.config_dir, 'trace')
+        self.trace_parts = []
+        tracer = Tracer().start()
+        try:
+            yield
+        finally:
+            tracer.stop()
+            json_path, csv_path = tracer.save(out_dir, self.trace_parts)
+            self.log(f'[TRACE] Saved spans to {json_path} and {csv_path}',
+                     Color.BRIGHT_BLUE)
+
+    @contextmanager
+    def pooled_ssh(self):
+        """
+        Reuse one ssh connection per host for every command issued in
+        this context. Enabled by SSH_POOL in the jarvis config. Nested
+        contexts reuse the outer pool.
+
+        :return: None
+        """
+        if self.ssh_pool is not None or SshPool.active is not None or \
+                not self.jarvis.ssh_pool:
+            yield
+            return
+        self.ssh_pool = SshPool(self.jarvis.hostfile.hosts,
+                                persist=self.jarvis.ssh_pool_persist).open()
+        if len(self.ssh_pool.failed):
+            self.log(f'[SSH] Could not pool connections to: '
+                     f'{", ".join(self.ssh_pool.failed)}', Color.YELLOW)
+        SshPool.wrap_env(self.env)
+        SshPool.wrap_env(self.mod_env)
+        try:
+            yield
+        finally:
+            pool = self.ssh_pool
+            self.ssh_pool = None
+            for pkg in [self] + self.sub_pkgs:
+                pool.unwrap_env(pkg.env)
+                pool.unwrap_env(pkg.mod_env)
+            self.ssh_pool_stats = pool.close()
+            self.log(f'[SSH] {self.ssh_pool_stats["sessions"]} sessions over '
+                     f'{self.ssh_pool_stats["masters"]} pooled connections: '
+                     f'{self.ssh_pool_stats["handshakes_saved"]} '
+                     f'handshakes saved', Color.BRIGHT_BLUE)
 
     def start(self):
         """
-        Start the pipeline.
+        Start the pipeline. Pkgs start as soon as the pkgs they depend
+        on have started, so independent pkgs start concurrently.
 
         NOTE: Start CAN hang for pipelines which spawn
         daemonized processes. This is because input/output is
@@ -1189,7 +2386,27 @@ class Pipeline(Pkg):
         :return: None
         """
         self.mod_env = self.env.copy()
-        for pkg in self.sub_pkgs:
+        deps = self.get_deps()
+        times = self._schedule(deps, self._start_pkg)
+        # Summed once every pkg finished, since pkgs start in threads
+        self.exit_code += sum(pkg.exit_code for pkg in self.sub_pkgs
+                              if pkg.pkg_id in times)
+        self.critical_path = self._critical_path(deps, times)
+        path_time = sum(times[pkg_id][1] - times[pkg_id][0]
+                        for pkg_id in self.critical_path)
+        if len(self.critical_path):
+            self.log(f'[RUN] Critical path: '
+                     f'{" -> ".join(self.critical_path)} '
+                     f'({path_time} seconds)', color=Color.GREEN)
+
+    def _pkg_span(self, name, pkg):
+        hosts = None
+        if self.jarvis.hostfile is not None:
+            hosts = len(self.jarvis.hostfile.hosts)
+        return span(name, 'pkg', pkg_id=pkg.pkg_id, hosts=hosts)
+
+    def _start_pkg(self, pkg):
+        with self._pkg_span('start', pkg):
             if pkg.skip_run:
                 self.log(f'[RUN] (skipping) {pkg.pkg_id}: Start',
                          color=Color.YELLOW)
@@ -1197,14 +2414,14 @@ class Pipeline(Pkg):
                 self.log(f'[RUN] {pkg.pkg_id}: Start', color=Color.GREEN)
 
             start = time.time()
-            if isinstance(pkg, Service):
+            if isinstance(pkg, Service) and not pkg.skip_run:
                 pkg.update_env(self.env, self.mod_env)
+                pkg.out_parsers = {}
                 pkg.start()
             if isinstance(pkg, Interceptor):
                 pkg.update_env(self.env, self.mod_env)
                 pkg.modify_env()
                 self.mod_env.update(self.env)
-            self.exit_code += pkg.exit_code
             end = time.time()
             pkg.start_time = end - start
             self.log(f'[RUN] {pkg.pkg_id}: '
@@ -1213,11 +2430,20 @@ class Pipeline(Pkg):
 
     def stop(self):
         """
-        Stop the pipeline
+        Stop the pipeline. A pkg stops once every pkg which depends
+        on it has stopped.
 
         :return: None
         """
-        for pkg in reversed(self.sub_pkgs):
+        self._schedule(self.get_deps(reverse=True), self._stop_pkg,
+                       reverse=True)
+
+    def _stop_pkg(self, pkg):
+        if pkg.warm:
+            self.log(f'[RUN] (warm) {pkg.pkg_id}: Keeping alive',
+                     color=Color.YELLOW)
+            return
+        with self._pkg_span('stop', pkg):
             self.log(f'[RUN] {pkg.pkg_id}: Stop', color=Color.GREEN)
             start = time.time()
             if isinstance(pkg, Service):
@@ -1235,7 +2461,15 @@ class Pipeline(Pkg):
 
         :return: None
         """
-        for pkg in reversed(self.sub_pkgs):
+        self._schedule(self.get_deps(reverse=True), self._kill_pkg,
+                       reverse=True)
+
+    def _kill_pkg(self, pkg):
+        if pkg.warm:
+            self.log(f'[RUN] (warm) {pkg.pkg_id}: Keeping alive',
+                     color=Color.YELLOW)
+            return
+        with self._pkg_span('kill', pkg):
             self.log(f'[RUN] {pkg.pkg_id}: Killing', color=Color.GREEN)
             if isinstance(pkg, Service):
                 pkg.update_env(self.env, self.mod_env)
@@ -1243,7 +2477,128 @@ class Pipeline(Pkg):
                     pkg.kill()
                 else:
                     pkg.stop()
-            self.log(f'[RUN] {pkg.pkg_id}: Finished killing', color=Color.GREEN)
+            self.log(f'[RUN] {pkg.pkg_id}: Finished killing',
+                     color=Color.GREEN)
+
+    def get_deps(self, reverse=False):
+        """
+        Get the start dependencies of each sub-pkg. A pkg without a
+        depends_on list depends on every pkg before it. Interceptors
+        modify the environment of the pkgs after them, so an interceptor
+        depends on every pkg before it and every pkg after it depends on
+        the interceptor.
+
+        :param reverse: Get the stop dependencies instead, i.e., a pkg
+        waits for every pkg which depended on it during start.
+        :return: Dict mapping each pkg_id to a set of pkg_ids
+        """
+        deps = {}
+        seen = []
+        barrier = None
+        for pkg in self.sub_pkgs:
+            depends_on = None
+            if pkg.config is not None:
+                depends_on = pkg.config.get('depends_on')
+            if isinstance(pkg, Interceptor) or depends_on is None:
+                pkg_deps = set(seen)
+            else:
+                pkg_deps = set()
+                for dep_id in depends_on:
+                    if dep_id not in seen:
+                        raise Exception(f'{pkg.pkg_id} depends on {dep_id}, '
+                                        f'which is not before it in the '
+                                        f'pipeline')
+                    pkg_deps.add(dep_id)
+                if barrier is not None:
+                    pkg_deps.add(barrier)
+            if isinstance(pkg, Interceptor):
+                barrier = pkg.pkg_id
+            deps[pkg.pkg_id] = pkg_deps
+            seen.append(pkg.pkg_id)
+        if not reverse:
+            return deps
+        rdeps = {pkg_id: set() for pkg_id in deps}
+        for pkg_id, pkg_deps in deps.items():
+            for dep_id in pkg_deps:
+                rdeps[dep_id].add(pkg_id)
+        return rdeps
+
+    def _schedule(self, deps, run_pkg, reverse=False):
+        """
+        Run each sub-pkg as soon as its dependencies have finished.
+        Independent pkgs run concurrently in threads. Ready pkgs are
+        launched in pipeline order (reverse pipeline order when stopping).
+
+        :param deps: Dict mapping each pkg_id to the pkg_ids it waits for
+        :param run_pkg: The function to run on each pkg
+        :param reverse: Whether to launch ready pkgs in reverse order
+        :return: Dict mapping each pkg_id to its (start, end) time
+        """
+        pkgs = {pkg.pkg_id: pkg for pkg in self.sub_pkgs}
+        order = [pkg.pkg_id for pkg in self.sub_pkgs]
+        if reverse:
+            order.reverse()
+        times = {}
+        done = set()
+        futures = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=max(len(order), 1)) as pool:
+            while len(done) < len(order):
+                if error is None:
+                    running = set(futures.values())
+                    for pkg_id in order:
+                        if pkg_id in done or pkg_id in running:
+                            continue
+                        if not deps[pkg_id].issubset(done):
+                            continue
+                        # Spans of the pkg nest in the caller's span
+                        ctx = contextvars.copy_context()
+                        future = pool.submit(ctx.run, self._timed_run,
+                                             run_pkg, pkgs[pkg_id])
+                        futures[future] = pkg_id
+                if len(futures) == 0:
+                    break
+                finished, _ = wait(futures.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pkg_id = futures.pop(future)
+                    done.add(pkg_id)
+                    try:
+                        times[pkg_id] = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+        if error is not None:
+            raise error
+        return times
+
+    @staticmethod
+    def _timed_run(run_pkg, pkg):
+        start = time.time()
+        run_pkg(pkg)
+        return start, time.time()
+
+    @staticmethod
+    def _critical_path(deps, times):
+        """
+        Find the chain of dependent pkgs which determined when the
+        last pkg finished.
+
+        :param deps: Dict mapping each pkg_id to the pkg_ids it waits for
+        :param times: Dict mapping each pkg_id to its (start, end) time
+        :return: List of pkg_ids, first to last
+        """
+        if len(times) == 0:
+            return []
+        path = []
+        pkg_id = max(times, key=lambda x: times[x][1])
+        while pkg_id is not None:
+            path.append(pkg_id)
+            pkg_deps = [dep_id for dep_id in deps[pkg_id] if dep_id in times]
+            if len(pkg_deps) == 0:
+                break
+            pkg_id = max(pkg_deps, key=lambda x: times[x][1])
+        path.reverse()
+        return path
 
     def clean(self, with_iter_out=True):
         """
@@ -1252,15 +2607,20 @@ class Pipeline(Pkg):
         with_iter_out: Clean the iteration output
         :return: None
         """
+        with self.traced(), self.pooled_ssh(), self.batched_fs():
+            self._clean(with_iter_out)
+
+    def _clean(self, with_iter_out):
         for pkg in reversed(self.sub_pkgs):
-            if pkg.skip_run:
-                self.log(f'[RUN] (skipping) {pkg.pkg_id}: Cleaning',
+            if pkg.warm:
+                self.log(f'[RUN] (warm) {pkg.pkg_id}: Skipping clean',
                          color=Color.YELLOW)
-            else:
-                self.log(f'[RUN] {pkg.pkg_id}: Cleaning', color=Color.GREEN)
+                continue
+            self.log(f'[RUN] {pkg.pkg_id}: Cleaning', color=Color.GREEN)
             if isinstance(pkg, Service):
-                pkg.update_env(self.env, self.mod_env)
-                pkg.clean()
+                with self._pkg_span('clean', pkg):
+                    pkg.update_env(self.env, self.mod_env)
+                    pkg.clean()
             self.log(f'[RUN] {pkg.pkg_id}: Finished cleaning',
                      color=Color.GREEN)
         if with_iter_out and 'iterator' in self.config:
@@ -0,0 +1,145 @@
+"""
+This module contains a persistent index mapping each pkg type to the repo
+which provides it. It lets JarvisManager construct a pkg with a single
+import instead of probing every repo in order.
+"""
+
+from jarvis_util.util.naming import to_camel_case
+import os
+import yaml
+
+
+class PkgIndex:
+    """
+    An index of {pkg_type: repo, module, class} stored as YAML under the
+    local jarvis config dir. The index is rebuilt whenever the set of repos
+    changes or the mtime of a repo directory or pkg.py file changes.
+    """
+
+    def __init__(self, index_path):
+        """
+        :param index_path: Where the index is persisted
+        """
+        self.index_path = index_path
+        self.repos = []
+        self.pkgs = {}
+        self.loaded = False
+        self.num_builds = 0
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _repo_key(repos):
+        return [[repo['name'], repo['path']] for repo in repos]
+
+    def load(self, repos):
+        """
+        Load the persisted index. Rebuilds and saves the index if it
+        does not match the current repos.
+
+        :param repos: The ordered list of repos from JarvisManager
+        :return: self
+        """
+        if self.loaded and self._repo_key(self.repos) == self._repo_key(repos):
+            return self
+        self.repos = []
+        self.pkgs = {}
+        if os.path.exists(self.index_path):
+            loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+            with open(self.index_path, 'r', encoding='utf-8') as fp:
+                index = yaml.load(fp, Loader=loader)
+            if isinstance(index, dict):
+                self.repos = index.get('REPOS', [])
+                self.pkgs = index.get('PKGS', {})
+        if self.is_stale(repos):
+            self.build(repos).save()
+        self.loaded = True
+        return self
+
+    def is_stale(self, repos):
+        """
+        Check whether the index no longer reflects the repos on disk
+
+        :param repos: The ordered list of repos from JarvisManager
+        :return: bool
+        """
+        if self._repo_key(self.repos) != self._repo_key(repos):
+            return True
+        for repo in self.repos:
+            repo_dir = os.path.join(repo['path'], repo['name'])
+            if self._mtime(repo_dir) != repo['mtime']:
+                return True
+            for pkg_type, mtime in repo['pkgs'].items():
+                pkg_py = os.path.join(repo_dir, pkg_type, 'pkg.py')
+                if self._mtime(pkg_py) != mtime:
+                    return True
+        return False
+
+    def build(self, repos):
+        """
+        Scan the repo directories for pkg types. Earlier repos take
+        priority, just like the search order in construct_pkg.
+
+        :param repos: The ordered list of repos from JarvisManager
+        :return: self
+        """
+        self.repos = []
+        self.pkgs = {}
+        for repo in repos:
+            repo_dir = os.path.join(repo['path'], repo['name'])
+            pkg_mtimes = {}
+            if os.path.isdir(repo_dir):
+                pkg_types = os.listdir(repo_dir)
+                pkg_types.sort()
+                for pkg_type in pkg_types:
+                    if pkg_type.startswith('_'):
+                        continue
+                    pkg_py = os.path.join(repo_dir, pkg_type, 'pkg.py')
+                    mtime = self._mtime(pkg_py)
+                    if mtime is None:
+                        continue
+                    pkg_mtimes[pkg_type] = mtime
+                    if pkg_type in self.pkgs:
+                        continue
+                    self.pkgs[pkg_type] = {
+                        'repo': repo['name'],
+                        'path': repo['path'],
+                        'module': f"{repo['name']}.{pkg_type}.pkg",
+                        'cls': to_camel_case(pkg_type),
+                    }
+            self.repos.append({
+                'name': repo['name'],
+                'path': repo['path'],
+                'mtime': self._mtime(repo_dir),
+                'pkgs': pkg_mtimes,
+            })
+        self.loaded = True
+        self.num_builds += 1
+        return self
+
+    def save(self):
+        """
+        Atomically persist the index
+
+        :return: self
+        """
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            yaml.dump({'REPOS': self.repos, 'PKGS': self.pkgs}, fp)
+        os.replace(tmp_path, self.index_path)
+        return self
+
+    def find(self, pkg_type):
+        """
+        Get the index entry for a pkg type
+
+        :param pkg_type: The type of pkg to find (snake case)
+        :return: A dict with the repo, path, module, and cls, or None
+        """
+        return self.pkgs.get(pkg_type)
@@ -0,0 +1,175 @@
+"""
+This module contains readiness probes. A service polls its probes after
+launching instead of sleeping for a fixed amount of time, so start returns
+as soon as the service is actually up.
+"""
+
+from abc import ABC, abstractmethod
+from jarvis_util.shell.exec import Exec
+from jarvis_util.shell.local_exec import LocalExecInfo
+import socket
+import time
+import os
+import re
+
+
+class ReadinessProbe(ABC):
+    """
+    A check which passes once a service is ready
+    """
+    @abstractmethod
+    def check(self):
+        """
+        Check whether the service is ready. Must not block for long.
+
+        :return: bool
+        """
+        pass
+
+
+class TcpProbe(ReadinessProbe):
+    """
+    Passes once a TCP port accepts connections
+    """
+    def __init__(self, host, port, timeout=1):
+        """
+        :param host: The host to connect to
+        :param port: The port to connect to
+        :param timeout: How long to wait for a single connection attempt
+        """
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+
+    def check(self):
+        try:
+            with socket.create_connection((self.host, self.port),
+                                          timeout=self.timeout):
+                return True
+        except OSError:
+            return False
+
+    def __str__(self):
+        return f'tcp {self.host}:{self.port}'
+
+
+class FileProbe(ReadinessProbe):
+    """
+    Passes once a file exists
+    """
+    def __init__(self, path):
+        """
+        :param path: The path to wait for
+        """
+        self.path = path
+
+    def check(self):
+        return os.path.exists(self.path)
+
+    def __str__(self):
+        return f'file {self.path}'
+
+
+class LogProbe(ReadinessProbe):
+    """
+    Passes once a line of a log file matches a regex. The log is read
+    incrementally, so each check only reads what was appended.
+    """
+    def __init__(self, path, pattern):
+        """
+        :param path: The log file to scan
+        :param pattern: The regex to search for in each line
+        """
+        self.path = path
+        self.pattern = re.compile(pattern)
+        self.offset = 0
+        self.partial = ''
+
+    def check(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8',
+                      errors='replace') as fp:
+                fp.seek(self.offset)
+                text = fp.read()
+                self.offset = fp.tell()
+        except OSError:
+            return False
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()
+        for line in lines + [self.partial]:
+            if self.pattern.search(line):
+                return True
+        return False
+
+    def __str__(self):
+        return f'log {self.path} ~ {self.pattern.pattern}'
+
+
+class CmdProbe(ReadinessProbe):
+    """
+    Passes once a command exits with code 0
+    """
+    def __init__(self, cmd, exec_info=None):
+        """
+        :param cmd: The command to run
+        :param exec_info: How to run the command. Defaults to running
+        locally with hidden output.
+        """
+        self.cmd = cmd
+        if exec_info is None:
+            exec_info = LocalExecInfo(hide_output=True)
+        self.exec_info = exec_info
+
+    def check(self):
+        node = Exec(self.cmd, self.exec_info)
+        exit_code = node.exit_code
+        if isinstance(exit_code, dict):
+            return all(code == 0 for code in exit_code.values())
+        return exit_code == 0
+
+    def __str__(self):
+        return f'cmd {self.cmd}'
+
+
+class Readiness:
+    """
+    Polls a set of probes with exponential backoff until all of them pass
+    or a deadline expires.
+    """
+    def __init__(self, probes, timeout, interval=.05, max_interval=1,
+                 backoff=2):
+        """
+        :param probes: The list of ReadinessProbes
+        :param timeout: The deadline in seconds
+        :param interval: The initial time between polls in seconds
+        :param max_interval: The maximum time between polls in seconds
+        :param backoff: The factor to grow the interval by after each poll
+        """
+        self.probes = probes
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.pending = list(probes)
+        self.wait_time = 0
+
+    def wait(self):
+        """
+        Poll until all probes pass or the deadline expires
+
+        :return: True if all probes passed
+        """
+        start = time.time()
+        deadline = start + self.timeout
+        interval = self.interval
+        while True:
+            self.pending = [probe for probe in self.pending
+                            if not probe.check()]
+            now = time.time()
+            self.wait_time = now - start
+            if len(self.pending) == 0:
+                return True
+            if now >= deadline:
+                return False
+            time.sleep(min(interval, deadline - now))
+            interval = min(interval * self.backoff, self.max_interval)
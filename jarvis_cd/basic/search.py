@@ -0,0 +1,338 @@
+"""
+This module contains the search strategies of PipelineIterator. A strategy
+proposes which point of the iterator's parameter space to run next. A point
+is a tuple with one position per loop zip, so vars which are zipped together
+always change together, just like in the full grid.
+
+A strategy is selected with the 'search' entry of the iterator YAML:
+
+search:
+  strategy: random
+  samples: 100
+  seed: 0
+"""
+
+from abc import ABC, abstractmethod
+import random
+import math
+
+
+class SearchStrategy(ABC):
+    """
+    Proposes points of the parameter space. Adaptive strategies use the
+    stats of the points they already proposed.
+    """
+    # Whether proposals depend on the stats of earlier points
+    adaptive = False
+
+    def __init__(self, dims, repeat, config):
+        """
+        :param dims: The number of values of each loop zip
+        :param repeat: The number of repeats of each point
+        :param config: The 'search' dict of the iterator YAML
+        """
+        self.dims = dims
+        self.repeat = repeat
+        self.config = config
+        self.total = math.prod(dims)
+        self.rng = random.Random(config.get('seed', 0))
+        self.samples = min(config.get('samples', self.total), self.total)
+
+    def begin(self):
+        """
+        Restart the search
+
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def propose(self):
+        """
+        Get the next point to run
+
+        :return: A tuple of positions, or None when the search is done
+        """
+        pass
+
+    def rep_range(self):
+        """
+        The repeats to run for the last proposed point
+
+        :return: range
+        """
+        return range(self.repeat)
+
+    def observe(self, pos, stats):
+        """
+        Record the stats of a point once all of its repeats ran
+
+        :param pos: The point
+        :param stats: The stat_dict of each repeat of the point
+        :return: None
+        """
+        pass
+
+    def max_points(self):
+        """
+        The number of points the search will propose (estimate)
+
+        :return: int
+        """
+        return self.samples
+
+    def decode(self, index):
+        """
+        Convert an index of the full grid to a point. The last loop
+        varies fastest, just like the grid iterator.
+
+        :param index: The index in [0, total)
+        :return: A tuple of positions
+        """
+        pos = [0] * len(self.dims)
+        for i in range(len(self.dims) - 1, -1, -1):
+            pos[i] = index % self.dims[i]
+            index //= self.dims[i]
+        return tuple(pos)
+
+    def sample_points(self, count):
+        """
+        Uniformly sample distinct points without enumerating the grid
+
+        :param count: The number of points
+        :return: List of points
+        """
+        return [self.decode(index)
+                for index in self.rng.sample(range(self.total), count)]
+
+    def metric(self, stats):
+        """
+        Get the mean of the configured metric over the repeats of a point.
+        The sign is flipped when maximizing, so lower is always better.
+
+        :param stats: The stat_dict of each repeat
+        :return: float
+        """
+        name = self.config.get('metric')
+        if name is None:
+            raise Exception(f'The {self.config["strategy"]} search strategy '
+                            f'requires a metric')
+        vals = []
+        for stat_dict in stats:
+            if name not in stat_dict:
+                raise Exception(f'The metric {name} is not in the stats. '
+                                f'Found: {list(stat_dict.keys())}')
+            vals.append(float(stat_dict[name]))
+        val = sum(vals) / len(vals)
+        if self.config.get('mode', 'min') == 'max':
+            val = -val
+        return val
+
+
+class ListSearch(SearchStrategy):
+    """
+    Runs a list of points computed up front
+    """
+    def begin(self):
+        self.points = self.make_points()
+        self.off = 0
+
+    @abstractmethod
+    def make_points(self):
+        """
+        Compute the points to run
+
+        :return: List of points
+        """
+        pass
+
+    def propose(self):
+        if self.off >= len(self.points):
+            return None
+        pos = self.points[self.off]
+        self.off += 1
+        return pos
+
+    def max_points(self):
+        return len(self.points)
+
+
+class RandomSearch(ListSearch):
+    """
+    Runs distinct points sampled uniformly from the grid
+    """
+    def make_points(self):
+        return self.sample_points(self.samples)
+
+
+class LatinHypercubeSearch(ListSearch):
+    """
+    Latin hypercube sampling. Each loop zip is split into 'samples' strata
+    and every stratum is used exactly once. Duplicate points (possible when
+    a zip has fewer values than samples) are run once.
+    """
+    def make_points(self):
+        columns = []
+        for dim in self.dims:
+            strata = list(range(self.samples))
+            self.rng.shuffle(strata)
+            columns.append([
+                min(int((stratum + self.rng.random()) / self.samples * dim),
+                    dim - 1)
+                for stratum in strata])
+        points = []
+        seen = set()
+        for pos in zip(*columns):
+            if pos not in seen:
+                seen.add(pos)
+                points.append(pos)
+        return points
+
+
+class SuccessiveHalvingSearch(SearchStrategy):
+    """
+    Successive halving over repeats. All sampled points run min_repeat
+    repeats. The best 1/eta of them (by the mean of the metric) run eta
+    times as many repeats, and so on until the iterator's repeat count.
+    """
+    adaptive = True
+
+    def begin(self):
+        self.eta = self.config.get('eta', 3)
+        self.cur_rep = min(self.config.get('min_repeat', 1), self.repeat)
+        self.candidates = self.sample_points(self.samples)
+        self.results = {pos: [] for pos in self.candidates}
+        self.queue = [(pos, range(self.cur_rep)) for pos in self.candidates]
+        self.reps = range(self.repeat)
+
+    def propose(self):
+        if len(self.queue) == 0:
+            if self.cur_rep >= self.repeat or len(self.candidates) <= 1:
+                return None
+            ranked = sorted(self.candidates,
+                            key=lambda pos: self.metric(self.results[pos]))
+            self.candidates = ranked[:max(1, len(ranked) // self.eta)]
+            next_rep = min(self.cur_rep * self.eta, self.repeat)
+            self.queue = [(pos, range(self.cur_rep, next_rep))
+                          for pos in self.candidates]
+            self.cur_rep = next_rep
+        pos, self.reps = self.queue.pop(0)
+        return pos
+
+    def rep_range(self):
+        return self.reps
+
+    def observe(self, pos, stats):
+        self.results[pos] += stats
+
+    def max_points(self):
+        count = 0
+        num = self.samples
+        rep = min(self.config.get('min_repeat', 1), self.repeat)
+        while True:
+            count += num
+            if rep >= self.repeat or num <= 1:
+                return count
+            num = max(1, num // self.config.get('eta', 3))
+            rep = min(rep * self.config.get('eta', 3), self.repeat)
+
+
+class ModelSearch(SearchStrategy):
+    """
+    Model-based search. After 'init' random points, each point is chosen
+    from 'candidates' random unexplored points by a surrogate model:
+    an inverse-distance-weighted estimate of the metric, minus an
+    exploration bonus which grows with the distance to the nearest
+    explored point.
+    """
+    adaptive = True
+
+    def begin(self):
+        self.init = min(self.config.get('init', 5), self.samples)
+        self.num_candidates = self.config.get('candidates', 256)
+        self.explore = self.config.get('explore', 1.0)
+        self.results = {}
+        self.proposed = set()
+
+    def normalize(self, pos):
+        return [p / (dim - 1) if dim > 1 else 0
+                for p, dim in zip(pos, self.dims)]
+
+    def predict(self, pos):
+        """
+        Estimate the metric of a point and its distance to the explored
+        points
+
+        :param pos: The point
+        :return: (estimate, distance to nearest explored point)
+        """
+        x = self.normalize(pos)
+        num = 0
+        den = 0
+        nearest = None
+        for other, val in self.results.items():
+            y = self.normalize(other)
+            dist = math.sqrt(sum((a - b) ** 2 for a, b in zip(x, y)))
+            weight = 1 / (dist ** 2 + 1e-9)
+            num += weight * val
+            den += weight
+            if nearest is None or dist < nearest:
+                nearest = dist
+        return num / den, nearest
+
+    def propose(self):
+        if len(self.proposed) >= self.samples:
+            return None
+        unexplored = self.total - len(self.proposed)
+        count = min(self.num_candidates, unexplored)
+        candidates = set()
+        while len(candidates) < count:
+            pos = self.decode(self.rng.randrange(self.total))
+            if pos not in self.proposed:
+                candidates.add(pos)
+        candidates = sorted(candidates)
+        if len(self.results) < self.init:
+            pos = self.rng.choice(candidates)
+        else:
+            vals = list(self.results.values())
+            scale = max(vals) - min(vals)
+            max_dist = math.sqrt(len(self.dims))
+
+            def score(pos):
+                estimate, nearest = self.predict(pos)
+                return estimate - self.explore * scale * nearest / max_dist
+            pos = min(candidates, key=score)
+        self.proposed.add(pos)
+        return pos
+
+    def observe(self, pos, stats):
+        if len(stats):
+            self.results[pos] = self.metric(stats)
+
+
+STRATEGIES = {
+    'random': RandomSearch,
+    'lhs': LatinHypercubeSearch,
+    'halving': SuccessiveHalvingSearch,
+    'model': ModelSearch,
+}
+
+
+def make_strategy(dims, repeat, config):
+    """
+    Create the search strategy named by an iterator 'search' config
+
+    :param dims: The number of values of each loop zip
+    :param repeat: The number of repeats of each point
+    :param config: The 'search' dict of the iterator YAML, or None
+    :return: A SearchStrategy, or None for the full grid
+    """
+    if config is None:
+        return None
+    name = config.get('strategy', 'grid')
+    if name == 'grid':
+        return None
+    if name not in STRATEGIES:
+        raise Exception(f'Unknown search strategy: {name}. '
+                        f'Options: grid, {", ".join(STRATEGIES)}')
+    return STRATEGIES[name](dims, repeat, config)
@@ -0,0 +1,240 @@
+"""
+This module contains a pool of persistent ssh connections (OpenSSH
+ControlMaster sockets). While a pool is active, every ssh command launched
+by jarvis or jarvis_util goes through a wrapper script placed first in
+PATH, which reuses the master connection of the target host instead of
+performing a new handshake.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import tempfile
+import shutil
+import shlex
+import os
+
+
+class SshPool:
+    """
+    A set of ControlMaster connections opened once per host. The pool
+    counts the ssh sessions which reused a master connection (i.e., the
+    handshakes saved).
+    """
+    # The pool whose wrapper is currently in PATH
+    active = None
+    LOCAL_HOSTS = ('localhost', '127.0.0.1')
+    # Pool dirs are <POOL_ROOT>/<POOL_PREFIX>XXXX
+    POOL_ROOT = '/tmp'
+    POOL_PREFIX = 'jssh'
+
+    def __init__(self, hosts, user=None, pkey=None, port=None, persist=600,
+                 parallel=64):
+        """
+        :param hosts: The hosts to open connections to
+        :param user: The ssh user
+        :param pkey: The ssh private key
+        :param port: The ssh port
+        :param persist: Master connections exit after being idle this many
+        seconds, even if the pool is never closed (e.g., jarvis crashed)
+        :param parallel: The max number of connections opened concurrently
+        """
+        self.hosts = [host for host in hosts if host not in self.LOCAL_HOSTS]
+        self.user = user
+        self.pkey = pkey
+        self.port = port
+        self.persist = persist
+        self.parallel = parallel
+        self.real_ssh = shutil.which('ssh') or 'ssh'
+        self.pool_dir = None
+        self.bin_dir = None
+        self.masters = []
+        self.failed = []
+        self.old_path = None
+
+    def options(self):
+        """
+        The ssh options which make a session use the pool
+
+        :return: List of arguments
+        """
+        return ['-o', 'ControlMaster=auto',
+                '-o', f'ControlPath={self.pool_dir}/%C',
+                '-o', f'ControlPersist={self.persist}']
+
+    def ssh_args(self, host):
+        args = [self.real_ssh] + self.options() + [
+            '-o', 'StrictHostKeyChecking=no', '-o', 'BatchMode=yes']
+        if self.pkey is not None:
+            args += ['-i', self.pkey]
+        if self.port is not None:
+            args += ['-p', str(self.port)]
+        if self.user is not None:
+            host = f'{self.user}@{host}'
+        return args + [host]
+
+    def _write_wrapper(self):
+        opts = ' '.join(shlex.quote(opt) for opt in self.options())
+        ssh = shlex.quote(self.real_ssh)
+        pool_dir = shlex.quote(self.pool_dir)
+        script = '\n'.join([
+            '#!/bin/sh',
+            f'sock=$({ssh} -G {opts} "$@" 2>/dev/null | '
+            f'sed -n "s/^controlpath //p")',
+            'if [ -S "$sock" ]; then',
+            f'  echo >> {pool_dir}/reused',
+            'else',
+            f'  echo >> {pool_dir}/opened',
+            'fi',
+            f'exec {ssh} {opts} "$@"',
+            '',
+        ])
+        path = os.path.join(self.bin_dir, 'ssh')
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write(script)
+        os.chmod(path, 0o755)
+
+    def _open_master(self, host):
+        args = self.ssh_args(host)
+        args[1:1] = ['-f', '-N', '-o', 'ControlMaster=yes']
+        proc = subprocess.run(args, stdin=subprocess.DEVNULL,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, check=False)
+        return proc.returncode == 0
+
+    def open(self):
+        """
+        Open a master connection to every host and put the ssh wrapper
+        first in PATH
+
+        :return: self
+        """
+        # Unix socket paths are short, so avoid deep temp dirs
+        self.pool_dir = tempfile.mkdtemp(prefix=self.POOL_PREFIX,
+                                         dir=self.POOL_ROOT)
+        self.bin_dir = os.path.join(self.pool_dir, 'bin')
+        os.makedirs(self.bin_dir)
+        self._write_wrapper()
+        if len(self.hosts):
+            with ThreadPoolExecutor(min(self.parallel,
+                                        len(self.hosts))) as pool:
+                for host, opened in zip(self.hosts, pool.map(
+                        self._open_master, self.hosts)):
+                    if opened:
+                        self.masters.append(host)
+                    else:
+                        self.failed.append(host)
+        self.old_path = os.environ.get('PATH')
+        os.environ['PATH'] = self.wrap_path(self.old_path)
+        SshPool.active = self
+        return self
+
+    def wrap_path(self, path):
+        if path is None:
+            return self.bin_dir
+        path = self.strip_path(path)
+        if len(path) == 0:
+            return self.bin_dir
+        return f'{self.bin_dir}:{path}'
+
+    def unwrap_path(self, path):
+        return self.strip_path(path)
+
+    @classmethod
+    def strip_path(cls, path):
+        """
+        Remove the wrapper dir of every pool from a PATH, including
+        pools of earlier runs
+
+        :param path: The PATH string
+        :return: The PATH string without wrapper dirs
+        """
+        if path is None:
+            return None
+        pool_dir = os.path.join(cls.POOL_ROOT, cls.POOL_PREFIX)
+        return ':'.join(entry for entry in path.split(':')
+                        if not (entry.startswith(pool_dir) and
+                                entry.endswith('/bin')))
+
+    @classmethod
+    def strip_env(cls, env):
+        """
+        Get a copy of an environment dict without the ssh wrapper, to
+        persist it. The wrapper dir is temporary, so it must never be
+        saved or outlive the pool.
+
+        :param env: The environment dict
+        :return: The environment dict without wrapper dirs in PATH
+        """
+        if env is None or env.get('PATH') is None:
+            return env
+        env = dict(env)
+        env['PATH'] = cls.strip_path(env['PATH'])
+        return env
+
+    @staticmethod
+    def wrap_env(env):
+        """
+        Make an environment dict use the active pool, if any
+
+        :param env: The environment dict
+        :return: None
+        """
+        pool = SshPool.active
+        if pool is None or env is None or 'PATH' not in env:
+            return
+        env['PATH'] = pool.wrap_path(env['PATH'])
+
+    def unwrap_env(self, env):
+        if env is None or 'PATH' not in env:
+            return
+        env['PATH'] = self.unwrap_path(env['PATH'])
+
+    def _count(self, name):
+        try:
+            with open(os.path.join(self.pool_dir, name), 'rb') as fp:
+                return fp.read().count(b'\n')
+        except OSError:
+            return 0
+
+    def stats(self):
+        """
+        Get the metrics of the pool
+
+        :return: Dict with the number of masters, sessions, and
+        handshakes saved
+        """
+        reused = self._count('reused')
+        return {
+            'masters': len(self.masters),
+            'failed': len(self.failed),
+            'sessions': reused + self._count('opened'),
+            'handshakes_saved': reused,
+        }
+
+    def close(self):
+        """
+        Restore PATH and close every master connection
+
+        :return: The stats of the pool
+        """
+        stats = self.stats()
+        if SshPool.active is self:
+            SshPool.active = None
+        if self.old_path is None:
+            os.environ.pop('PATH', None)
+        else:
+            os.environ['PATH'] = self.old_path
+
+        def close_master(host):
+            args = self.ssh_args(host)
+            args[1:1] = ['-O', 'exit']
+            subprocess.run(args, stdin=subprocess.DEVNULL,
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, check=False)
+
+        if len(self.masters):
+            with ThreadPoolExecutor(min(self.parallel,
+                                        len(self.masters))) as pool:
+                list(pool.map(close_master, self.masters))
+        shutil.rmtree(self.pool_dir, ignore_errors=True)
+        return stats
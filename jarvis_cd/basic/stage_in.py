@@ -0,0 +1,342 @@
+"""
+This module contains the engine which stages data into a destination
+directory (e.g., a dataset onto a burst buffer). Like cp -r, each source
+file or directory is copied into the destination under its basename.
+
+The source trees are walked once. Files whose size and mtime (or, if
+hashing is enabled, content hash) match what was last staged are skipped.
+What was staged is kept in a manifest, so the delta check never lists
+the destination. Each destination file is only stat'd to check that it
+still matches the manifest. The remaining files are copied by a bounded pool of
+threads, and large files are split into chunks copied concurrently.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import shutil
+import json
+import time
+import os
+
+
+class StageFile:
+    """
+    A file in a source tree
+    """
+    def __init__(self, src, rel, size, mtime_ns, link=None):
+        """
+        :param src: The path of the source file
+        :param rel: The path relative to the destination
+        :param size: The size of the file in bytes
+        :param mtime_ns: The modification time of the file
+        :param link: The target if the file is a symlink
+        """
+        self.src = src
+        self.rel = rel
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.link = link
+        self.hash = None
+
+
+class StageStats:
+    """
+    The outcome of staging data in
+    """
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.skipped_files = 0
+        self.skipped_bytes = 0
+        self.seconds = 0
+        self.errors = []
+
+    def bytes_per_sec(self):
+        return self.bytes / self.seconds if self.seconds else 0
+
+    def files_per_sec(self):
+        return self.files / self.seconds if self.seconds else 0
+
+    def to_dict(self):
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'skipped_files': self.skipped_files,
+            'skipped_bytes': self.skipped_bytes,
+            'seconds': self.seconds,
+            'bytes_per_sec': self.bytes_per_sec(),
+            'files_per_sec': self.files_per_sec(),
+        }
+
+    def __str__(self):
+        return (f'Copied {self.files} files ({self.bytes} bytes) in '
+                f'{self.seconds:.3f} seconds: '
+                f'{self.bytes_per_sec() / (1 << 20):.1f} MiB/s, '
+                f'{self.files_per_sec():.1f} files/s. Skipped '
+                f'{self.skipped_files} unchanged files '
+                f'({self.skipped_bytes} bytes)')
+
+
+class StageIn:
+    """
+    Copies source files and directories into a destination directory
+    """
+    # The size of the reads and writes of a chunk
+    BLOCK_SIZE = 4 * (1 << 20)
+
+    def __init__(self, dest, manifest_path=None, workers=8,
+                 chunk_size=64 * (1 << 20), use_hash=False):
+        """
+        :param dest: The destination directory
+        :param manifest_path: Where to keep the manifest of staged files.
+        Files missing from the manifest are compared with the destination
+        files instead.
+        :param workers: The max number of concurrent copies
+        :param chunk_size: Files larger than this are copied in chunks of
+        this many bytes
+        :param use_hash: Skip files whose size matches and whose content
+        hash matches the manifest, even if their mtime changed
+        """
+        self.dest = os.path.abspath(dest)
+        self.manifest_path = manifest_path
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.use_hash = use_hash
+        self.manifest = {}
+
+    def scan(self, srcs):
+        """
+        Walk the source trees once
+
+        :param srcs: The list of source files and directories
+        :return: (list of directories relative to dest, list of StageFile)
+        """
+        dirs = []
+        files = []
+        for src in srcs:
+            src = os.path.abspath(src)
+            if not os.path.exists(src):
+                raise FileNotFoundError(f'Data path {src} does not exist')
+            base = os.path.basename(src.rstrip('/'))
+            if not os.path.isdir(src):
+                stat = os.stat(src)
+                files.append(StageFile(src, base, stat.st_size,
+                                       stat.st_mtime_ns))
+                continue
+            dirs.append(base)
+            stack = [(src, base)]
+            while len(stack):
+                path, rel = stack.pop()
+                with os.scandir(path) as it:
+                    for entry in it:
+                        entry_rel = os.path.join(rel, entry.name)
+                        if entry.is_symlink():
+                            files.append(StageFile(
+                                entry.path, entry_rel, 0, 0,
+                                link=os.readlink(entry.path)))
+                        elif entry.is_dir():
+                            dirs.append(entry_rel)
+                            stack.append((entry.path, entry_rel))
+                        else:
+                            stat = entry.stat()
+                            files.append(StageFile(
+                                entry.path, entry_rel, stat.st_size,
+                                stat.st_mtime_ns))
+        return dirs, files
+
+    def load_manifest(self):
+        """
+        Load the manifest of the last stage-in to the destination
+
+        :return: Dict of {rel: [size, mtime_ns, hash]}
+        """
+        self.manifest = {}
+        if self.manifest_path is None or \
+                not os.path.exists(self.manifest_path) or \
+                not os.path.isdir(self.dest):
+            return self.manifest
+        with open(self.manifest_path, 'r', encoding='utf-8') as fp:
+            manifest = json.load(fp)
+        if manifest.get('dest') == self.dest:
+            self.manifest = manifest['files']
+        return self.manifest
+
+    def save_manifest(self):
+        if self.manifest_path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)),
+                    exist_ok=True)
+        tmp_path = f'{self.manifest_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump({'dest': self.dest, 'files': self.manifest}, fp)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def hash_file(path):
+        digest = hashlib.sha1()
+        with open(path, 'rb') as fp:
+            for block in iter(lambda: fp.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def is_staged(self, stage_file):
+        """
+        Check whether a file is already in the destination
+
+        :param stage_file: The StageFile
+        :return: bool
+        """
+        if stage_file.link is not None:
+            dst = os.path.join(self.dest, stage_file.rel)
+            return os.path.islink(dst) and \
+                os.readlink(dst) == stage_file.link
+        try:
+            stat = os.stat(os.path.join(self.dest, stage_file.rel))
+        except FileNotFoundError:
+            return False
+        dst_entry = [stat.st_size, stat.st_mtime_ns]
+        entry = self.manifest.get(stage_file.rel)
+        if entry is None or entry[:2] != dst_entry:
+            # The destination file is not the one which was staged (or was
+            # staged without a manifest), so compare with it instead
+            entry = dst_entry + [None]
+        if entry[0] != stage_file.size:
+            return False
+        stage_file.hash = entry[2]
+        if entry[1] == stage_file.mtime_ns:
+            if self.use_hash and stage_file.hash is None:
+                # Record the hash for the next stage-in
+                stage_file.hash = self.hash_file(stage_file.src)
+            return True
+        if self.use_hash and entry[2] is not None and \
+                self.hash_file(stage_file.src) == entry[2]:
+            # The content is the same, so only the mtime is updated
+            os.utime(os.path.join(self.dest, stage_file.rel),
+                     ns=(stage_file.mtime_ns, stage_file.mtime_ns))
+            return True
+        return False
+
+    def plan(self, files):
+        """
+        Split the files into those which must be copied and those which
+        are already staged
+
+        :param files: List of StageFile
+        :return: (list to copy, list to skip)
+        """
+        copy = []
+        skip = []
+        for stage_file in files:
+            if self.is_staged(stage_file):
+                skip.append(stage_file)
+                if stage_file.link is None:
+                    self.manifest[stage_file.rel] = [
+                        stage_file.size, stage_file.mtime_ns, stage_file.hash]
+            else:
+                stage_file.hash = None
+                copy.append(stage_file)
+        return copy, skip
+
+    def _copy_chunk(self, stage_file, off, size):
+        dst = os.path.join(self.dest, stage_file.rel)
+        end = min(off + size, stage_file.size)
+        fd = os.open(dst, os.O_WRONLY)
+        try:
+            with open(stage_file.src, 'rb') as src_fp:
+                src_fp.seek(off)
+                while off < end:
+                    data = src_fp.read(min(self.BLOCK_SIZE, end - off))
+                    if len(data) == 0:
+                        break
+                    os.pwrite(fd, data, off)
+                    off += len(data)
+        finally:
+            os.close(fd)
+
+    def _copy_small(self, stage_file):
+        dst = os.path.join(self.dest, stage_file.rel)
+        if stage_file.link is not None:
+            if os.path.lexists(dst):
+                os.remove(dst)
+            os.symlink(stage_file.link, dst)
+            return
+        shutil.copyfile(stage_file.src, dst)
+
+    def _finish(self, stage_file):
+        if stage_file.link is not None:
+            return
+        dst = os.path.join(self.dest, stage_file.rel)
+        shutil.copymode(stage_file.src, dst)
+        # The mtime of the source marks the file as staged
+        os.utime(dst, ns=(stage_file.mtime_ns, stage_file.mtime_ns))
+        if self.use_hash and stage_file.hash is None:
+            stage_file.hash = self.hash_file(dst)
+        self.manifest[stage_file.rel] = [stage_file.size,
+                                         stage_file.mtime_ns,
+                                         stage_file.hash]
+
+    def copy(self, files, stats):
+        """
+        Copy files with a bounded pool of threads
+
+        :param files: List of StageFile
+        :param stats: The StageStats to update
+        :return: None
+        """
+        futures = []
+        with ThreadPoolExecutor(self.workers) as pool:
+            for stage_file in files:
+                if stage_file.link is None and \
+                        stage_file.size > self.chunk_size:
+                    # Preallocate so chunks can be written in any order
+                    dst = os.path.join(self.dest, stage_file.rel)
+                    if os.path.islink(dst):
+                        os.remove(dst)
+                    with open(dst, 'wb') as fp:
+                        fp.truncate(stage_file.size)
+                    chunks = [pool.submit(self._copy_chunk, stage_file, off,
+                                          self.chunk_size)
+                              for off in range(0, stage_file.size,
+                                               self.chunk_size)]
+                else:
+                    chunks = [pool.submit(self._copy_small, stage_file)]
+                futures.append((stage_file, chunks))
+            for stage_file, chunks in futures:
+                try:
+                    for chunk in chunks:
+                        chunk.result()
+                    self._finish(stage_file)
+                except Exception as e:
+                    self.manifest.pop(stage_file.rel, None)
+                    stats.errors.append((stage_file.src, str(e)))
+                    continue
+                stats.files += 1
+                stats.bytes += stage_file.size
+
+    def run(self, srcs):
+        """
+        Stage source files and directories into the destination
+
+        :param srcs: The list of source files and directories
+        :return: StageStats
+        """
+        stats = StageStats()
+        start = time.time()
+        dirs, files = self.scan(srcs)
+        self.load_manifest()
+        copy, skip = self.plan(files)
+        stats.skipped_files = len(skip)
+        stats.skipped_bytes = sum(stage_file.size for stage_file in skip)
+        os.makedirs(self.dest, exist_ok=True)
+        for rel in dirs:
+            os.makedirs(os.path.join(self.dest, rel), exist_ok=True)
+        try:
+            self.copy(copy, stats)
+        finally:
+            # Forget files which no longer exist in the sources
+            rels = {stage_file.rel for stage_file in files}
+            self.manifest = {rel: entry for rel, entry in
+                             self.manifest.items() if rel in rels}
+            self.save_manifest()
+        stats.seconds = time.time() - start
+        return stats
@@ -0,0 +1,194 @@
+"""
+This module contains an executor for the stages of a multi-stage workflow
+Application (e.g., ddmd: simulate, aggregate, train, infer). Each task
+declares the data it reads (inputs) and produces (outputs). A task waits
+for the tasks which produce its inputs, so independent tasks, including
+stages of different iterations, run concurrently. Tasks also declare the
+resources they use (e.g., {'gpu': 1}), and at most limits[resource] are
+in use at once.
+
+E.g., in the start() of a pkg:
+
+graph = TaskGraph({'gpu': 4})
+for i in range(iters):
+    graph.add(f'sim{i}', self._sim, args=[i], outputs=[f'traj{i}'],
+              resources={'gpu': 1})
+    graph.add(f'train{i}', self._train, args=[i], inputs=[f'traj{i}'],
+              outputs=[f'model{i}'], resources={'gpu': 1})
+graph.run()
+graph.get_stat(stat_dict, self.pkg_id)
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from jarvis_cd.basic.tracing import span
+import contextvars
+import time
+
+
+class Task:
+    """
+    A stage of a workflow
+    """
+    def __init__(self, name, fn, args=None, inputs=None, outputs=None,
+                 resources=None, after=None):
+        """
+        :param name: The unique name of the task
+        :param fn: The function which runs the task. If it returns an
+        asynchronous Exec, the task ends when the Exec does.
+        :param args: The arguments of fn
+        :param inputs: The names of the data the task reads
+        :param outputs: The names of the data the task produces
+        :param resources: Dict of {resource: amount} the task uses
+        :param after: Names of tasks to wait for besides the producers
+        of the inputs
+        """
+        self.name = name
+        self.fn = fn
+        self.args = args or []
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.resources = resources or {}
+        self.after = after or []
+        self.deps = set()
+        self.start = None
+        self.end = None
+        self.error = None
+
+    def run(self):
+        self.start = time.time()
+        try:
+            with span(self.name, 'task', inputs=self.inputs,
+                      outputs=self.outputs):
+                node = self.fn(*self.args)
+                if hasattr(node, 'wait'):
+                    node.wait()
+                exit_code = getattr(node, 'exit_code', 0)
+                if isinstance(exit_code, dict):
+                    exit_code = max(exit_code.values(), default=0)
+                if exit_code:
+                    raise Exception(f'Task {self.name} failed with exit '
+                                    f'code {exit_code}')
+        finally:
+            self.end = time.time()
+
+    def seconds(self):
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+
+class TaskGraph:
+    """
+    Runs tasks once their inputs are produced and their resources free
+    """
+    def __init__(self, limits=None):
+        """
+        :param limits: Dict of {resource: max amount in use at once}.
+        Resources without a limit are unlimited.
+        """
+        self.limits = {key: val for key, val in (limits or {}).items()
+                       if val is not None}
+        self.tasks = {}
+        # The task which last declared each output
+        self.producers = {}
+        self.start = None
+        self.end = None
+
+    def add(self, name, fn, args=None, inputs=None, outputs=None,
+            resources=None, after=None):
+        """
+        Add a task. An input is produced by the last task added before
+        this one which declared it as an output.
+
+        :return: Task
+        """
+        if name in self.tasks:
+            raise Exception(f'Task {name} was already added')
+        task = Task(name, fn, args, inputs, outputs, resources, after)
+        for dep in task.after:
+            if dep not in self.tasks:
+                raise Exception(f'Task {name} waits for unknown task {dep}')
+            task.deps.add(dep)
+        for data in task.inputs:
+            if data in self.producers:
+                task.deps.add(self.producers[data])
+        for resource, amount in task.resources.items():
+            if amount > self.limits.get(resource, amount):
+                raise Exception(f'Task {name} needs {amount} {resource}, '
+                                f'but only {self.limits[resource]} exist')
+        self.tasks[name] = task
+        for data in task.outputs:
+            self.producers[data] = name
+        return task
+
+    def _fits(self, task, used):
+        return all(used.get(resource, 0) + amount <=
+                   self.limits.get(resource, float('inf'))
+                   for resource, amount in task.resources.items())
+
+    def run(self):
+        """
+        Run every task. Ready tasks are launched in the order they were
+        added. After a task fails, no new tasks are launched, and the
+        error is raised once the running tasks finish.
+
+        :return: self
+        """
+        self.start = time.time()
+        order = list(self.tasks)
+        done = set()
+        futures = {}
+        used = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=max(len(order), 1)) as pool:
+            while len(done) < len(order):
+                if error is None:
+                    running = set(futures.values())
+                    for name in order:
+                        task = self.tasks[name]
+                        if name in done or name in running or \
+                                not task.deps.issubset(done) or \
+                                not self._fits(task, used):
+                            continue
+                        for resource, amount in task.resources.items():
+                            used[resource] = used.get(resource, 0) + amount
+                        # Spans of the task nest in the caller's span
+                        ctx = contextvars.copy_context()
+                        futures[pool.submit(ctx.run, task.run)] = name
+                        running.add(name)
+                if len(futures) == 0:
+                    break
+                finished, _ = wait(futures.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = futures.pop(future)
+                    task = self.tasks[name]
+                    done.add(name)
+                    for resource, amount in task.resources.items():
+                        used[resource] -= amount
+                    try:
+                        future.result()
+                    except Exception as e:
+                        task.error = e
+                        if error is None:
+                            error = e
+        self.end = time.time()
+        if error is not None:
+            raise error
+        return self
+
+    def get_stat(self, stat_dict, prefix):
+        """
+        Record when each task started (relative to the graph) and how long
+        it ran
+
+        :param stat_dict: The stats of the pipeline
+        :param prefix: The prefix of the stats (e.g., the pkg_id)
+        :return: None
+        """
+        for name, task in self.tasks.items():
+            if task.seconds() is None:
+                continue
+            stat_dict[f'{prefix}.{name}.start'] = task.start - self.start
+            stat_dict[f'{prefix}.{name}.time'] = task.seconds()
+        if self.start is not None and self.end is not None:
+            stat_dict[f'{prefix}.total_time'] = self.end - self.start
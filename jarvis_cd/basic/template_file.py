@@ -0,0 +1,124 @@
+"""
+This module contains the engine behind SimplePkg.copy_template_file.
+Template files mark constants using the notation ##CONST_NAME##. A template
+is parsed once per (path, mtime) and rendered in a single pass.
+"""
+
+import re
+import os
+
+
+class Template:
+    """
+    A parsed template. The text is split into literal chunks and the
+    names of the constants between them.
+    """
+    MARKER = re.compile(r'##([^#\s]+)##')
+
+    def __init__(self, text):
+        """
+        :param text: The contents of the template
+        """
+        self.chunks = []
+        self.names = []
+        off = 0
+        for match in self.MARKER.finditer(text):
+            self.chunks.append(text[off:match.start()])
+            self.names.append(match.group(1))
+            off = match.end()
+        self.chunks.append(text[off:])
+        self.name_set = set(self.names)
+
+    def render(self, replacements):
+        """
+        Substitute the constants of the template
+
+        :param replacements: Dict of {const_name: value}
+        :return: (text, unknown). Unknown constants are left as-is.
+        """
+        out = [self.chunks[0]]
+        unknown = []
+        for name, chunk in zip(self.names, self.chunks[1:]):
+            if name in replacements:
+                out.append(str(replacements[name]))
+            else:
+                out.append(f'##{name}##')
+                if name not in unknown:
+                    unknown.append(name)
+            out.append(chunk)
+        return ''.join(out), unknown
+
+
+class TemplateRender:
+    """
+    The outcome of rendering a template file
+    """
+    def __init__(self, written, unknown, unused):
+        """
+        :param written: Whether the destination was (re)written
+        :param unknown: Constants in the template with no replacement
+        :param unused: Replacements which are not in the template
+        """
+        self.written = written
+        self.unknown = unknown
+        self.unused = unused
+
+
+class TemplateCache:
+    """
+    Parsed templates keyed by path. An entry is parsed again when the
+    mtime or size of the template changes.
+    """
+    templates = {}
+
+    @classmethod
+    def get(cls, path):
+        """
+        Get the parsed template at a path
+
+        :param path: The path to the template
+        :return: Template
+        """
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = cls.templates.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(path, 'r', encoding='utf-8') as fp:
+            template = Template(fp.read())
+        cls.templates[path] = (stamp, template)
+        return template
+
+
+def render_template_file(src, dst, replacements=None):
+    """
+    Render a template file. The destination is left untouched (including
+    its mtime) if its contents would not change.
+
+    :param src: Path to the template
+    :param dst: Destination of the template
+    :param replacements: A list of 2-tuples or dict of
+    {const_name: value}. For lists, the first entry of a name is used.
+    :return: TemplateRender
+    """
+    if replacements is None:
+        replacements = {}
+    if isinstance(replacements, list):
+        replacement_dict = {}
+        for const_name, replace in replacements:
+            replacement_dict.setdefault(const_name, replace)
+        replacements = replacement_dict
+    template = TemplateCache.get(src)
+    text, unknown = template.render(replacements)
+    unused = [name for name in replacements if name not in template.name_set]
+    data = text.encode('utf-8')
+    try:
+        if os.path.getsize(dst) == len(data):
+            with open(dst, 'rb') as fp:
+                if fp.read() == data:
+                    return TemplateRender(False, unknown, unused)
+    except OSError:
+        pass
+    with open(dst, 'wb') as fp:
+        fp.write(data)
+    return TemplateRender(True, unknown, unused)
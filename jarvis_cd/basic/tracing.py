@@ -0,0 +1,208 @@
+"""
+This module contains structured tracing of pipeline lifecycle phases.
+While a Tracer is active, phases (configure, start, stop, kill, clean,
+readiness waits) and every Exec inside them are recorded as nested spans.
+Spans are exported as Chrome trace JSON (chrome://tracing, Perfetto) and
+as a flat CSV.
+"""
+
+from contextlib import contextmanager
+import contextvars
+import threading
+import json
+import time
+import csv
+import os
+
+_current_span = contextvars.ContextVar('jarvis_span', default=None)
+
+
+class Span:
+    """
+    A timed phase of a pipeline
+    """
+    def __init__(self, span_id, name, cat, parent, args):
+        self.span_id = span_id
+        self.name = name
+        self.cat = cat
+        self.parent = parent
+        self.args = args
+        self.start = time.time()
+        self.end = None
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+    def to_dict(self):
+        return {'id': self.span_id, 'name': self.name, 'cat': self.cat,
+                'parent': self.parent, 'args': self.args,
+                'start': self.start, 'end': self.end, 'pid': self.pid,
+                'tid': self.tid}
+
+
+class Tracer:
+    """
+    Records spans. Spans inherit the pkg_id, iteration, and repeat of the
+    span they are nested in.
+    """
+    # The tracer spans are currently recorded in
+    active = None
+    INHERIT = ('pkg_id', 'iter', 'rep')
+    MAX_CMD = 256
+    CSV_COLUMNS = ['id', 'parent', 'name', 'cat', 'start', 'end', 'duration',
+                   'pid', 'tid', 'pkg_id', 'iter', 'rep', 'hosts', 'cmd']
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+        self.t0 = time.time()
+        self.exec_hook = None
+
+    def start(self):
+        """
+        Make this the active tracer and trace every jarvis_util Exec
+
+        :return: self
+        """
+        Tracer.active = self
+        self._hook_exec()
+        return self
+
+    def stop(self):
+        """
+        Stop recording spans
+
+        :return: self
+        """
+        if self.exec_hook is not None:
+            exec_cls, init = self.exec_hook
+            exec_cls.__init__ = init
+            self.exec_hook = None
+        if Tracer.active is self:
+            Tracer.active = None
+        return self
+
+    def _hook_exec(self):
+        # Pkgs call Exec (and Mkdir, Rm, Kill, ...) directly, so spans for
+        # commands are recorded by wrapping the base class constructor
+        from jarvis_util.shell.exec import Exec
+        init = Exec.__init__
+
+        def traced_init(exe, cmd, exec_info=None, *args, **kwargs):
+            hostfile = getattr(exec_info, 'hostfile', None)
+            with span('exec', 'exec', cmd=str(cmd)[:Tracer.MAX_CMD],
+                      hosts=len(hostfile.hosts) if hostfile else 1,
+                      exec_async=getattr(exec_info, 'exec_async', False)):
+                init(exe, cmd, exec_info, *args, **kwargs)
+        Exec.__init__ = traced_init
+        self.exec_hook = (Exec, init)
+
+    def begin(self, name, cat, args):
+        parent = _current_span.get()
+        if parent is not None:
+            for key in self.INHERIT:
+                if key not in args and key in parent.args:
+                    args[key] = parent.args[key]
+        with self.lock:
+            # A forked sweep worker continues the numbering of the parent,
+            # so the pid makes ids unique across the merged trace
+            span_obj = Span(f'{os.getpid()}.{len(self.spans)}', name, cat,
+                            parent.span_id if parent else None, args)
+            self.spans.append(span_obj)
+        return span_obj
+
+    def all_spans(self):
+        return [span_obj.to_dict() for span_obj in self.spans
+                if span_obj.end is not None]
+
+    def save_part(self, path):
+        """
+        Save the spans of a sweep worker process, to be merged by the
+        parent with load_parts. Spans the worker inherited from the parent
+        when it forked are not saved.
+
+        :param path: Where to save the spans
+        :return: None
+        """
+        pid = os.getpid()
+        with open(path, 'w', encoding='utf-8') as fp:
+            json.dump([span_dict for span_dict in self.all_spans()
+                       if span_dict['pid'] == pid], fp)
+
+    def load_parts(self, paths):
+        """
+        Merge the spans saved by sweep workers
+
+        :param paths: The files written by save_part
+        :return: List of span dicts
+        """
+        spans = []
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as fp:
+                    spans += json.load(fp)
+        return spans
+
+    def save(self, out_dir, parts=None):
+        """
+        Export the spans as trace.json (Chrome trace) and trace.csv
+
+        :param out_dir: The directory to export to
+        :param parts: Span files of sweep workers to merge
+        :return: (json path, csv path)
+        """
+        spans = self.all_spans() + self.load_parts(parts or [])
+        spans.sort(key=lambda span_dict: span_dict['start'])
+        os.makedirs(out_dir, exist_ok=True)
+        json_path = os.path.join(out_dir, 'trace.json')
+        csv_path = os.path.join(out_dir, 'trace.csv')
+        events = []
+        for span_dict in spans:
+            events.append({
+                'name': span_dict['name'],
+                'cat': span_dict['cat'],
+                'ph': 'X',
+                'ts': (span_dict['start'] - self.t0) * 1e6,
+                'dur': (span_dict['end'] - span_dict['start']) * 1e6,
+                'pid': span_dict['pid'],
+                'tid': span_dict['tid'],
+                'args': span_dict['args'],
+            })
+        with open(json_path, 'w', encoding='utf-8') as fp:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp)
+        with open(csv_path, 'w', encoding='utf-8', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(self.CSV_COLUMNS)
+            for span_dict in spans:
+                args = span_dict['args']
+                writer.writerow([
+                    span_dict['id'], span_dict['parent'], span_dict['name'],
+                    span_dict['cat'], span_dict['start'] - self.t0,
+                    span_dict['end'] - self.t0,
+                    span_dict['end'] - span_dict['start'],
+                    span_dict['pid'], span_dict['tid'], args.get('pkg_id'),
+                    args.get('iter'), args.get('rep'), args.get('hosts'),
+                    args.get('cmd')])
+        return json_path, csv_path
+
+
+@contextmanager
+def span(name, cat='jarvis', **args):
+    """
+    Record a span if a tracer is active
+
+    :param name: The name of the phase (e.g., start)
+    :param cat: The category (e.g., pkg, exec)
+    :param args: Attributes of the span (e.g., pkg_id, hosts, cmd)
+    :return: The Span, or None if not tracing
+    """
+    tracer = Tracer.active
+    if tracer is None:
+        yield None
+        return
+    span_obj = tracer.begin(name, cat, args)
+    token = _current_span.set(span_obj)
+    try:
+        yield span_obj
+    finally:
+        _current_span.reset(token)
+        span_obj.end = time.time()
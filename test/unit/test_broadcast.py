@@ -0,0 +1,111 @@
+"""
+Test copying a dataset to a node-local path on many hosts
+"""
+from jarvis_cd.basic.broadcast import Broadcast
+from jarvis_cd.basic.fanout import TreeFanout, LocalTransport, \
+    SshTransport
+from unittest import TestCase
+import tempfile
+import os
+
+
+class LocalBroadcast(Broadcast):
+    """
+    Copies to a directory per simulated host instead of over ssh
+    """
+    def __init__(self, root, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.root = root
+
+    def copy_cmd(self, path, sender, host):
+        # Every copy takes the same time, like equal links
+        return (f'sleep .05 && mkdir -p {self.root}/{host} && '
+                f'cp -a {path}/. {self.root}/{host}/')
+
+    def shard_cmd(self, path, host, list_path):
+        return (f'mkdir -p {self.root}/{host} && sed "s|^/||" {list_path} | '
+                f'tar -C {path} -cf - -T - | tar -C {self.root}/{host} -xf -')
+
+
+class TestBroadcast(TestCase):
+    """
+    Every host should receive a verified copy in about log2(hosts) steps
+    """
+    def write(self, path, size):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fp:
+            fp.write(b'x' * size)
+
+    def make_src(self, root):
+        src = os.path.join(root, 'src')
+        self.write(os.path.join(src, 'a.bin'), 300)
+        self.write(os.path.join(src, 'sub', 'b.bin'), 200)
+        self.write(os.path.join(src, 'sub', 'c.bin'), 100)
+        self.write(os.path.join(src, 'd.bin'), 100)
+        return src
+
+    def test_tree(self):
+        with tempfile.TemporaryDirectory() as root:
+            src = self.make_src(root)
+            hosts = [f'h{i}' for i in range(7)]
+            tree = TreeFanout(LocalTransport(latency=0, run_cmds=True),
+                              fanout=1)
+            broadcast = LocalBroadcast(root, tree, f'{root}/$JARVIS_FANOUT_HOST')
+            stats = broadcast.run(src, hosts)
+            self.assertEqual(stats.errors, {})
+            self.assertEqual((stats.files, stats.bytes), (4 * 7, 700 * 7))
+            # 1, 3, 7 hosts hold the data after each step
+            self.assertEqual(stats.steps, 3)
+            for host in hosts:
+                self.assertEqual(
+                    os.path.getsize(f'{root}/{host}/sub/b.bin'), 200)
+
+            # Missing data is reported per host
+            os.remove(f'{root}/h3/sub/c.bin')
+            errors = broadcast.verify(hosts, {host: (4, 700)
+                                              for host in hosts})
+            self.assertEqual(list(errors), ['h3'])
+
+    def test_shard(self):
+        with tempfile.TemporaryDirectory() as root:
+            src = self.make_src(root)
+            hosts = ['h0', 'h1']
+            tree = TreeFanout(LocalTransport(latency=0, run_cmds=True),
+                              fanout=1)
+            broadcast = LocalBroadcast(root, tree,
+                                       f'{root}/$JARVIS_FANOUT_HOST',
+                                       mode='shard')
+            stats = broadcast.run(src, hosts)
+            self.assertEqual(stats.errors, {})
+            self.assertEqual((stats.files, stats.bytes), (4, 700))
+            # The shards are balanced by size
+            self.assertEqual(sorted(os.listdir(f'{root}/h0')),
+                             ['a.bin', 'sub'])
+            self.assertEqual(os.listdir(f'{root}/h0/sub'), ['c.bin'])
+            self.assertEqual(sorted(os.listdir(f'{root}/h1')),
+                             ['d.bin', 'sub'])
+            self.assertEqual(os.listdir(f'{root}/h1/sub'), ['b.bin'])
+            self.assertEqual(Broadcast.include_pattern('x/[a]*.bin'),
+                             '/x/\\[a]\\*.bin')
+
+    def test_cmds(self):
+        tree = TreeFanout(SshTransport(user='u', port=2222), fanout=1,
+                          src='h0')
+        broadcast = Broadcast(tree, '/mnt/local/data/')
+        ssh = '-e "ssh -o StrictHostKeyChecking=no -p 2222" ' \
+              '--rsync-path="mkdir -p /mnt/local/data && rsync"'
+        # The head copies to itself without ssh
+        self.assertEqual(broadcast.copy_cmd('/pfs/data', 'h0', 'h0'),
+                         'mkdir -p /mnt/local/data && rsync -a --delete '
+                         '/pfs/data/ /mnt/local/data/')
+        self.assertEqual(broadcast.copy_cmd('/pfs/data', 'h0', 'h1'),
+                         f'rsync -a --delete {ssh} /pfs/data/ '
+                         f'u@h1:/mnt/local/data/')
+        # A host which received the data may forward it to the head
+        self.assertEqual(broadcast.copy_cmd('/mnt/local/data', 'h1', 'h0'),
+                         f'rsync -a --delete {ssh} /mnt/local/data/ '
+                         f'u@h0:/mnt/local/data/')
+        self.assertEqual(broadcast.shard_cmd('/pfs/data', 'h2', '/tmp/list'),
+                         f'rsync -a -m --delete --delete-excluded {ssh} '
+                         f"--include='*/' --include-from=/tmp/list "
+                         f"--exclude='*' /pfs/data/ u@h2:/mnt/local/data/")
@@ -0,0 +1,76 @@
+"""
+Test the cache of build artifacts
+"""
+from jarvis_cd.basic.build_cache import BuildCache
+from unittest import TestCase
+import tempfile
+import time
+import os
+
+
+class TestBuildCache(TestCase):
+    """
+    Builds are reused only when their inputs match
+    """
+    def make_src(self, root):
+        src_dir = os.path.join(root, 'src')
+        os.makedirs(src_dir)
+        with open(os.path.join(src_dir, 'main.c'), 'w') as fp:
+            fp.write('int main() { return 0; }\n')
+        return src_dir
+
+    def build(self, build_dir, text):
+        os.makedirs(os.path.join(build_dir, 'bin'), exist_ok=True)
+        with open(os.path.join(build_dir, 'bin', 'app'), 'w') as fp:
+            fp.write(text)
+
+    def test_reuse(self):
+        with tempfile.TemporaryDirectory() as root:
+            src_dir = self.make_src(root)
+            cache = BuildCache(os.path.join(root, 'cache'), 1 << 30, 3600)
+            build_dir = os.path.join(root, 'build')
+            key = cache.key('app', {'OPT': 1}, [src_dir], {'CC': 'gcc'})
+            self.assertFalse(cache.restore(key, [build_dir]))
+            self.build(build_dir, 'v1')
+            cache.store(key, [build_dir], 'app')
+
+            # Same inputs: the build dir links into the cache
+            self.assertTrue(cache.restore(key, [build_dir]))
+            self.assertTrue(os.path.islink(build_dir))
+            with open(os.path.join(build_dir, 'bin', 'app')) as fp:
+                self.assertEqual(fp.read(), 'v1')
+
+            # Objects in the source tree do not change the key
+            open(os.path.join(src_dir, 'main.o'), 'w').close()
+            self.assertEqual(
+                key, cache.key('app', {'OPT': 1}, [src_dir], {'CC': 'gcc'}))
+
+            # Options, sources, and env change the key
+            self.assertNotEqual(
+                key, cache.key('app', {'OPT': 2}, [src_dir], {'CC': 'gcc'}))
+            self.assertNotEqual(
+                key, cache.key('app', {'OPT': 1}, [src_dir], {'CC': 'icc'}))
+            os.utime(os.path.join(src_dir, 'main.c'), ns=(0, 0))
+            self.assertNotEqual(
+                key, cache.key('app', {'OPT': 1}, [src_dir], {'CC': 'gcc'}))
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as root:
+            cache = BuildCache(os.path.join(root, 'cache'), 5, 3600)
+            keys = []
+            for i in range(3):
+                build_dir = os.path.join(root, f'build{i}')
+                self.build(build_dir, 'abc')
+                cache.store(f'key{i}', [build_dir])
+                meta_path = os.path.join(cache.entry_dir(f'key{i}'),
+                                         BuildCache.META)
+                os.utime(meta_path, (time.time() + i, time.time() + i))
+                keys.append(f'key{i}')
+            # Only the most recently used build fits in 5 bytes
+            self.assertEqual(sorted(cache.evict()), ['key0', 'key1'])
+
+            # Builds unused for longer than max_age are evicted
+            cache.max_bytes = 1 << 30
+            cache.max_age = -10
+            self.assertEqual(cache.evict(keep='key2'), [])
+            self.assertEqual(cache.evict(), ['key2'])
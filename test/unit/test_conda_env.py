@@ -0,0 +1,46 @@
+"""
+Test managing the variables of a conda environment
+"""
+from jarvis_cd.basic.conda_env import CondaEnv
+from unittest import TestCase
+import tempfile
+import json
+import os
+
+
+class TestCondaEnv(TestCase):
+    """
+    Variables should be read from conda-meta/state and only written
+    when they change
+    """
+    def test_update(self):
+        with tempfile.TemporaryDirectory() as envs_dir:
+            prefix = os.path.join(envs_dir, 'pytorch')
+            os.makedirs(os.path.join(prefix, 'conda-meta'))
+            state_path = os.path.join(prefix, 'conda-meta', 'state')
+            with open(state_path, 'w', encoding='utf-8') as fp:
+                json.dump({'env_vars': {'OMP_NUM_THREADS': '4'},
+                           'other': 1}, fp)
+            env = {'CONDA_ENVS_PATH': envs_dir}
+            conda_env = CondaEnv('pytorch', env)
+            self.assertEqual(conda_env.prefix, prefix)
+
+            changed = conda_env.update(
+                {'HERMES_CONF': '/conf.yaml', 'LD_PRELOAD': None},
+                ['HERMES_VFD'])
+            self.assertEqual(changed, ['HERMES_CONF'])
+            with open(state_path, encoding='utf-8') as fp:
+                state = json.load(fp)
+            self.assertEqual(state, {'env_vars': {
+                'OMP_NUM_THREADS': '4', 'HERMES_CONF': '/conf.yaml'},
+                'other': 1})
+
+            # Nothing is written if nothing changed
+            os.utime(state_path, ns=(1, 1))
+            self.assertEqual(CondaEnv(prefix).update(
+                {'HERMES_CONF': '/conf.yaml'}, ['HERMES_VFD']), [])
+            self.assertEqual(os.stat(state_path).st_mtime_ns, 1)
+
+            self.assertEqual(conda_env.update(unset_vars=['HERMES_CONF']),
+                             ['HERMES_CONF'])
+            self.assertEqual(conda_env.get_vars(), {'OMP_NUM_THREADS': '4'})
@@ -0,0 +1,64 @@
+"""
+Test reusing and evicting generated datasets
+"""
+from jarvis_cd.basic.dataset_cache import DatasetCache
+from unittest import TestCase
+import tempfile
+import os
+
+
+class TestDatasetCache(TestCase):
+    """
+    Datasets with the same parameters should be generated once
+    """
+    def generate(self, cache, key, size):
+        path = cache.prepare(key)
+        os.makedirs(os.path.join(path, 'train'))
+        with open(os.path.join(path, 'train', 'img_0.npz'), 'wb') as fp:
+            fp.write(b'x' * size)
+        return cache.commit(key, 'unet3d', {'size': size})
+
+    def test_dataset_cache(self):
+        with tempfile.TemporaryDirectory() as data_path:
+            cache = DatasetCache(data_path, max_bytes=250)
+            key = cache.key('unet3d', {'num_files_train': 8, 'format': 'npz'})
+            self.assertEqual(key, cache.key(
+                'unet3d', {'format': 'npz', 'num_files_train': 8}))
+            self.assertNotEqual(key, cache.key(
+                'unet3d', {'num_files_train': 16, 'format': 'npz'}))
+
+            # A dataset is only reused once its generation completed
+            self.assertFalse(cache.lookup(key))
+            cache.prepare(key)
+            self.assertFalse(cache.lookup(key))
+            self.assertEqual(self.generate(cache, key, 100), 100)
+            self.assertTrue(cache.lookup(key))
+
+            # The least recently used datasets are evicted beyond max_bytes
+            other = cache.key('unet3d', {'num_files_train': 16})
+            self.generate(cache, other, 100)
+            os.utime(os.path.join(cache.path(key), DatasetCache.META),
+                     (1, 1))
+            newest = cache.key('unet3d', {'num_files_train': 32})
+            self.generate(cache, newest, 100)
+            partial = cache.key('unet3d', {'num_files_train': 64})
+            cache.prepare(partial)
+            os.utime(cache.path(partial), (1, 1))
+            # Datasets which may still be generated are not evicted
+            generating = cache.key('unet3d', {'num_files_train': 128})
+            cache.prepare(generating)
+            locked = cache.key('unet3d', {'num_files_train': 256})
+            cache.prepare(locked)
+            os.utime(cache.path(locked), (1, 1))
+            os.makedirs(os.path.join(data_path, 'user_data'))
+            with cache.lock(locked) as acquired:
+                self.assertTrue(acquired)
+                evicted = cache.evict(keep=newest)
+            self.assertEqual(sorted(evicted), sorted([key, partial]))
+            self.assertTrue(os.path.isdir(cache.path(generating)))
+            self.assertTrue(os.path.isdir(cache.path(locked)))
+            self.assertTrue(cache.lookup(newest))
+            self.assertTrue(cache.lookup(other))
+            # Directories which are not datasets are never removed
+            self.assertTrue(os.path.isdir(os.path.join(data_path,
+                                                       'user_data')))
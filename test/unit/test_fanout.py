@@ -0,0 +1,56 @@
+"""
+Test the tree fanout of remote commands on a simulated cluster
+"""
+from jarvis_cd.basic.fanout import TreeFanout, LocalTransport, FanoutKill
+from unittest import TestCase
+from types import SimpleNamespace
+
+
+class TestFanout(TestCase):
+    """
+    Results of every host should reach the head through the relays
+    """
+    def test_aggregate(self):
+        hosts = [f'host{i}' for i in range(20)]
+        transport = LocalTransport(latency=0, run_cmds=True)
+        tree = TreeFanout(transport, fanout=4, parallel=8)
+        result = tree.run('echo $JARVIS_FANOUT_HOST $VAL; '
+                          '[ $JARVIS_FANOUT_HOST != host7 ]', hosts,
+                          env={'VAL': 'x y'})
+        self.assertEqual(result.relays, ['host0', 'host5', 'host10',
+                                         'host15'])
+        self.assertEqual(len(result.exit_code), 20)
+        self.assertEqual(result.stdout['host13'].strip(), 'host13 x y')
+        self.assertEqual(result.failed_hosts(), ['host7'])
+        self.assertEqual(transport.connections['localhost'], 4)
+
+        # Hosts behind a failed relay are contacted directly
+        transport.bad_relays.add('host5')
+        result = tree.run('true', hosts)
+        self.assertEqual(result.retried, hosts[5:10])
+        self.assertEqual(result.failed_hosts(), [])
+
+    def test_scaling(self):
+        hosts = [f'host{i}' for i in range(1000)]
+        head_conns = {}
+        for fanout in [1, 32]:
+            transport = LocalTransport(latency=.005)
+            tree = TreeFanout(transport, fanout=fanout, parallel=32)
+            result = tree.run('true', hosts)
+            self.assertEqual(len(result.exit_code), 1000)
+            head_conns[fanout] = transport.connections['localhost']
+        self.assertEqual(head_conns, {1: 1000, 32: 32})
+
+    def test_kill(self):
+        hosts = [f'host{i}' for i in range(6)]
+        transport = LocalTransport(latency=0, run_cmds=True)
+        jarvis = SimpleNamespace(get_fanout=lambda exec_info, num_hosts:
+                                 TreeFanout(transport, fanout=2, parallel=4))
+        exec_info = SimpleNamespace(hostfile=SimpleNamespace(hosts=hosts),
+                                    env={})
+        # pkill exits with 1 when no process matches
+        kill = FanoutKill('[j]arvis-no-such-process', exec_info,
+                          jarvis=jarvis)
+        self.assertEqual(kill.exit_code, {host: 1 for host in hosts})
+        self.assertEqual(set(kill.stderr), set(hosts))
+        self.assertEqual(transport.connections['localhost'], 2)
@@ -0,0 +1,72 @@
+"""
+Test batching remote file system operations
+"""
+from jarvis_cd.basic.fs_batch import FsBatch
+from jarvis_cd.basic.fanout import TreeFanout, LocalTransport
+from jarvis_cd.basic.pkg import Pipeline
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest import TestCase
+import tempfile
+import os
+
+
+class FakeHostfile:
+    def __init__(self, hosts):
+        self.hosts = hosts
+
+
+class FakeExecInfo:
+    def __init__(self, hosts):
+        self.hostfile = FakeHostfile(hosts)
+
+
+class TestFsBatch(TestCase):
+    """
+    Queued operations should run as one script per host
+    """
+    def test_flush(self):
+        with tempfile.TemporaryDirectory() as root:
+            hosts = ['h0', 'h1', 'h2']
+            # Each simulated host gets its own directory
+            host_dir = f'{root}/$JARVIS_FANOUT_HOST'
+            open(os.path.join(root, 'file'), 'w').close()
+            batch = FsBatch()
+            batch.add('mkdir', [f'{host_dir}/a', f'{host_dir}/b'],
+                      FakeExecInfo(hosts), 'pkg1')
+            batch.add('mkdir', f'{host_dir}/c', FakeExecInfo(['h1']), 'pkg2')
+            batch.add('rm', f'{host_dir}/b*', FakeExecInfo(hosts), 'pkg2')
+            batch.add('mkdir', f'{root}/file/d', FakeExecInfo(['h2']), 'pkg3')
+            self.assertEqual(batch.hosts(), hosts)
+
+            transport = LocalTransport(latency=0, run_cmds=True)
+            errors = batch.flush(TreeFanout(transport, fanout=1))
+            self.assertEqual(transport.connections['localhost'], 3)
+            for host in hosts:
+                self.assertTrue(os.path.isdir(f'{root}/{host}/a'))
+                self.assertFalse(os.path.exists(f'{root}/{host}/b'))
+            self.assertTrue(os.path.isdir(f'{root}/h1/c'))
+            self.assertFalse(os.path.exists(f'{root}/h0/c'))
+
+            # Failures are reported per operation and host
+            self.assertEqual(len(errors), 1)
+            op, host, msg = errors[0]
+            self.assertEqual((op.pkg_id, op.kind, host), ('pkg3', 'mkdir', 'h2'))
+            self.assertIn('Not a directory', msg)
+            self.assertEqual(batch.ops, [])
+
+    def test_flush_fails(self):
+        with tempfile.TemporaryDirectory() as root:
+            open(os.path.join(root, 'file'), 'w').close()
+            batch = FsBatch()
+            batch.add('mkdir', f'{root}/file/d', FakeExecInfo(['h0']), 'pkg1')
+            transport = LocalTransport(latency=0, run_cmds=True)
+            ppl = SimpleNamespace(
+                jarvis=SimpleNamespace(
+                    get_fanout=lambda exec_info, num_hosts, direct:
+                    TreeFanout(transport, fanout=1)),
+                pooled_ssh=nullcontext,
+                log=lambda msg, color=None: None)
+            # A configure with missing directories must not succeed
+            with self.assertRaises(Exception):
+                Pipeline.flush_fs(ppl, batch)
@@ -0,0 +1,123 @@
+"""
+Test the index of shared libraries used by Pkg.find_library
+"""
+from jarvis_cd.basic.lib_index import LibIndex
+from unittest import TestCase
+import tempfile
+import struct
+import os
+
+
+class TestLibIndex(TestCase):
+    """
+    Libraries should resolve in search path order without rescanning
+    unchanged directories
+    """
+    def make_ld_cache(self, path, libs):
+        # A new-format ld.so.cache with the given (soname, path) entries
+        strings = b''
+        entries = b''
+        str_off = 48 + 24 * len(libs)
+        for soname, lib_path in libs:
+            key = str_off + len(strings)
+            strings += soname.encode() + b'\0'
+            value = str_off + len(strings)
+            strings += lib_path.encode() + b'\0'
+            entries += struct.pack('<iIIIQ', 0x0303, key, value, 0, 0)
+        header = LibIndex.NEW_MAGIC + struct.pack(
+            '<IIB3xI12x', len(libs), len(strings), 2, 0)
+        with open(path, 'wb') as fp:
+            fp.write(header + entries + strings)
+
+    def touch(self, path):
+        open(path, 'w').close()
+
+    def test_find(self):
+        with tempfile.TemporaryDirectory() as root:
+            dir1 = os.path.join(root, 'lib1')
+            dir2 = os.path.join(root, 'lib2')
+            os.makedirs(dir1)
+            os.makedirs(dir2)
+            self.touch(os.path.join(dir1, 'libfoo.so.2'))
+            self.touch(os.path.join(dir2, 'libfoo.so'))
+            self.touch(os.path.join(dir2, 'libbar.so'))
+            ld_cache = os.path.join(root, 'ld.so.cache')
+            self.make_ld_cache(ld_cache, [('libsys.so.1', '/lib/libsys.so.1'),
+                                          ('libbar.so', '/lib/libbar.so')])
+            index_path = os.path.join(root, 'lib_index.yaml')
+            index = LibIndex(index_path, ld_cache)
+            index.DEFAULT_DIRS = []
+
+            # Exact names win over versioned sonames
+            self.assertEqual(index.find(['libfoo.so'], [dir1, dir2]),
+                             os.path.join(dir2, 'libfoo.so'))
+            # Search path dirs win over ld.so.cache
+            self.assertEqual(index.find(['libbar.so'], [dir1, dir2]),
+                             os.path.join(dir2, 'libbar.so'))
+            # Versioned sonames are only returned by find_versioned
+            self.assertIsNone(index.find(['libsys.so'], [dir1, dir2]))
+            self.assertEqual(index.find_versioned(['libsys.so'],
+                                                  [dir1, dir2]),
+                             '/lib/libsys.so.1')
+            self.assertIsNone(index.find(['libnone.so'], [dir1, dir2]))
+            self.assertEqual(index.num_scans, 2)
+
+            # The persisted index is reused by a new process
+            index = LibIndex(index_path, ld_cache)
+            index.DEFAULT_DIRS = []
+            self.assertEqual(index.find(['libfoo.so.2'], [dir1]),
+                             os.path.join(dir1, 'libfoo.so.2'))
+            self.assertEqual(index.num_scans, 0)
+
+            # Changed dirs are listed again
+            self.touch(os.path.join(dir1, 'libnew.so'))
+            os.utime(dir1, ns=(0, 0))
+            self.assertEqual(index.find(['libnew.so'], [dir1]),
+                             os.path.join(dir1, 'libnew.so'))
+            self.assertEqual(index.num_scans, 1)
+
+    def test_find_versioned(self):
+        with tempfile.TemporaryDirectory() as root:
+            dir1 = os.path.join(root, 'lib1')
+            dir2 = os.path.join(root, 'lib2')
+            os.makedirs(dir1)
+            os.makedirs(dir2)
+            self.touch(os.path.join(dir1, 'libasan.so.6'))
+            self.touch(os.path.join(dir1, 'libasan.so.6.0.0'))
+            self.touch(os.path.join(dir2, 'libasan.so.8'))
+            self.touch(os.path.join(dir2, 'libasan.so.8.bak'))
+            index = LibIndex(os.path.join(root, 'lib_index.yaml'),
+                             os.path.join(root, 'ld.so.cache'))
+            index.DEFAULT_DIRS = []
+
+            # The highest version wins regardless of the search order
+            for dirs in [[dir1, dir2], [dir2, dir1]]:
+                self.assertIsNone(index.find(['libasan.so'], dirs))
+                self.assertEqual(index.find_versioned(['libasan.so'], dirs),
+                                 os.path.join(dir2, 'libasan.so.8'))
+
+    def test_find_compiler(self):
+        with tempfile.TemporaryDirectory() as root:
+            # A fake compiler which knows libasan.so and counts its calls
+            cc = os.path.join(root, 'cc')
+            calls = os.path.join(root, 'calls')
+            with open(cc, 'w') as fp:
+                fp.write('#!/bin/sh\n'
+                         f'echo >> {calls}\n'
+                         'if [ "$1" = "-print-file-name=libasan.so" ]; then\n'
+                         '  echo /gcc/lib/libasan.so\n'
+                         'else\n'
+                         '  echo "${1#-print-file-name=}"\n'
+                         'fi\n')
+            os.chmod(cc, 0o755)
+            index = LibIndex(os.path.join(root, 'lib_index.yaml'),
+                             os.path.join(root, 'ld.so.cache'))
+            env = dict(os.environ, CC=cc)
+            self.assertEqual(index.find_compiler(['asan.so', 'libasan.so'],
+                                                 env),
+                             '/gcc/lib/libasan.so')
+            self.assertIsNone(index.find_compiler(['libnone.so'], env))
+            # Results are memoized per compiler and search path
+            index.find_compiler(['asan.so', 'libasan.so'], env)
+            with open(calls) as fp:
+                self.assertEqual(len(fp.readlines()), 3)
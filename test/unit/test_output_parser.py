@@ -0,0 +1,113 @@
+"""
+Test turning benchmark output into metrics
+"""
+from jarvis_cd.basic.output_parser import make_parser
+from unittest import TestCase
+import tempfile
+import os
+
+IOR_OUT = """
+Summary of all tests:
+Operation   Max(MiB)   Min(MiB)  Mean(MiB)     StdDev   Max(OPs)   Min(OPs)  Mean(OPs)     StdDev    Mean(s) Stonewall(s) Stonewall(MiB) Test# #Tasks tPN reps fPP reord reordoff reordrand seed segcnt   blksiz    xsize aggs(MiB)   API RefNum
+write        1200.50    1100.25    1150.00      50.12    1200.50    1100.25    1150.00      50.12    0.89123         NA            NA     0      4   4    2   0     0        1         0    0      1 268435456  1048576     1024.0 POSIX      0
+read         2400.00    2300.00    2350.00      50.00    2400.00    2300.00    2350.00      50.00    0.43573         NA            NA     0      4   4    2   0     0        1         0    0      1 268435456  1048576     1024.0 POSIX      0
+Finished            : Mon Jan  1 00:00:00 2024
+"""
+
+FIO_OUT = """fio: warning: something
+{
+  "jobs": [
+    {"jobname": "job",
+     "read": {"io_bytes": 0, "bw": 0, "iops": 0},
+     "write": {"io_bytes": 1048576, "bw": 2048, "iops": 512.5,
+               "lat_ns": {"mean": 3000.0}}},
+    {"jobname": "job",
+     "read": {"io_bytes": 0, "bw": 0, "iops": 0},
+     "write": {"io_bytes": 1048576, "bw": 1024, "iops": 256.5,
+               "lat_ns": {"mean": 5000.0}}}
+  ]
+}
+"""
+
+REDIS_OUT = """"test","rps","avg_latency_ms","min_latency_ms","p50_latency_ms","p95_latency_ms","p99_latency_ms","max_latency_ms"
+"SET","86206.90","0.318","0.088","0.311","0.431","0.503","1.079"
+"GET","90909.09","0.290","0.072","0.287","0.383","0.447","0.799"
+"""
+
+DLIO_OUT = """[INFO] 2024-01-01T00:00:00 Starting epoch 1
+[INFO] 2024-01-01T00:00:10 Ending epoch 1 - 100 steps completed in 10.01 s
+[INFO] 2024-01-01T00:00:10 Epoch 1 - Block 1 [Training] Accelerator Utilization [AU] (%): 95.5000
+[INFO] 2024-01-01T00:00:10 Epoch 1 - Block 1 [Training] Throughput (samples/second): 400.0000
+[INFO] 2024-01-01T00:00:20 Ending epoch 2 - 100 steps completed in 9.50 s
+[INFO] 2024-01-01T00:00:20 Epoch 2 - Block 1 [Training] Throughput (samples/second): 420.0000
+[METRIC] ==========================================================
+[METRIC] Training Accelerator Utilization [AU] (%): 96.1234 (0.5000)
+[METRIC] Training Throughput (samples/second): 410.0000 (10.0000)
+[METRIC] Training I/O Throughput (MB/second): 51.2500 (1.2500)
+"""
+
+
+class TestOutputParser(TestCase):
+    """
+    Each builtin parser should extract typed metrics from sample output
+    """
+    def parse(self, name, text):
+        return make_parser(name).parse(text.splitlines(keepends=True))
+
+    def test_ior(self):
+        metrics = self.parse('ior', IOR_OUT)
+        self.assertEqual(metrics['write_bw_max'], 1200.5)
+        self.assertEqual(metrics['read_bw_mean'], 2350.0)
+        self.assertEqual(metrics['read_time_mean'], 0.43573)
+
+    def test_fio(self):
+        metrics = self.parse('fio', FIO_OUT)
+        self.assertEqual(metrics['write_bw'], 3072)
+        self.assertEqual(metrics['write_iops'], 769.0)
+        self.assertEqual(metrics['write_lat_mean'], 4.0)
+        self.assertNotIn('read_bw', metrics)
+
+    def test_redis_benchmark(self):
+        metrics = self.parse('redis_benchmark', REDIS_OUT)
+        self.assertEqual(metrics['set_rps'], 86206.90)
+        self.assertEqual(metrics['get_p99_latency_ms'], 0.447)
+
+    def test_line_parsers(self):
+        self.assertEqual(self.parse(
+            'ycsbc', '[OVERALL], Throughput(ops/sec), 1234.5\n'),
+            {'throughput': 1234.5})
+        self.assertEqual(self.parse(
+            'filebench', '60.0: IO Summary: 5283 ops 176.093 ops/s '
+                         '0/176 rd/wr 1.3mb/s 5.7ms/op\n'),
+            {'ops': 5283, 'ops_per_sec': 176.093, 'mb_per_sec': 1.3,
+             'lat_ms': 5.7})
+        metrics = self.parse(
+            'hermes_api_bench', 'Put: Time: 1.5 sec, MBps (or MOps): 100, '
+                                'Count: 1024, Nprocs: 4\n')
+        self.assertEqual(metrics, {'put.time': 1.5, 'put.mbps': 100,
+                                   'put.count': 1024, 'put.nprocs': 4})
+
+    def test_dlio(self):
+        metrics = self.parse('dlio', DLIO_OUT)
+        self.assertEqual(metrics['epoch1.throughput'], 400.0)
+        self.assertEqual(metrics['epoch1.au'], 95.5)
+        self.assertEqual(metrics['epoch2.time'], 9.5)
+        self.assertEqual(metrics['epoch2.steps'], 100)
+        self.assertEqual(metrics['train_throughput'], 410.0)
+        self.assertEqual(metrics['train_io_throughput'], 51.25)
+
+    def test_merge_files(self):
+        parser = make_parser('filebench')
+        with tempfile.TemporaryDirectory() as out_dir:
+            paths = []
+            for i, ops in enumerate([100, 300]):
+                path = os.path.join(out_dir, f'filebench.{i}.log')
+                with open(path, 'w', encoding='utf-8') as fp:
+                    fp.write(f'IO Summary: {ops} ops {ops}.0 ops/s '
+                             f'1.0ms/op\n')
+                paths.append(path)
+            metrics = parser.merge([parser.parse_file(path)
+                                    for path in paths])
+        # Throughput of hosts is summed, latency is averaged
+        self.assertEqual(metrics['ops_per_sec'], 400.0)
+        self.assertEqual(metrics['lat_ms'], 1.0)
@@ -0,0 +1,47 @@
+"""
+Test the dependency-aware start and stop of pipelines
+"""
+from jarvis_util.shell.exec import Exec
+from jarvis_cd.basic.jarvis_manager import JarvisManager
+from jarvis_cd.basic.pkg import Pipeline
+from unittest import TestCase
+
+
+class TestPipelineDeps(TestCase):
+    """
+    Test Pipeline.get_deps and the critical path
+    """
+    def test_deps(self):
+        self.jarvis = JarvisManager.get_instance()
+        path = f'{self.jarvis.jarvis_root}/test/unit/test_repo'
+        Exec(f'jarvis repo add {path}')
+        self.jarvis.load()
+        pipeline = Pipeline().create('test_pipeline_deps')
+        pipeline.append('first', 'a', do_configure=False)
+        pipeline.append('first', 'b', do_configure=False)
+        pipeline.append('second', 'icp', do_configure=False)
+        pipeline.append('third', 'c', do_configure=False)
+        pipeline.append('first', 'd', do_configure=False)
+        pipeline.get_pkg('b').config['depends_on'] = []
+        pipeline.get_pkg('d').config['depends_on'] = []
+
+        # b and d only wait for the interceptor before them
+        deps = pipeline.get_deps()
+        self.assertEqual(deps['a'], set())
+        self.assertEqual(deps['b'], set())
+        self.assertEqual(deps['icp'], {'a', 'b'})
+        self.assertEqual(deps['c'], {'a', 'b', 'icp'})
+        self.assertEqual(deps['d'], {'icp'})
+
+        # Stop in the reverse order
+        rdeps = pipeline.get_deps(reverse=True)
+        self.assertEqual(rdeps['icp'], {'c', 'd'})
+        self.assertEqual(rdeps['d'], set())
+
+        pipeline.start()
+        self.assertIn('icp', pipeline.critical_path)
+        pipeline.stop()
+
+        pipeline.destroy()
+        Exec('jarvis repo remove test_repo')
+        self.jarvis.load()
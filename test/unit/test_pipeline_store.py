@@ -0,0 +1,84 @@
+"""
+Test the YAML and SQLite pipeline state stores
+"""
+from jarvis_util.shell.exec import Exec
+from jarvis_cd.basic.jarvis_manager import JarvisManager
+from jarvis_cd.basic.pipeline_store import PipelineStore
+from jarvis_cd.basic.pkg import Pipeline
+from unittest import TestCase, skipUnless
+import tempfile
+import time
+import os
+
+
+class TestPipelineStore(TestCase):
+    """
+    Test the pipeline state stores. The latency benchmark only runs if
+    $JARVIS_STORE_BENCH_DIR is set and records its results there.
+    """
+    def add_test_repo(self):
+        self.jarvis = JarvisManager.get_instance()
+        path = f'{self.jarvis.jarvis_root}/test/unit/test_repo'
+        Exec(f'jarvis repo add {path}')
+        self.jarvis.load()
+
+    def rm_test_repo(self):
+        self.jarvis = JarvisManager.get_instance()
+        Exec('jarvis repo remove test_repo')
+        self.jarvis.load()
+
+    def test_store_roundtrip(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, PipelineStore.FILE_NAME)
+            store = PipelineStore(path)
+            with store.transaction():
+                store.put('ppl', {'sub_pkgs': [['first', 'a']]}, {'X': '1'})
+                store.put('ppl.a', {'port': 22})
+            store.close()
+
+            store = PipelineStore(path)
+            self.assertEqual(store.get_config('ppl.a'), {'port': 22})
+            self.assertEqual(store.get_env('ppl'), {'X': '1'})
+            self.assertFalse(store.has_env('ppl.a'))
+            store.remove_tree('ppl')
+            store.close()
+
+            store = PipelineStore(path)
+            self.assertFalse(store.has_config('ppl'))
+            self.assertFalse(store.has_config('ppl.a'))
+            store.close()
+
+    def time_load_save(self, backend, num_pkgs):
+        self.jarvis.pipeline_store = backend
+        pipeline_id = f'bench_{backend}_{num_pkgs}'
+        pipeline = Pipeline().create(pipeline_id)
+        for i in range(num_pkgs):
+            pipeline.append('first', f'first{i}', do_configure=False)
+        pipeline.save()
+        start = time.time()
+        Pipeline().load(pipeline_id).save()
+        load_save_time = time.time() - start
+        pipeline = Pipeline().load(pipeline_id)
+        self.assertEqual(len(pipeline.sub_pkgs), num_pkgs)
+        pipeline.destroy()
+        return load_save_time
+
+    @skipUnless(os.getenv('JARVIS_STORE_BENCH_DIR'),
+                'set JARVIS_STORE_BENCH_DIR to benchmark the stores')
+    def test_load_save_latency(self):
+        out_dir = os.getenv('JARVIS_STORE_BENCH_DIR')
+        os.makedirs(out_dir, exist_ok=True)
+        self.add_test_repo()
+        pipeline_store = self.jarvis.pipeline_store
+        try:
+            rows = ['pkgs,yaml_s,sqlite_s']
+            for num_pkgs in [10, 100, 1000]:
+                yaml_time = self.time_load_save('yaml', num_pkgs)
+                sqlite_time = self.time_load_save('sqlite', num_pkgs)
+                rows.append(f'{num_pkgs},{yaml_time:.4f},{sqlite_time:.4f}')
+            with open(os.path.join(out_dir, 'pipeline_store.csv'), 'w',
+                      encoding='utf-8') as fp:
+                fp.write('\n'.join(rows) + '\n')
+        finally:
+            self.jarvis.pipeline_store = pipeline_store
+            self.rm_test_repo()
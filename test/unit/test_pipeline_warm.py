@@ -0,0 +1,64 @@
+"""
+Test keeping services running between iterator points
+"""
+from jarvis_util.shell.exec import Exec
+from jarvis_cd.basic.jarvis_manager import JarvisManager
+from jarvis_cd.basic.pkg import Pipeline, PipelineIterator
+from unittest import TestCase
+
+
+class TestPipelineWarm(TestCase):
+    """
+    Test Pipeline._plan_warm
+    """
+    def test_plan_warm(self):
+        self.jarvis = JarvisManager.get_instance()
+        path = f'{self.jarvis.jarvis_root}/test/unit/test_repo'
+        Exec(f'jarvis repo add {path}')
+        self.jarvis.load()
+        pipeline = Pipeline().create('test_pipeline_warm')
+        pipeline.append('first', 'a', do_configure=False)
+        pipeline.append('first', 'b', do_configure=False)
+        pipeline.append('third', 'c', do_configure=False)
+        pipeline.config['iterator'] = {
+            'vars': {'c.port': [1, 2]},
+            'loop': [['c.port']],
+            'repeat': 1,
+            'output': f'{pipeline.shared_dir}/iter_out',
+            'warm': True,
+        }
+        pipeline.iterator = PipelineIterator(pipeline)
+        a, b, c = pipeline.sub_pkgs
+
+        # Nothing is running yet
+        pipeline._plan_warm()
+        self.assertEqual([a.skip_run, b.skip_run, c.skip_run],
+                         [False, False, False])
+        self.assertEqual([a.warm, b.warm, c.warm], [True, True, False])
+
+        # Services with the same config stay up, applications rerun
+        c.config['port'] = 2
+        pipeline._plan_warm()
+        self.assertEqual([a.skip_run, b.skip_run, c.skip_run],
+                         [True, True, False])
+
+        # A service restarts when its config changes
+        b.config['port'] = 3
+        pipeline._plan_warm()
+        self.assertEqual([a.skip_run, b.skip_run], [True, False])
+
+        # ... or when a service it depends on restarts
+        a.config['port'] = 4
+        pipeline._plan_warm()
+        self.assertEqual([a.skip_run, b.skip_run], [False, False])
+
+        # ... or when it is not healthy
+        b.status = lambda: False
+        pipeline._plan_warm()
+        self.assertEqual([a.skip_run, b.skip_run], [True, False])
+
+        pipeline._stop_warm()
+        self.assertEqual([a.warm_hash, b.warm_hash], [None, None])
+        pipeline.destroy()
+        Exec('jarvis repo remove test_repo')
+        self.jarvis.load()
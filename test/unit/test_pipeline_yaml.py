@@ -0,0 +1,101 @@
+"""
+Test reloading only the pkgs whose yaml entries changed
+"""
+from jarvis_util.shell.exec import Exec
+from jarvis_cd.basic.jarvis_manager import JarvisManager
+from jarvis_cd.basic.pkg import Pipeline
+from unittest import TestCase
+import tempfile
+import yaml
+import os
+
+
+class TestPipelineYaml(TestCase):
+    """
+    Test Pipeline.update_yaml
+    """
+    def write_yaml(self, path, pkgs, env=None):
+        config = {'name': 'test_pipeline_yaml', 'pkgs': pkgs}
+        if env is not None:
+            config['env'] = env
+        with open(path, 'w', encoding='utf-8') as fp:
+            yaml.dump(config, fp)
+
+    def test_update_yaml(self):
+        self.jarvis = JarvisManager.get_instance()
+        path = f'{self.jarvis.jarvis_root}/test/unit/test_repo'
+        Exec(f'jarvis repo add {path}')
+        self.jarvis.load()
+        with tempfile.TemporaryDirectory() as yaml_dir:
+            yaml_path = os.path.join(yaml_dir, 'pipeline.yaml')
+            self.write_yaml(yaml_path, [
+                {'pkg_type': 'first', 'pkg_name': 'a', 'port': 1},
+                {'pkg_type': 'first', 'pkg_name': 'b', 'port': 2},
+                {'pkg_type': 'third', 'pkg_name': 'c', 'port': 3},
+            ])
+            pipeline = Pipeline().from_yaml(yaml_path).save()
+            a, b, c = pipeline.sub_pkgs
+
+            # Unchanged entries are not reconfigured
+            self.write_yaml(yaml_path, [
+                {'pkg_type': 'first', 'pkg_name': 'd', 'port': 4},
+                {'pkg_type': 'first', 'pkg_name': 'a', 'port': 1},
+                {'pkg_type': 'third', 'pkg_name': 'c', 'port': 5},
+            ])
+            pipeline = Pipeline().load('test_pipeline_yaml')
+            plan = pipeline.plan_yaml(yaml.safe_load(
+                open(yaml_path, encoding='utf-8'))['pkgs'])
+            self.assertEqual(
+                [(step['action'], step['pkg_id']) for step in plan],
+                [('insert', 'd'), ('keep', 'a'), ('configure', 'c'),
+                 ('remove', 'b')])
+            self.assertEqual(plan[2]['changed'], ['port'])
+            a = pipeline.get_pkg('a')
+            pipeline.update_yaml().save()
+            self.assertEqual([pkg.pkg_id for pkg in pipeline.sub_pkgs],
+                             ['d', 'a', 'c'])
+            self.assertIs(pipeline.get_pkg('a'), a)
+            self.assertEqual(pipeline.get_pkg('c').config['port'], 5)
+
+            # The reloaded pipeline matches the yaml
+            pipeline = Pipeline().load('test_pipeline_yaml')
+            self.assertEqual(pipeline.config['sub_pkgs'],
+                             [['first', 'd'], ['first', 'a'],
+                              ['third', 'c']])
+            self.assertEqual(pipeline.get_pkg('d').config['port'], 4)
+            plan = pipeline.plan_yaml(pipeline.config['JARVIS_YAML_PKGS'])
+            self.assertEqual({step['action'] for step in plan}, {'keep'})
+            pipeline.destroy()
+        Exec('jarvis repo remove test_repo')
+        self.jarvis.load()
+
+    def test_update_yaml_env(self):
+        self.jarvis = JarvisManager.get_instance()
+        path = f'{self.jarvis.jarvis_root}/test/unit/test_repo'
+        Exec(f'jarvis repo add {path}')
+        self.jarvis.load()
+        env_path = os.path.join(self.jarvis.env_dir,
+                                'test_pipeline_yaml_env.yaml')
+        with open(env_path, 'w', encoding='utf-8') as fp:
+            yaml.dump({'PATH': '/usr/bin'}, fp)
+        with tempfile.TemporaryDirectory() as yaml_dir:
+            yaml_path = os.path.join(yaml_dir, 'pipeline.yaml')
+            pkgs = [{'pkg_type': 'first', 'pkg_name': 'a', 'port': 1}]
+            self.write_yaml(yaml_path, pkgs, 'test_pipeline_yaml_env')
+            pipeline = Pipeline().from_yaml(yaml_path).save()
+
+            # Variables set by pkgs do not count as a change of the env
+            pipeline = Pipeline().load('test_pipeline_yaml')
+            pipeline.env['HERMES_CONF'] = '/tmp/hermes.yaml'
+            env = {'PATH': '/usr/bin'}
+            plan = pipeline.plan_yaml(pkgs, env)
+            self.assertEqual([step['action'] for step in plan], ['keep'])
+
+            # A changed static env reconfigures every pkg
+            env['PATH'] = '/opt/bin'
+            plan = pipeline.plan_yaml(pkgs, env)
+            self.assertEqual([step['changed'] for step in plan], [['env']])
+            pipeline.destroy()
+        os.remove(env_path)
+        Exec('jarvis repo remove test_repo')
+        self.jarvis.load()
@@ -0,0 +1,112 @@
+"""
+Test how construct times scale with the number of repos
+"""
+from jarvis_util.util.import_mod import load_class
+from jarvis_cd.basic.pkg_index import PkgIndex
+from unittest import TestCase
+import tempfile
+import time
+import os
+
+
+class TestPkgIndex(TestCase):
+    """
+    Compare pkg construction through the pkg index against probing
+    every repo in order.
+    """
+    PKGS_PER_REPO = 8
+
+    def make_repos(self, root, tag, num_repos):
+        """
+        Create num_repos repos, each with PKGS_PER_REPO pkgs
+
+        :return: The repo list (highest priority first)
+        """
+        repos = []
+        for i in range(num_repos):
+            name = f'{tag}_repo{i}'
+            repo_dir = os.path.join(root, name, name)
+            os.makedirs(repo_dir)
+            open(os.path.join(repo_dir, '__init__.py'), 'w').close()
+            for j in range(self.PKGS_PER_REPO):
+                pkg_dir = os.path.join(repo_dir, f'{tag}_r{i}_pkg{j}')
+                os.makedirs(pkg_dir)
+                open(os.path.join(pkg_dir, '__init__.py'), 'w').close()
+                with open(os.path.join(pkg_dir, 'pkg.py'), 'w') as fp:
+                    fp.write(f'class {tag.capitalize()}R{i}Pkg{j}:\n'
+                             f'    pass\n')
+            repos.append({'name': name, 'path': os.path.join(root, name)})
+        return repos
+
+    def probe_construct(self, repos, pkg_type, cls_name):
+        for repo in repos:
+            cls = load_class(f"{repo['name']}.{pkg_type}.pkg",
+                             repo['path'], cls_name)
+            if cls is not None:
+                return cls()
+
+    def index_construct(self, index, pkg_type):
+        entry = index.find(pkg_type)
+        cls = load_class(entry['module'], entry['path'], entry['cls'])
+        return cls()
+
+    def time_construct(self, num_repos):
+        with tempfile.TemporaryDirectory() as root:
+            # The pkgs of the lowest-priority repo are the worst case
+            last = num_repos - 1
+            pkgs = [(f'probe_r{last}_pkg{j}', f'ProbeR{last}Pkg{j}')
+                    for j in range(self.PKGS_PER_REPO)]
+            repos = self.make_repos(root, 'probe', num_repos)
+            start = time.time()
+            for pkg_type, cls_name in pkgs:
+                self.assertIsNotNone(
+                    self.probe_construct(repos, pkg_type, cls_name))
+            probe_time = time.time() - start
+
+            repos = self.make_repos(root, 'index', num_repos)
+            index_path = os.path.join(root, 'pkg_index.yaml')
+            start = time.time()
+            index = PkgIndex(index_path).load(repos)
+            for j in range(self.PKGS_PER_REPO):
+                self.index_construct(index, f'index_r{last}_pkg{j}')
+            cold_time = time.time() - start
+            self.assertEqual(index.num_builds, 1)
+
+            start = time.time()
+            index = PkgIndex(index_path).load(repos)
+            for j in range(self.PKGS_PER_REPO):
+                self.index_construct(index, f'index_r{last}_pkg{j}')
+            warm_time = time.time() - start
+            self.assertEqual(index.num_builds, 0)
+        return probe_time, cold_time, warm_time
+
+    def test_construct_scaling(self):
+        print()
+        print('repos probe(s) cold(s) warm(s)')
+        for num_repos in [1, 4, 16]:
+            probe_time, cold_time, warm_time = self.time_construct(num_repos)
+            print(f'{num_repos} {probe_time:.4f} {cold_time:.4f} '
+                  f'{warm_time:.4f}')
+
+    def test_index_invalidation(self):
+        with tempfile.TemporaryDirectory() as root:
+            repos = self.make_repos(root, 'inval', 2)
+            index_path = os.path.join(root, 'pkg_index.yaml')
+            index = PkgIndex(index_path).load(repos)
+            self.assertEqual(index.find('inval_r1_pkg0')['repo'],
+                             'inval_repo1')
+
+            # Adding a pkg to a repo invalidates the index
+            pkg_dir = os.path.join(root, 'inval_repo0', 'inval_repo0',
+                                   'inval_new')
+            os.makedirs(pkg_dir)
+            with open(os.path.join(pkg_dir, 'pkg.py'), 'w') as fp:
+                fp.write('class InvalNew:\n    pass\n')
+            os.utime(os.path.dirname(pkg_dir), ns=(0, 0))
+            index = PkgIndex(index_path).load(repos)
+            self.assertEqual(index.num_builds, 1)
+            self.assertEqual(index.find('inval_new')['cls'], 'InvalNew')
+
+            # Reordering repos invalidates the index
+            index = PkgIndex(index_path).load(list(reversed(repos)))
+            self.assertEqual(index.num_builds, 1)
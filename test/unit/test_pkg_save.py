@@ -0,0 +1,39 @@
+"""
+Test that saving a pipeline only rewrites changed files
+"""
+from jarvis_util.shell.exec import Exec
+from jarvis_cd.basic.jarvis_manager import JarvisManager
+from jarvis_cd.basic.pkg import Pipeline
+from unittest import TestCase
+
+
+class TestPkgSave(TestCase):
+    """
+    Test the dirty tracking of Pkg.save
+    """
+    def test_skip_unchanged(self):
+        self.jarvis = JarvisManager.get_instance()
+        path = f'{self.jarvis.jarvis_root}/test/unit/test_repo'
+        Exec(f'jarvis repo add {path}')
+        self.jarvis.load()
+        pipeline = Pipeline().create('test_pkg_save')
+        for i in range(4):
+            pipeline.append('first', f'first{i}', do_configure=False)
+        pipeline.save()
+
+        # Nothing changed: the root config, env and 4 sub-pkgs are skipped
+        pipeline = Pipeline().load('test_pkg_save')
+        pipeline.save()
+        self.assertEqual(pipeline.num_written, 0)
+        self.assertEqual(pipeline.num_skipped, 6)
+
+        # Only the changed sub-pkg is rewritten
+        pipeline.get_pkg('first2').config['port'] = 22
+        pipeline.save()
+        self.assertEqual(pipeline.num_written, 1)
+        pipeline = Pipeline().load('test_pkg_save')
+        self.assertEqual(pipeline.get_pkg('first2').config['port'], 22)
+
+        pipeline.destroy()
+        Exec('jarvis repo remove test_repo')
+        self.jarvis.load()
@@ -0,0 +1,56 @@
+"""
+Test the readiness probes used by services during start
+"""
+from jarvis_cd.basic.readiness import Readiness, TcpProbe, FileProbe, \
+    LogProbe, CmdProbe
+from unittest import TestCase
+import threading
+import tempfile
+import socket
+import time
+import os
+
+
+class TestReadiness(TestCase):
+    """
+    Each probe should pass as soon as its condition holds
+    """
+    def delayed(self, delay, func):
+        thread = threading.Timer(delay, func)
+        thread.start()
+        return thread
+
+    def test_tcp(self):
+        server = socket.socket()
+        server.bind(('localhost', 0))
+        port = server.getsockname()[1]
+        self.assertFalse(Readiness([TcpProbe('localhost', port)], .2).wait())
+        self.delayed(.3, server.listen)
+        readiness = Readiness([TcpProbe('localhost', port)], 5)
+        self.assertTrue(readiness.wait())
+        self.assertLess(readiness.wait_time, 1)
+        server.close()
+
+    def test_file_and_log(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'ready')
+            log_path = os.path.join(root, 'server.log')
+
+            def write():
+                open(path, 'w').close()
+                with open(log_path, 'w', encoding='utf-8') as fp:
+                    fp.write('starting\nlistening on port 4000\n')
+
+            start = time.time()
+            self.delayed(.3, write)
+            readiness = Readiness([FileProbe(path),
+                                   LogProbe(log_path, r'listening on port \d+')],
+                                  5)
+            self.assertTrue(readiness.wait())
+            self.assertLess(time.time() - start, 2)
+
+    def test_cmd(self):
+        self.assertTrue(Readiness([CmdProbe('true')], 1).wait())
+        readiness = Readiness([CmdProbe('false')], .3)
+        self.assertFalse(readiness.wait())
+        self.assertEqual(len(readiness.pending), 1)
@@ -0,0 +1,65 @@
+"""
+Test the search strategies of PipelineIterator
+"""
+from jarvis_cd.basic.search import make_strategy
+from unittest import TestCase
+
+
+class TestSearch(TestCase):
+    """
+    Run each strategy against a synthetic metric
+    """
+    DIMS = [50, 50]
+
+    def metric(self, pos):
+        return (pos[0] - 20) ** 2 + (pos[1] - 35) ** 2
+
+    def run_search(self, config, repeat=1):
+        strategy = make_strategy(self.DIMS, repeat, config)
+        strategy.begin()
+        points = []
+        pos = strategy.propose()
+        while pos is not None:
+            points.append(pos)
+            reps = strategy.rep_range()
+            strategy.observe(pos, [{'f': self.metric(pos)} for _ in reps])
+            pos = strategy.propose()
+        return strategy, points
+
+    def test_grid(self):
+        self.assertIsNone(make_strategy(self.DIMS, 1, None))
+        self.assertIsNone(make_strategy(self.DIMS, 1, {'strategy': 'grid'}))
+
+    def test_random_lhs(self):
+        for name in ['random', 'lhs']:
+            strategy, points = self.run_search({'strategy': name,
+                                                'samples': 20})
+            self.assertLessEqual(len(points), 20)
+            self.assertEqual(len(points), len(set(points)))
+            for pos in points:
+                self.assertTrue(0 <= pos[0] < 50 and 0 <= pos[1] < 50)
+            # The same seed gives the same points
+            self.assertEqual(points, self.run_search({'strategy': name,
+                                                      'samples': 20})[1])
+
+    def test_halving(self):
+        strategy, points = self.run_search({'strategy': 'halving',
+                                            'samples': 27, 'metric': 'f'},
+                                           repeat=9)
+        self.assertEqual(len(points), 27 + 9 + 3)
+        self.assertEqual(len(points), strategy.max_points())
+        self.assertEqual(len(strategy.results[points[-1]]), 9)
+
+    def test_model(self):
+        config = {'strategy': 'model', 'samples': 30, 'metric': 'f',
+                  'seed': 0}
+        strategy, points = self.run_search(config)
+        self.assertEqual(len(points), 30)
+        self.assertEqual(len(points), len(set(points)))
+        # The model gets close to the optimum (0 at (20, 35)) and does
+        # no worse than random sampling with the same budget
+        best = min(self.metric(pos) for pos in points)
+        rand_best = min(self.metric(pos) for pos in self.run_search(
+            {'strategy': 'random', 'samples': 30, 'seed': 0})[1])
+        self.assertLessEqual(best, 4)
+        self.assertLessEqual(best, rand_best)
@@ -0,0 +1,56 @@
+"""
+Test the pool of persistent ssh connections
+"""
+from jarvis_cd.basic.ssh_pool import SshPool
+from unittest import TestCase
+import subprocess
+import socket
+import os
+
+
+class TestSshPool(TestCase):
+    """
+    The ssh wrapper should be in PATH only while the pool is open and
+    count sessions which reuse a master connection
+    """
+    def test_wrapper(self):
+        old_path = os.environ.get('PATH')
+        pool = SshPool(['localhost']).open()
+        self.assertEqual(pool.masters, [])
+        self.assertIs(SshPool.active, pool)
+        wrapper = os.path.join(pool.bin_dir, 'ssh')
+        self.assertTrue(os.environ['PATH'].startswith(pool.bin_dir))
+
+        env = {'PATH': '/usr/bin'}
+        SshPool.wrap_env(env)
+        SshPool.wrap_env(env)
+        self.assertEqual(env['PATH'], f'{pool.bin_dir}:/usr/bin')
+        # Saved envs never contain the wrapper of any pool
+        stale = {'PATH': f'/tmp/jsshold/bin:{env["PATH"]}'}
+        self.assertEqual(SshPool.strip_env(stale), {'PATH': '/usr/bin'})
+        self.assertEqual(stale['PATH'],
+                         f'/tmp/jsshold/bin:{pool.bin_dir}:/usr/bin')
+        SshPool.wrap_env(stale)
+        self.assertEqual(stale['PATH'], f'{pool.bin_dir}:/usr/bin')
+
+        # ssh -G resolves the control socket without connecting
+        out = subprocess.run([wrapper, '-G', 'host1'], capture_output=True,
+                             text=True, check=True).stdout
+        sock_path = [line.split(' ', 1)[1] for line in out.splitlines()
+                     if line.startswith('controlpath ')][0]
+        self.assertTrue(sock_path.startswith(pool.pool_dir))
+        sock = socket.socket(socket.AF_UNIX)
+        sock.bind(sock_path)
+        subprocess.run([wrapper, '-G', 'host1'], capture_output=True,
+                       check=True)
+        sock.close()
+        self.assertEqual(pool.stats()['sessions'], 2)
+        self.assertEqual(pool.stats()['handshakes_saved'], 1)
+
+        stats = pool.close()
+        self.assertEqual(stats['handshakes_saved'], 1)
+        self.assertIsNone(SshPool.active)
+        self.assertEqual(os.environ.get('PATH'), old_path)
+        self.assertFalse(os.path.exists(pool.pool_dir))
+        pool.unwrap_env(env)
+        self.assertEqual(env['PATH'], '/usr/bin')
@@ -0,0 +1,77 @@
+"""
+Test staging data into a directory
+"""
+from jarvis_cd.basic.stage_in import StageIn
+from unittest import TestCase
+import tempfile
+import os
+
+
+class TestStageIn(TestCase):
+    """
+    Only changed files should be copied, and large files in chunks
+    """
+    def write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fp:
+            fp.write(data)
+
+    def read(self, path):
+        with open(path, 'rb') as fp:
+            return fp.read()
+
+    def test_stage_in(self):
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'dataset')
+            single = os.path.join(root, 'labels.txt')
+            dest = os.path.join(root, 'dest')
+            manifest = os.path.join(root, 'manifest.json')
+            big = bytes(range(256)) * 1000
+            self.write(os.path.join(src, 'big.bin'), big)
+            self.write(os.path.join(src, 'sub', 'small.bin'), b'small')
+            os.makedirs(os.path.join(src, 'empty'))
+            os.symlink('big.bin', os.path.join(src, 'link'))
+            self.write(single, b'labels')
+
+            stats = StageIn(dest, manifest, workers=4, chunk_size=10000) \
+                .run([src, single])
+            self.assertEqual((stats.files, stats.skipped_files), (4, 0))
+            self.assertEqual(stats.bytes, len(big) + 11)
+            self.assertEqual(stats.errors, [])
+            self.assertEqual(self.read(f'{dest}/dataset/big.bin'), big)
+            self.assertEqual(self.read(f'{dest}/dataset/sub/small.bin'),
+                             b'small')
+            self.assertEqual(os.readlink(f'{dest}/dataset/link'), 'big.bin')
+            self.assertTrue(os.path.isdir(f'{dest}/dataset/empty'))
+            self.assertEqual(self.read(f'{dest}/labels.txt'), b'labels')
+
+            # Unchanged files are skipped
+            self.write(os.path.join(src, 'sub', 'small.bin'), b'SMALL!')
+            stats = StageIn(dest, manifest).run([src, single])
+            self.assertEqual((stats.files, stats.skipped_files), (1, 3))
+            self.assertEqual(self.read(f'{dest}/dataset/sub/small.bin'),
+                             b'SMALL!')
+
+            # With hashing, a touched file with the same content is skipped
+            stage_in = StageIn(dest, manifest, use_hash=True)
+            stats = stage_in.run([src])
+            self.assertEqual(stats.files, 0)
+            self.assertIsNotNone(stage_in.manifest['dataset/big.bin'][2])
+            os.utime(os.path.join(src, 'big.bin'), ns=(1, 1))
+            stats = stage_in.run([src])
+            self.assertEqual((stats.files, stats.skipped_files), (0, 3))
+            self.assertNotIn('labels.txt', stage_in.manifest)
+
+            # Without a manifest, the destination files are compared
+            stats = StageIn(dest).run([src])
+            self.assertEqual((stats.files, stats.skipped_files), (0, 3))
+
+            # Files deleted or modified in the destination are copied again
+            stage_in = StageIn(dest, manifest)
+            os.remove(f'{dest}/dataset/big.bin')
+            self.write(f'{dest}/dataset/sub/small.bin', b'other!')
+            stats = stage_in.run([src])
+            self.assertEqual((stats.files, stats.skipped_files), (2, 1))
+            self.assertEqual(self.read(f'{dest}/dataset/big.bin'), big)
+            self.assertEqual(self.read(f'{dest}/dataset/sub/small.bin'),
+                             b'SMALL!')
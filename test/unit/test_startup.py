@@ -0,0 +1,78 @@
+"""
+Startup benchmark for trivial jarvis CLI commands
+"""
+from unittest import TestCase
+import subprocess
+import tempfile
+import pathlib
+import time
+import sys
+import os
+
+
+class TestStartup(TestCase):
+    """
+    Record the wall time and -X importtime output of trivial subcommands.
+    Results are kept in $JARVIS_STARTUP_BENCH_DIR if it is set.
+    """
+    # Modules that trivial subcommands must never import
+    HEAVY_MODULES = ['pandas']
+
+    def run_cmd(self, out_dir, name, args):
+        jarvis_bin = os.path.join(
+            str(pathlib.Path(__file__).parent.parent.parent.resolve()),
+            'bin', 'jarvis')
+        start = time.time()
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', jarvis_bin] + args,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, check=False)
+        wall = time.time() - start
+        with open(os.path.join(out_dir, f'{name}.importtime'), 'w',
+                  encoding='utf-8') as fp:
+            fp.write(proc.stderr)
+        imported = set()
+        import_us = 0
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            fields = line.split('|')
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            module = fields[2].strip()
+            imported.add(module.split('.')[0])
+            if not fields[2].startswith('  '):
+                import_us += int(fields[1])
+        return proc, wall, import_us, imported
+
+    def test_startup(self):
+        out_dir = os.getenv('JARVIS_STARTUP_BENCH_DIR')
+        if out_dir is None:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                self.check_startup(tmp_dir)
+        else:
+            os.makedirs(out_dir, exist_ok=True)
+            self.check_startup(out_dir)
+
+    def check_startup(self, out_dir):
+        getcwd = subprocess.run(['jarvis', 'getcwd'], stdout=subprocess.PIPE,
+                                universal_newlines=True, check=False)
+        cur_pipeline = getcwd.stdout.strip().splitlines()[-1]
+        cmds = {
+            'getcwd': ['getcwd'],
+            'pipeline_list': ['pipeline', 'list'],
+        }
+        if cur_pipeline != 'None':
+            cmds['cd'] = ['cd', cur_pipeline]
+            cmds['path'] = ['path', cur_pipeline]
+        rows = ['cmd,wall_s,import_s']
+        for name, args in cmds.items():
+            proc, wall, import_us, imported = self.run_cmd(out_dir, name, args)
+            self.assertEqual(proc.returncode, 0, proc.stderr)
+            rows.append(f'{name},{wall:.4f},{import_us / 1e6:.4f}')
+            for module in self.HEAVY_MODULES:
+                self.assertNotIn(module, imported,
+                                 f'jarvis {" ".join(args)} imported {module}')
+        with open(os.path.join(out_dir, 'startup.csv'), 'w',
+                  encoding='utf-8') as fp:
+            fp.write('\n'.join(rows) + '\n')
@@ -0,0 +1,83 @@
+"""
+Test running the stages of a workflow as a task graph
+"""
+from jarvis_cd.basic.task_graph import TaskGraph
+from unittest import TestCase
+import threading
+import time
+
+
+class TestTaskGraph(TestCase):
+    """
+    Tasks should run once their inputs exist and their resources are free
+    """
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.gpus = 0
+        self.max_gpus = 0
+
+    def stage(self, name, gpu=False):
+        with self.lock:
+            self.events.append(('start', name))
+            if gpu:
+                self.gpus += 1
+                self.max_gpus = max(self.max_gpus, self.gpus)
+        time.sleep(.05)
+        with self.lock:
+            self.events.append(('end', name))
+            if gpu:
+                self.gpus -= 1
+
+    def index(self, event, name):
+        return self.events.index((event, name))
+
+    def test_overlap(self):
+        graph = TaskGraph({'gpu': 2})
+        prev = []
+        for i in range(2):
+            sims = []
+            for task in range(3):
+                graph.add(f'sim{i}.{task}', self.stage,
+                          args=[f'sim{i}.{task}', True], inputs=prev,
+                          outputs=[f'traj{i}.{task}'], resources={'gpu': 1})
+                sims.append(f'traj{i}.{task}')
+            graph.add(f'agg{i}', self.stage, args=[f'agg{i}'], inputs=sims,
+                      outputs=[f'agg{i}'])
+            graph.add(f'train{i}', self.stage, args=[f'train{i}', True],
+                      inputs=[f'agg{i}'], outputs=[f'model{i}'],
+                      resources={'gpu': 1})
+            prev = [f'agg{i}']
+        graph.run()
+
+        # The GPU limit is never exceeded
+        self.assertEqual(self.max_gpus, 2)
+        # Stages wait for the data they read
+        self.assertLess(self.index('end', 'sim0.2'), self.index('start', 'agg0'))
+        self.assertLess(self.index('end', 'agg0'), self.index('start', 'train0'))
+        # The next simulation overlaps the training
+        self.assertLess(self.index('start', 'sim1.0'),
+                        self.index('end', 'train0'))
+
+        stat_dict = {}
+        graph.get_stat(stat_dict, 'ddmd')
+        self.assertGreaterEqual(stat_dict['ddmd.train0.time'], .05)
+        self.assertGreater(stat_dict['ddmd.train1.start'],
+                           stat_dict['ddmd.agg1.start'])
+        self.assertGreaterEqual(stat_dict['ddmd.total_time'],
+                                stat_dict['ddmd.train1.start'])
+
+    def test_failure(self):
+        def fail():
+            raise Exception('simulation failed')
+
+        graph = TaskGraph()
+        graph.add('sim', fail, outputs=['traj'])
+        graph.add('train', self.stage, args=['train'], inputs=['traj'])
+        with self.assertRaises(Exception):
+            graph.run()
+        # Tasks which depend on a failed task never start
+        self.assertEqual(self.events, [])
+        self.assertIsNotNone(graph.tasks['sim'].error)
+        with self.assertRaises(Exception):
+            TaskGraph({'gpu': 1}).add('train', fail, resources={'gpu': 2})
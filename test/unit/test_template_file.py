@@ -0,0 +1,49 @@
+"""
+Test the template engine behind copy_template_file
+"""
+from jarvis_cd.basic.template_file import render_template_file, \
+    TemplateCache
+from unittest import TestCase
+import tempfile
+import os
+
+
+class TestTemplateFile(TestCase):
+    """
+    Templates render in one pass and skip identical writes
+    """
+    def test_render(self):
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'app.param')
+            dst = os.path.join(root, 'out.param')
+            with open(src, 'w', encoding='utf-8') as fp:
+                fp.write('out ##OUTPUT_DIR##\nsize ##SIZE## ##SIZE##\n'
+                         'max ##MAX##\n')
+            render = render_template_file(src, dst, [('OUTPUT_DIR', '/tmp'),
+                                                     ('SIZE', 4),
+                                                     ('SIZE', 8),
+                                                     ('UNUSED', 1)])
+            self.assertTrue(render.written)
+            self.assertEqual(render.unknown, ['MAX'])
+            self.assertEqual(render.unused, ['UNUSED'])
+            with open(dst, encoding='utf-8') as fp:
+                self.assertEqual(fp.read(),
+                                 'out /tmp\nsize 4 4\nmax ##MAX##\n')
+
+            # Identical output leaves the destination untouched
+            os.utime(dst, ns=(0, 0))
+            render = render_template_file(src, dst, {'OUTPUT_DIR': '/tmp',
+                                                     'SIZE': 4})
+            self.assertFalse(render.written)
+            self.assertEqual(os.stat(dst).st_mtime_ns, 0)
+            render = render_template_file(src, dst, {'OUTPUT_DIR': '/tmp',
+                                                     'SIZE': 5})
+            self.assertTrue(render.written)
+
+            # Templates are parsed again only when they change
+            template = TemplateCache.get(src)
+            self.assertIs(template, TemplateCache.get(src))
+            with open(src, 'w', encoding='utf-8') as fp:
+                fp.write('##SIZE##')
+            os.utime(src, ns=(1, 1))
+            self.assertEqual(TemplateCache.get(src).names, ['SIZE'])
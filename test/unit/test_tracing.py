@@ -0,0 +1,97 @@
+"""
+Test recording and exporting spans of pipeline phases
+"""
+from jarvis_util.shell.exec import Exec
+from jarvis_cd.basic.tracing import Tracer, span
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+import contextvars
+import tempfile
+import json
+import csv
+import os
+
+
+class TestTracing(TestCase):
+    """
+    Spans should nest, inherit pkg attributes, and export to Chrome trace
+    JSON and CSV
+    """
+    def test_spans(self):
+        # Nothing is recorded without an active tracer
+        with span('start', 'pkg', pkg_id='a') as span_obj:
+            self.assertIsNone(span_obj)
+
+        tracer = Tracer().start()
+        with span('iteration', 'iter', iter=2, rep=1):
+            with span('start', 'pkg', pkg_id='a', hosts=4):
+                Exec('echo hello')
+            # Threads submitted with a copied context nest in the caller
+            with ThreadPoolExecutor(1) as pool:
+                ctx = contextvars.copy_context()
+                pool.submit(ctx.run, self.run_pkg, 'b').result()
+        tracer.stop()
+        self.assertIsNone(Tracer.active)
+        Exec('echo untraced')
+
+        spans = {(span_dict['name'], span_dict['args'].get('pkg_id')):
+                 span_dict for span_dict in tracer.all_spans()}
+        self.assertEqual(len(spans), 5)
+        iteration = spans[('iteration', None)]
+        start = spans[('start', 'a')]
+        exe = spans[('exec', 'a')]
+        self.assertIsNone(iteration['parent'])
+        self.assertEqual(start['parent'], iteration['id'])
+        self.assertEqual(exe['parent'], start['id'])
+        self.assertEqual(exe['args']['cmd'], 'echo hello')
+        self.assertEqual((exe['args']['iter'], exe['args']['rep']), (2, 1))
+        self.assertEqual(spans[('stop', 'b')]['parent'], iteration['id'])
+        self.assertEqual(spans[('exec', 'b')]['args']['rep'], 1)
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            # Spans of a sweep worker are merged into the trace
+            part = os.path.join(out_dir, 'trace-0.json')
+            with open(part, 'w', encoding='utf-8') as fp:
+                json.dump([dict(iteration, id=0, pid=1)], fp)
+            json_path, csv_path = tracer.save(out_dir, [part])
+            with open(json_path, 'r', encoding='utf-8') as fp:
+                events = json.load(fp)['traceEvents']
+            self.assertEqual(len(events), 6)
+            self.assertTrue(all(event['ph'] == 'X' and event['dur'] >= 0
+                                for event in events))
+            with open(csv_path, 'r', encoding='utf-8') as fp:
+                rows = list(csv.DictReader(fp))
+            self.assertEqual(len(rows), 6)
+            row = [row for row in rows if row['cmd'] == 'echo hello'][0]
+            self.assertEqual((row['pkg_id'], row['iter'], row['rep']),
+                             ('a', '2', '1'))
+
+    def test_fork_ids(self):
+        tracer = Tracer().start()
+        with tempfile.TemporaryDirectory() as out_dir:
+            part = os.path.join(out_dir, 'trace-0.json')
+            with span('sweep', 'iter') as sweep:
+                pid = os.fork()
+                if pid == 0:
+                    with span('worker', 'iter'):
+                        pass
+                    tracer.save_part(part)
+                    os._exit(0)
+                os.waitpid(pid, 0)
+                with span('point', 'iter'):
+                    pass
+            tracer.stop()
+            spans = tracer.all_spans() + tracer.load_parts([part])
+        ids = [span_dict['id'] for span_dict in spans]
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(len(set(ids)), 3)
+        # Spans of the worker still link to the span they forked in
+        parents = {span_dict['name']: span_dict['parent']
+                   for span_dict in spans}
+        self.assertEqual(parents['worker'], sweep.span_id)
+        self.assertEqual(parents['point'], sweep.span_id)
+
+    @staticmethod
+    def run_pkg(pkg_id):
+        with span('stop', 'pkg', pkg_id=pkg_id):
+            Exec('echo stop')